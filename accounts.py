@@ -0,0 +1,252 @@
+import csv
+import time
+from collections import namedtuple
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models import db, User, Doctor, Patient, Appointment, Treatment, Payment, normalize_phone
+from availability import parse_availability, schedule_from_availability, AvailabilityError
+from passwords import hash_passwords
+from search import index_new_doctors, unindex_doctors
+from changes import touch
+from counters import subtract_appointments
+from billing import subtract_payments
+from cache import fragment_cache
+
+# ---------------- account rules ----------------
+# What register / doctor_register check before creating an account, also used
+# for every row of a bulk import. They return the message for the first
+# problem, or None. Whether the email is still free is up to the caller (one
+# query per form, one per batch of an import).
+
+BLOOD_GROUPS = ["A+", "A-", "B+", "B-", "AB+", "AB-", "O+", "O-"]
+
+# form field names, also the CSV columns of an import (gender may be empty)
+PATIENT_FIELDS = ("name", "email", "password", "age", "gender", "bloodGroup", "phone", "address")
+DOCTOR_FIELDS = ("name", "email", "password", "specialization", "phone", "availability")
+
+def _phone_error(phone):
+    if len(phone) != 10 or not phone.isdigit():
+        return 'Enter valid phone number (length 10)'
+    return None
+
+def patient_error(fields):
+    if not all(fields.get(name) for name in PATIENT_FIELDS if name != "gender"):
+        return "Provide all fields"
+    if not fields["age"].isdigit():
+        return 'Enter valid age'
+    if fields["bloodGroup"] not in BLOOD_GROUPS:
+        return 'Enter valid Blood Group'
+    return _phone_error(fields["phone"])
+
+def doctor_error(fields):
+    if not all(fields.get(name) for name in DOCTOR_FIELDS):
+        return "Provide all fields"
+    phone_error = _phone_error(fields["phone"])
+    if phone_error:
+        return phone_error
+    try:
+        parse_availability(fields["availability"])
+    except AvailabilityError as e:
+        return f'Invalid availability: {e}'
+    return None
+
+
+# ---------------- bulk import ----------------
+# Creates accounts from a CSV file (`flask import patients|doctors`, admin
+# upload), batch by batch instead of one flush / hash / commit per account:
+#   - every row is checked with the rules above
+#   - the batch's emails are checked against users in one query
+#   - passwords are hashed in the hashing pool (passwords.py)
+#   - users and profiles are inserted with two executemany statements and
+#     committed, so a failed row or batch never undoes the earlier ones
+# Inserts bypass the ORM hooks, so doctors are added to the search index,
+# the API's "doctors" version is bumped and the fragment cache cleared here.
+
+ImportKind = namedtuple("ImportKind", "role fields validate")
+
+KINDS = {
+    "patients": ImportKind("Patient", PATIENT_FIELDS, patient_error),
+    "doctors": ImportKind("Doctor", DOCTOR_FIELDS, doctor_error),
+}
+
+class ImportReport:
+    """Counts and per row errors of an import."""
+
+    def __init__(self):
+        self.rows = 0
+        self.created = 0
+        self.errors = []
+        self.started = time.perf_counter()
+        self.elapsed = 0.0
+
+    def error(self, row_number, message):
+        self.errors.append((row_number, message))
+
+    def finish(self):
+        self.elapsed = time.perf_counter() - self.started
+        # a batch reports its rows in passes (invalid, email taken, not saved)
+        self.errors.sort(key=lambda error: error[0])
+
+    @property
+    def rows_per_second(self):
+        return self.rows / max(self.elapsed, 1e-9)
+
+def missing_columns(kind, columns):
+    """Required columns missing from a CSV header."""
+    return [name for name in KINDS[kind].fields if name != "gender" and name not in (columns or ())]
+
+def _insert_accounts(kind, accounts, hashes):
+    """Inserts users + profiles of one batch. Returns the new profile ids."""
+    spec = KINDS[kind]
+    user_ids = db.session.execute(
+        User.__table__.insert().returning(User.__table__.c.id, sort_by_parameter_order=True),
+        [{"name": fields["name"], "email": fields["email"], "password": password_hash, "role": spec.role}
+         for (_, fields), password_hash in zip(accounts, hashes)]
+    ).scalars().all()
+
+    if kind == "doctors":
+        table = Doctor.__table__
+        profiles = [{"user_id": user_id, "specialization": fields["specialization"], "phone": fields["phone"],
+                     "availability": fields["availability"],
+                     "schedule": schedule_from_availability(fields["availability"])}
+                    for user_id, (_, fields) in zip(user_ids, accounts)]
+    else:
+        table = Patient.__table__
+        profiles = [{"user_id": user_id, "age": int(fields["age"]), "gender": fields["gender"] or None,
+                     "blood_group": fields["bloodGroup"], "phone": fields["phone"],
+                     "phone_digits": normalize_phone(fields["phone"]), "address": fields["address"]}
+                    for user_id, (_, fields) in zip(user_ids, accounts)]
+    return db.session.execute(
+        table.insert().returning(table.c.id, sort_by_parameter_order=True), profiles
+    ).scalars().all()
+
+def _taken_emails(emails):
+    return set(db.session.scalars(select(User.email).where(User.email.in_(emails))))
+
+def _import_batch(kind, batch, report, seen_emails):
+    spec = KINDS[kind]
+    accounts = []
+    for row_number, row in batch:
+        fields = {name: (row.get(name) or "").strip() for name in spec.fields}
+        message = spec.validate(fields)
+        if message is None and fields["email"] in seen_emails:
+            message = "This email appears earlier in the file."
+        if message:
+            report.error(row_number, message)
+            continue
+        seen_emails.add(fields["email"])
+        accounts.append((row_number, fields))
+
+    # one query for the whole batch, retried once if an email got registered meanwhile
+    for attempt in range(2):
+        taken = _taken_emails([fields["email"] for _, fields in accounts]) if accounts else set()
+        for row_number, fields in accounts:
+            if fields["email"] in taken:
+                report.error(row_number, 'This email is already being used.')
+        accounts = [(row_number, fields) for row_number, fields in accounts if fields["email"] not in taken]
+        if not accounts:
+            db.session.rollback()
+            return
+
+        if attempt == 0:
+            hashes = dict(zip((row_number for row_number, _ in accounts),
+                              hash_passwords([fields["password"] for _, fields in accounts])))
+        try:
+            profile_ids = _insert_accounts(kind, accounts, [hashes[row_number] for row_number, _ in accounts])
+            if kind == "doctors":
+                conn = db.session.connection()
+                index_new_doctors(conn, profile_ids)
+                touch(conn, ["doctors"])
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()
+            if attempt:
+                # still clashing: give up on this batch, not on the whole import
+                for row_number, _ in accounts:
+                    report.error(row_number, 'Could not be saved, it clashed with an account added meanwhile. Please import it again.')
+                return
+            continue
+        report.created += len(accounts)
+        # new doctors are in the directory, new patients only in the patient count
+        fragment_cache().invalidate(None if kind == "doctors" else "patient_count")
+        return
+
+def import_accounts(kind, rows, batch_size=None):
+    """
+    Creates patient / doctor accounts (kind "patients" / "doctors") from CSV
+    rows (dicts keyed by the form field names, e.g. a csv.DictReader).
+    Returns an ImportReport, errors give the row number as a spreadsheet
+    shows it (the header is row 1).
+    """
+    batch_size = batch_size or current_app.config['IMPORT_BATCH_SIZE']
+    report = ImportReport()
+    seen_emails = set()
+    batch = []
+    for row_number, row in enumerate(rows, start=2):
+        report.rows += 1
+        batch.append((row_number, row))
+        if len(batch) >= batch_size:
+            _import_batch(kind, batch, report, seen_emails)
+            batch = []
+    if batch:
+        _import_batch(kind, batch, report, seen_emails)
+    report.finish()
+    return report
+
+def csv_rows(text_file):
+    """csv.DictReader of an import file, or raises ValueError if it has no header."""
+    reader = csv.DictReader(text_file)
+    if not reader.fieldnames:
+        raise ValueError("The file is empty.")
+    return reader
+
+
+# ---------------- deleting accounts ----------------
+# Deleting a user through the ORM cascade loads every appointment, treatment
+# and payment of theirs, a few queries per appointment. These delete them
+# with a fixed number of set-based statements instead, and do what the flush
+# hooks would have: appointment counters and billing rollups are subtracted
+# before the rows go, the change versions of everyone involved are bumped, a
+# doctor leaves the search index and the fragment cache, a patient the
+# cached patient count.
+
+def _delete_appointments(conn, condition):
+    """Deletes the appointments matching condition (on Appointment) with their treatments and payments."""
+    subtract_appointments(conn, condition)
+    subtract_payments(conn, condition)
+    appointment_ids = select(Appointment.id).where(condition)
+    conn.execute(Treatment.__table__.delete().where(Treatment.appointment_id.in_(appointment_ids)))
+    conn.execute(Payment.__table__.delete().where(Payment.appointment_id.in_(appointment_ids)))
+    conn.execute(Appointment.__table__.delete().where(condition))
+
+def _delete_user(conn, profile, user_id):
+    conn.execute(profile.__table__.delete().where(profile.__table__.c.user_id == user_id))
+    conn.execute(User.__table__.delete().where(User.id == user_id))
+
+def delete_doctor_account(doctor):
+    """Deletes a doctor, their user and their appointments, and commits."""
+    conn = db.session.connection()
+    condition = Appointment.doctor_id == doctor.id
+    patient_ids = conn.execute(select(Appointment.patient_id).where(condition).distinct()).scalars().all()
+
+    _delete_appointments(conn, condition)
+    unindex_doctors(conn, [doctor.id])
+    _delete_user(conn, Doctor, doctor.user_id)
+    touch(conn, {"appointments", "payments", "doctors", "users", f"doctor:{doctor.id}"}
+          | {f"patient:{patient_id}" for patient_id in patient_ids})
+    db.session.commit()
+    fragment_cache().invalidate()
+
+def delete_patient_account(patient):
+    """Deletes a patient, their user and their appointments, and commits."""
+    conn = db.session.connection()
+    condition = Appointment.patient_id == patient.id
+    doctor_ids = conn.execute(select(Appointment.doctor_id).where(condition).distinct()).scalars().all()
+
+    _delete_appointments(conn, condition)
+    _delete_user(conn, Patient, patient.user_id)
+    touch(conn, {"appointments", "payments", "users", f"patient:{patient.id}"}
+          | {f"doctor:{doctor_id}" for doctor_id in doctor_ids})
+    db.session.commit()
+    fragment_cache().invalidate("patient_count")
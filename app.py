@@ -1,21 +1,51 @@
-from flask import Flask, render_template
+import os
+from flask import Flask
 from dotenv import load_dotenv
-from flask_sqlalchemy import SQLAlchemy
+from jinja2 import FileSystemBytecodeCache
 from config import Config
-from models import db, create_tables
+from models import db
+from routes import register_blueprints
+import database
+import sqltrace
+import cache
+import assets
+import compression
+import commands
 
 load_dotenv()
 
-app = Flask(__name__)
+def create_app(config_class=Config):
+    """
+    Application factory. Building the app doesn't touch the database: the
+    schema and the admin account are set up by `flask bootstrap`, once per
+    deploy instead of in every worker.
+    """
+    app = Flask(__name__)
 
-app.config.from_object(Config)
+    app.config.from_object(config_class)
 
-db.init_app(app)
+    db.init_app(app)
+    database.init_app(app)
+    sqltrace.init_app(app)
+    cache.init_app(app)
+    assets.init_app(app)
+    compression.init_app(app)
 
-with app.app_context():
-    create_tables()
+    # compiled templates on disk, shared by all workers and restarts
+    # (`flask bootstrap` fills it, see commands.py)
+    if app.config['JINJA_BYTECODE_CACHE']:
+        cache_dir = app.config['JINJA_CACHE_DIR'] or os.path.join(app.instance_path, 'jinja_cache')
+        os.makedirs(cache_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(cache_dir)
 
-from routes import *
+    register_blueprints(app)
+    commands.init_app(app)
+
+    return app
 
 if __name__ == '__main__':
-    app.run(debug=True, threaded=True)
\ No newline at end of file
+    app = create_app()
+    # dev server: set the database up on the fly
+    with app.app_context():
+        commands.bootstrap()
+    app.run(debug=True, threaded=True)
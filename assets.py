@@ -0,0 +1,141 @@
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+from flask import current_app, request, send_from_directory, url_for, abort
+
+try:
+    import brotli
+except ImportError:
+    # optional, without it only gzip variants are written
+    brotli = None
+
+# ---------------- static assets ----------------
+# `flask assets build` (and `flask bootstrap`) copies every file of static/
+# to ASSET_DIR under a content hashed name (css/style.css ->
+# css/style.3f2a9c1b7d4e.css), writes gzip / brotli variants of the text
+# files next to it and a manifest.json mapping the original names.
+# Templates link them with asset_url('css/style.css'). A hashed file never
+# changes, so /assets/ answers with a one year immutable Cache-Control and
+# browsers stop revalidating; a new build gives new names. The best variant
+# the client accepts (Accept-Encoding: brotli, then gzip) is sent as is,
+# nothing is compressed per request.
+#
+# Files missing from the manifest (no build yet, a file added later) and the
+# debug server (edits show up without a rebuild) fall back to /static/.
+
+COMPRESSIBLE = {".css", ".js", ".svg", ".json", ".txt", ".html", ".xml", ".ico", ".map"}
+
+# Content-Encoding -> file suffix, preferred first
+ENCODINGS = (("br", ".br"), ("gzip", ".gz"))
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+
+MANIFEST = "manifest.json"
+
+def _hashed_name(path, digest):
+    root, ext = os.path.splitext(path)
+    return f"{root}.{digest[:12]}{ext}"
+
+def _compress(data, encoding):
+    if encoding == "gzip":
+        # mtime=0, the same input always gives the same file
+        return gzip.compress(data, compresslevel=9, mtime=0)
+    if encoding == "br" and brotli is not None:
+        return brotli.compress(data, quality=11)
+    return None
+
+def build_assets(static_folder, output_dir):
+    """
+    Writes the hashed files, their compressed variants and the manifest.
+    Returns the manifest. Files of earlier builds are kept, pages rendered by
+    workers that still run the old manifest keep linking them.
+    """
+    manifest = {}
+    for folder, _, files in os.walk(static_folder):
+        for file_name in sorted(files):
+            source = os.path.join(folder, file_name)
+            name = os.path.relpath(source, static_folder).replace(os.sep, "/")
+            with open(source, "rb") as f:
+                data = f.read()
+            hashed = _hashed_name(name, hashlib.sha256(data).hexdigest())
+            target = os.path.join(output_dir, hashed)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            with open(target, "wb") as f:
+                f.write(data)
+
+            encodings = []
+            if os.path.splitext(name)[1].lower() in COMPRESSIBLE:
+                for encoding, suffix in ENCODINGS:
+                    compressed = _compress(data, encoding)
+                    # only worth it if it is smaller
+                    if compressed is not None and len(compressed) < len(data):
+                        with open(target + suffix, "wb") as f:
+                            f.write(compressed)
+                        encodings.append(encoding)
+            manifest[name] = {"path": hashed, "size": len(data), "encodings": encodings}
+
+    # replaced in one step, a worker starting meanwhile reads the old or the new one
+    os.makedirs(output_dir, exist_ok=True)
+    temporary = os.path.join(output_dir, MANIFEST + ".tmp")
+    with open(temporary, "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    os.replace(temporary, os.path.join(output_dir, MANIFEST))
+    return manifest
+
+def load_manifest(output_dir):
+    try:
+        with open(os.path.join(output_dir, MANIFEST)) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return {}
+    return {"names": {name: entry["path"] for name, entry in manifest.items()},
+            "encodings": {entry["path"]: entry["encodings"] for entry in manifest.values()}}
+
+def asset_dir(app):
+    return app.config['ASSET_DIR'] or os.path.join(app.instance_path, 'assets')
+
+
+def asset_url(filename, **values):
+    """url_for('static', filename=...) for the hashed build of the file, if there is one."""
+    hashed = current_app.extensions["assets"].get("names", {}).get(filename)
+    if hashed is None or current_app.debug:
+        return url_for('static', filename=filename, **values)
+    return url_for('assets', filename=hashed, **values)
+
+def serve_asset(filename):
+    if filename == MANIFEST:
+        abort(404)
+    directory = asset_dir(current_app)
+    encodings = current_app.extensions["assets"].get("encodings", {}).get(filename)
+    if encodings is None:
+        # a file of an earlier build
+        encodings = [encoding for encoding, suffix in ENCODINGS
+                     if os.path.isfile(os.path.join(directory, filename + suffix))]
+
+    accepted = request.accept_encodings
+    chosen = next(((encoding, suffix) for encoding, suffix in ENCODINGS
+                   if encoding in encodings and accepted[encoding]), None)
+
+    mimetype = mimetypes.guess_type(filename)[0] or "application/octet-stream"
+    if chosen:
+        response = send_from_directory(directory, filename + chosen[1], mimetype=mimetype)
+        response.headers["Content-Encoding"] = chosen[0]
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+    if encodings:
+        response.vary.add("Accept-Encoding")
+    response.headers["Cache-Control"] = IMMUTABLE
+    return response
+
+def init_app(app):
+    app.extensions["assets"] = load_manifest(asset_dir(app))
+    app.add_url_rule("/assets/<path:filename>", "assets", serve_asset)
+    app.jinja_env.globals["asset_url"] = asset_url
+
+def build(app):
+    """Builds the assets of the app and reloads its manifest. Returns the number of files."""
+    manifest = build_assets(app.static_folder, asset_dir(app))
+    app.extensions["assets"] = load_manifest(asset_dir(app))
+    return len(manifest)
@@ -0,0 +1,190 @@
+import json
+import re
+from itertools import takewhile
+from datetime import datetime, date
+
+# ---------------- doctor availability ----------------
+# Doctors still type their availability as text, now with a few more forms:
+#
+#   Mon-Fri, 9 AM - 5 PM                                 (the original format)
+#   Mon-Fri, 9 AM - 1 PM, 2 PM - 6 PM; Sat, 10 AM - 1 PM (several days / ranges)
+#   Mon, Wed, Fri, 9:30 AM - 4 PM                        (day lists)
+#   Break 1 PM - 1:30 PM   or   Break Mon-Fri, 1 PM - 2 PM
+#   Closed 2025-12-25, 2026-01-01                        (holidays)
+#
+# parse_availability() turns the text into a structured schedule (stored as
+# JSON in doctors.schedule), and CompiledSchedule turns that into one bitmask
+# of working minutes per weekday, so checking a time is a single bit test.
+
+DAY_NAMES = ["Mon", "Tue", "Wed", "Thu", "Fri", "Sat", "Sun"]
+DAY_MAP = {name: index for index, name in enumerate(DAY_NAMES)}
+MINUTES_PER_DAY = 24 * 60
+
+class AvailabilityError(ValueError):
+    pass
+
+
+# ---------------- parsing ----------------
+
+def _parse_time(value):
+    value = value.strip().upper()
+    for fmt in ("%I %p", "%I:%M %p", "%I%p", "%I:%M%p", "%H:%M"):
+        try:
+            parsed = datetime.strptime(value, fmt)
+            return parsed.hour * 60 + parsed.minute
+        except ValueError:
+            continue
+    raise AvailabilityError(f"Could not read the time '{value}'.")
+
+def _parse_range(value):
+    parts = value.split("-")
+    if len(parts) != 2:
+        raise AvailabilityError(f"Could not read the time range '{value.strip()}'.")
+    start, end = _parse_time(parts[0]), _parse_time(parts[1])
+    # "12 AM" as an end time means midnight at the end of the day
+    if end == 0:
+        end = MINUTES_PER_DAY
+    if start >= end:
+        raise AvailabilityError(f"The time range '{value.strip()}' ends before it starts.")
+    return [start, end]
+
+def _day_index(name):
+    key = name.strip()[:3].title()
+    if key not in DAY_MAP:
+        raise AvailabilityError(f"Could not read the day '{name.strip()}'.")
+    return DAY_MAP[key]
+
+def _parse_days(value):
+    days = set()
+    for part in value.split("/"):
+        if "-" in part:
+            first, last = (_day_index(name) for name in part.split("-", 1))
+            day = first
+            days.add(day)
+            while day != last:
+                day = (day + 1) % 7
+                days.add(day)
+        else:
+            days.add(_day_index(part))
+    return sorted(days)
+
+def _looks_like_days(value):
+    return not re.search(r"\d", value)
+
+def parse_availability(text):
+    """
+    Parses an availability string into
+    {"weekly": {"0": [[start, end], ...], ...}, "breaks": {...}, "holidays": ["YYYY-MM-DD", ...]}
+    with times in minutes from midnight. Raises AvailabilityError.
+    """
+    if not text or not text.strip():
+        raise AvailabilityError("Availability is empty.")
+
+    weekly, breaks, holidays = {}, {}, set()
+
+    for section in filter(None, (s.strip() for s in text.split(";"))):
+        keyword, _, rest = section.partition(" ")
+
+        if keyword.lower() == "closed":
+            for value in filter(None, (v.strip() for v in rest.split(","))):
+                try:
+                    holidays.add(date.fromisoformat(value).isoformat())
+                except ValueError:
+                    raise AvailabilityError(f"Could not read the date '{value}' (use YYYY-MM-DD).")
+            continue
+
+        target = weekly
+        if keyword.lower() == "break":
+            target, section = breaks, rest
+
+        parts = [p for p in section.split(",") if p.strip()]
+        day_parts = list(takewhile(_looks_like_days, parts))
+        if day_parts:
+            # "Mon-Fri" or "Mon, Wed, Fri" before the time ranges
+            days = sorted({day for part in day_parts for day in _parse_days(part)})
+            ranges = parts[len(day_parts):]
+        elif target is breaks:
+            # a break without days applies to every day
+            days, ranges = list(range(7)), parts
+        else:
+            raise AvailabilityError(f"Could not read '{section}', expected e.g. 'Mon-Fri, 9 AM - 5 PM'.")
+
+        if not ranges:
+            raise AvailabilityError(f"No time range given in '{section}'.")
+        for day in days:
+            for value in ranges:
+                target.setdefault(str(day), []).append(_parse_range(value))
+
+    if not weekly:
+        raise AvailabilityError("No working days given, expected e.g. 'Mon-Fri, 9 AM - 5 PM'.")
+
+    return {"weekly": weekly, "breaks": breaks, "holidays": sorted(holidays)}
+
+def schedule_from_availability(text):
+    """JSON schedule for doctors.schedule, or None if the text can't be parsed."""
+    try:
+        return json.dumps(parse_availability(text), sort_keys=True)
+    except AvailabilityError:
+        return None
+
+
+# ---------------- compiled form ----------------
+
+def _mask(ranges):
+    mask = 0
+    for start, end in ranges:
+        mask |= ((1 << (end - start)) - 1) << start
+    return mask
+
+class CompiledSchedule:
+    """One bitmask of working minutes per weekday plus the set of closed dates."""
+
+    __slots__ = ("day_masks", "holidays")
+
+    def __init__(self, schedule):
+        self.day_masks = tuple(
+            _mask(schedule["weekly"].get(str(day), [])) & ~_mask(schedule["breaks"].get(str(day), []))
+            for day in range(7)
+        )
+        self.holidays = frozenset(date.fromisoformat(value) for value in schedule["holidays"])
+
+    def mask_for(self, day):
+        """Working minutes of a calendar date (0 on holidays)."""
+        if day in self.holidays:
+            return 0
+        return self.day_masks[day.weekday()]
+
+    def check(self, appointment_datetime):
+        day = appointment_datetime.date()
+        if day in self.holidays:
+            return False, "The doctor is not available on this date."
+        mask = self.day_masks[day.weekday()]
+        if not mask:
+            return False, "The selected day is outside the doctor's working days."
+        minute = appointment_datetime.hour * 60 + appointment_datetime.minute
+        if not (mask >> minute) & 1:
+            return False, "The selected time is outside the doctor's working hours."
+        return True, "Slot is available."
+
+
+# doctor id -> (schedule json, CompiledSchedule)
+# Entries are keyed on the JSON too, so a schedule changed by another worker
+# is recompiled here on first use even without an explicit invalidate.
+_compiled_cache = {}
+
+def get_schedule(doctor):
+    """The compiled schedule of a doctor, or None if their availability can't be parsed."""
+    schedule_json = doctor.schedule
+    if schedule_json is None:
+        return None
+
+    cached = _compiled_cache.get(doctor.id)
+    if cached and cached[0] == schedule_json:
+        return cached[1]
+
+    compiled = CompiledSchedule(json.loads(schedule_json))
+    _compiled_cache[doctor.id] = (schedule_json, compiled)
+    return compiled
+
+def invalidate_schedule(doctor_id):
+    _compiled_cache.pop(doctor_id, None)
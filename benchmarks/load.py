@@ -0,0 +1,96 @@
+# benchmarks/load.py
+#
+# HTTP load driver for a running server (dev server or gunicorn). Logs in
+# once, then CONCURRENCY threads request the given paths round robin over
+# keep-alive connections for DURATION seconds and report requests/s and
+# latency percentiles. Compares serving setups, unlike run.py which measures
+# the routes themselves through the test client.
+#
+#   python benchmarks/load.py http://127.0.0.1:8000 --paths /admin/dashboard,/login
+#   python benchmarks/load.py http://127.0.0.1:5000 --concurrency 32 --duration 20
+
+import argparse
+import http.client
+import threading
+import time
+from urllib.parse import urlencode, urlsplit
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+def login(host, port, email, password):
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    body = urlencode({"email": email, "password": password})
+    conn.request("POST", "/login", body, {"Content-Type": "application/x-www-form-urlencoded"})
+    response = conn.getresponse()
+    response.read()
+    cookie = response.getheader("Set-Cookie")
+    if response.status != 302 or not cookie:
+        raise SystemExit(f"login as {email} failed ({response.status})")
+    return cookie.split(";", 1)[0]
+
+def worker(host, port, paths, headers, deadline, results, lock):
+    latencies, errors = [], 0
+    conn = http.client.HTTPConnection(host, port, timeout=30)
+    index = 0
+    while time.perf_counter() < deadline:
+        path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            conn.request("GET", path, headers=headers)
+            response = conn.getresponse()
+            response.read()
+            if response.status != 200:
+                errors += 1
+        except (OSError, http.client.HTTPException):
+            errors += 1
+            conn.close()
+            conn = http.client.HTTPConnection(host, port, timeout=30)
+            continue
+        latencies.append((time.perf_counter() - started) * 1000)
+    conn.close()
+    with lock:
+        results["latencies"].extend(latencies)
+        results["errors"] += errors
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive a running server and report requests/s.")
+    parser.add_argument("url", help="e.g. http://127.0.0.1:8000")
+    parser.add_argument("--paths", default="/admin/dashboard", help="comma separated, requested round robin")
+    parser.add_argument("--email", default="admin@gmail.com")
+    parser.add_argument("--password", default="admin")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=15, help="seconds")
+    args = parser.parse_args()
+
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    headers = {"Cookie": login(host, port, args.email, args.password)}
+    paths = args.paths.split(",")
+
+    results = {"latencies": [], "errors": 0}
+    lock = threading.Lock()
+    deadline = time.perf_counter() + args.duration
+    threads = [threading.Thread(target=worker, args=(host, port, paths, headers, deadline, results, lock))
+               for _ in range(args.concurrency)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies = results["latencies"]
+    print(f"{args.url} {','.join(paths)} concurrency={args.concurrency}")
+    print(f"  {len(latencies):,} requests in {elapsed:.1f}s: {len(latencies) / elapsed:,.1f} req/s, {results['errors']} errors")
+    print(f"  p50 {percentile(latencies, 0.50):.1f} ms  p95 {percentile(latencies, 0.95):.1f} ms  "
+          f"p99 {percentile(latencies, 0.99):.1f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,403 @@
+# benchmarks/run.py
+#
+# Route benchmarks. For every scale a SQLite database is seeded once with
+# seed.py (cached in benchmarks/data/), copied, and every route in routes.py
+# is driven through the Flask test client with the matching role logged in.
+# Each route reports latency percentiles and the number of SQL statements it
+# ran, and both are checked against benchmarks/budgets.json, so a new N+1
+# (e.g. a lazy load added to a template) fails the run.
+#
+#   python benchmarks/run.py                       # 1k and 100k appointments
+#   python benchmarks/run.py --scales 1k,100k,1m --iterations 50
+#   python benchmarks/run.py --routes admin_dashboard,doctor_dashboard
+#
+# Every scale runs in its own process with its own DATABASE_URL (Config reads
+# it when config.py is imported).
+
+import argparse
+import io
+import json
+import os
+import shutil
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HERE = os.path.join(ROOT, "benchmarks")
+DATA_DIR = os.path.join(HERE, "data")
+RESULTS_DIR = os.path.join(HERE, "results")
+BUDGETS_FILE = os.path.join(HERE, "budgets.json")
+
+# scale -> seed.py arguments
+SCALES = {
+    "1k": dict(doctors=20, patients=500, appointments=1000, days_back=30, days_ahead=30),
+    "100k": dict(doctors=200, patients=20000, appointments=100000, days_back=180, days_ahead=60),
+    "1m": dict(doctors=1000, patients=200000, appointments=1000000, days_back=365, days_ahead=60),
+}
+SEED = 7
+
+# routes that delete or create data run fewer times (each run needs a fresh target)
+DESTRUCTIVE_ITERATIONS = 5
+
+
+# ---------------- parent: seed, run scales, check budgets ----------------
+
+def seed_database(scale, reseed):
+    path = os.path.join(DATA_DIR, f"seed-{scale}.db")
+    if os.path.exists(path) and not reseed:
+        return path
+    os.makedirs(DATA_DIR, exist_ok=True)
+    args = [sys.executable, os.path.join(ROOT, "seed.py"), "--seed", str(SEED)]
+    for key, value in SCALES[scale].items():
+        args += [f"--{key.replace('_', '-')}", str(value)]
+    # seed next to the real file and only move it into place once seeding worked,
+    # a failed or interrupted seed must not leave a half-written db for later runs
+    tmp_path = path + ".tmp"
+    remove_database(tmp_path)
+    print(f"[{scale}] seeding {path}")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{tmp_path}", PASSWORD_HASH_WORKERS="0")
+    try:
+        subprocess.run(args, cwd=ROOT, env=env, check=True, stdout=subprocess.DEVNULL)
+    except BaseException:
+        remove_database(tmp_path)
+        raise
+    remove_database(path)
+    os.replace(tmp_path, path)
+    return path
+
+def remove_database(path):
+    for name in (path, path + "-wal", path + "-shm"):
+        if os.path.exists(name):
+            os.remove(name)
+
+def run_scale(scale, iterations, routes, reseed):
+    seed_path = seed_database(scale, reseed)
+    # routes write (book, cancel, delete ...), so they get a throwaway copy
+    run_path = os.path.join(DATA_DIR, f"run-{scale}.db")
+    shutil.copyfile(seed_path, run_path)
+    result_path = os.path.join(RESULTS_DIR, f"{scale}.json")
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+
+    args = [sys.executable, os.path.abspath(__file__), "--worker", scale,
+            "--iterations", str(iterations), "--output", result_path]
+    if routes:
+        args += ["--routes", ",".join(routes)]
+    print(f"[{scale}] running routes")
+    env = dict(os.environ, DATABASE_URL=f"sqlite:///{run_path}")
+    subprocess.run(args, cwd=ROOT, env=env, check=True)
+    with open(result_path) as f:
+        return json.load(f)
+
+def query_budget(budget, scale):
+    value = budget.get("max_queries")
+    return value.get(scale) if isinstance(value, dict) else value
+
+def check_budgets(scale, results, budgets):
+    """Returns a list of failure messages."""
+    failures = []
+    for route, stats in results.items():
+        if stats["errors"]:
+            failures.append(f"{route}: {stats['errors']} server error(s), last status {stats['status']}")
+        budget = budgets.get(route)
+        if budget is None:
+            failures.append(f"{route}: no budget in budgets.json")
+            continue
+        max_queries = query_budget(budget, scale)
+        if max_queries is not None and stats["queries_max"] > max_queries:
+            failures.append(f"{route}: {stats['queries_max']} queries, budget {max_queries}")
+        p95_budget = budget.get("p95_ms", {}).get(scale)
+        if p95_budget is not None and stats["p95_ms"] > p95_budget:
+            failures.append(f"{route}: p95 {stats['p95_ms']:.1f} ms, budget {p95_budget} ms")
+    return failures
+
+def print_table(scale, results, budgets):
+    print(f"\n[{scale}] {'route':<32} {'n':>4} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'max ms':>8} {'queries':>8} {'budget':>7}")
+    for route, stats in results.items():
+        budget = query_budget(budgets.get(route, {}), scale)
+        print(f"[{scale}] {route:<32} {stats['n']:>4} {stats['p50_ms']:>8.1f} {stats['p95_ms']:>8.1f} "
+              f"{stats['p99_ms']:>8.1f} {stats['max_ms']:>8.1f} {stats['queries_max']:>8} {budget if budget is not None else '-':>7}")
+
+def main(args):
+    with open(BUDGETS_FILE) as f:
+        budgets = json.load(f)
+    routes = [r for r in args.routes.split(",") if r] if args.routes else None
+
+    failed = False
+    for scale in args.scales.split(","):
+        if scale not in SCALES:
+            sys.exit(f"unknown scale {scale}, choose from {', '.join(SCALES)}")
+        results = run_scale(scale, args.iterations, routes, args.reseed)
+        print_table(scale, results, budgets)
+        failures = check_budgets(scale, results, budgets if not args.no_latency else
+                                 {route: {"max_queries": b.get("max_queries")} for route, b in budgets.items()})
+        for failure in failures:
+            print(f"[{scale}] BUDGET FAILED {failure}")
+        failed = failed or bool(failures)
+
+    print("\nbudgets exceeded" if failed else "\nall budgets met")
+    sys.exit(1 if failed else 0)
+
+
+# ---------------- worker: drive the routes of one database ----------------
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(fraction * (len(ordered) - 1))))
+    return ordered[index]
+
+class Fixture:
+    """Ids of the rows the routes are driven with, picked from the seeded data."""
+
+    def __init__(self, app):
+        from models import db, Doctor, Patient, Appointment
+        from slots import find_free_slots
+
+        with app.app_context():
+            now = datetime.now()
+            # busiest doctor (biggest calendar) and a patient with upcoming appointments
+            self.doctor_id = db.session.query(Appointment.doctor_id).group_by(Appointment.doctor_id) \
+                .order_by(db.func.count().desc()).limit(1).scalar()
+            doctor = db.session.get(Doctor, self.doctor_id)
+            self.doctor_email = doctor.user.email
+            self.doctor_availability = doctor.availability
+            self.doctor_appointments = [a.id for a in Appointment.query.filter_by(doctor_id=self.doctor_id)
+                                        .order_by(Appointment.appointment_date.desc()).limit(200)]
+
+            self.patient_id = db.session.query(Appointment.patient_id).filter(
+                Appointment.appointment_date >= now, Appointment.status == 'Scheduled'
+            ).group_by(Appointment.patient_id).order_by(db.func.count().desc()).limit(1).scalar()
+            patient = db.session.get(Patient, self.patient_id)
+            self.patient_email = patient.user.email
+            self.patient_form = dict(name=patient.user.name, email=patient.user.email, phone=patient.phone,
+                                     age=patient.age, gender=patient.gender, bloodGroup=patient.blood_group,
+                                     address=patient.address)
+            self.patient_appointments = [a.id for a in Appointment.query.filter_by(patient_id=self.patient_id)
+                                         .order_by(Appointment.appointment_date.desc()).limit(200)]
+            # a patient of the busiest doctor, for the doctor's view of the medical history
+            self.doctor_patient_id = db.session.get(Appointment, self.doctor_appointments[0]).patient_id
+            self.upcoming_appointments = [a.id for a in Appointment.query.filter(
+                Appointment.patient_id == self.patient_id, Appointment.appointment_date >= now)]
+
+            self.stylesheet = "/assets/" + app.extensions["assets"]["names"]["css/style.css"]
+
+            self.doctor_form = dict(name=doctor.user.name, email=doctor.user.email, specialization=doctor.specialization,
+                                    phone=doctor.phone, availability=doctor.availability)
+
+            # open slots of the busiest doctor for booking / rescheduling
+            today = date.today()
+            free = find_free_slots([doctor], today + timedelta(days=1), today + timedelta(days=31),
+                                   app.config['SLOT_MINUTES'])[doctor.id]
+            self.free_slots = [(day.isoformat(), f"{minute // 60:02d}:{minute % 60:02d}")
+                               for day, minutes in sorted(free.items()) for minute in minutes]
+
+            # the least busy doctors / patients are deleted by the delete routes
+            busy = {self.doctor_id}
+            self.delete_doctors = [d.id for d in Doctor.query.filter(Doctor.id.notin_(busy))
+                                   .order_by(Doctor.id.desc()).limit(DESTRUCTIVE_ITERATIONS + 1)]
+            self.delete_patients = [p.id for p in Patient.query.filter(Patient.id != self.patient_id)
+                                    .order_by(Patient.id.desc()).limit(DESTRUCTIVE_ITERATIONS + 1)]
+
+def route_specs(fx):
+    """
+    (name, role, method, url(i), data(i), destructive) for every route, the
+    name is the endpoint plus an optional ":variant" (budgets.json keys).
+    data is the form of a POST and the request headers of a GET.
+    i is the iteration number, so writes can pick a different row each time.
+    """
+    def cycle(items):
+        return lambda i: items[i % len(items)]
+
+    doctor_appointment = cycle(fx.doctor_appointments)
+    patient_appointment = cycle(fx.patient_appointments)
+    upcoming = cycle(fx.upcoming_appointments or fx.patient_appointments)
+    free_slot = cycle(fx.free_slots or [(date.today().isoformat(), "10:00")])
+    stamp = int(time.time())
+    not_modified = {"If-None-Match": "*"}
+
+    return [
+        ("home", None, "GET", lambda i: "/", None, False),
+        ("register", None, "GET", lambda i: "/register", None, False),
+        ("register:post", None, "POST", lambda i: "/register", lambda i: dict(
+            name="Bench Patient", email=f"bench.patient.{stamp}.{i}@example.com", password="test", age=30,
+            bloodGroup="O+", gender="Male", phone="9876543210", address="Bench Street"), True),
+        ("login", None, "GET", lambda i: "/login", None, False),
+        ("assets", None, "GET", lambda i: fx.stylesheet, lambda i: {"Accept-Encoding": "gzip, br"}, False),
+        ("login:post", None, "POST", lambda i: "/login", lambda i: dict(email=fx.patient_email, password="test"), False),
+        ("logout", "Patient", "POST", lambda i: "/logout", None, False),
+
+        ("admin_dashboard", "Admin", "GET", lambda i: "/admin/dashboard", None, False),
+        ("admin_dashboard:search", "Admin", "GET", lambda i: "/admin/dashboard?doctor_search=card&patient_search=ra&status=Scheduled", None, False),
+        ("doctor_register", "Admin", "GET", lambda i: "/admin/doctor_register", None, False),
+        ("doctor_register:post", "Admin", "POST", lambda i: "/admin/doctor_register", lambda i: dict(
+            name="Dr. Bench", email=f"bench.doctor.{stamp}.{i}@example.com", password="test",
+            specialization="Cardiology", phone="9876543210", availability="Mon-Fri, 9 AM - 5 PM"), True),
+        ("edit_doctor", "Admin", "GET", lambda i: f"/admin/doctor/edit/{fx.doctor_id}", None, False),
+        ("edit_doctor:post", "Admin", "POST", lambda i: f"/admin/doctor/edit/{fx.doctor_id}", lambda i: fx.doctor_form, False),
+        ("delete_doctor", "Admin", "POST", lambda i: f"/admin/doctor/delete/{fx.delete_doctors[i]}", None, True),
+        ("edit_patient:admin", "Admin", "GET", lambda i: f"/patient/edit/{fx.patient_id}", None, False),
+        ("edit_patient:admin_post", "Admin", "POST", lambda i: f"/patient/edit/{fx.patient_id}", lambda i: fx.patient_form, False),
+        ("delete_patient", "Admin", "POST", lambda i: f"/admin/patient/delete/{fx.delete_patients[i]}", None, True),
+        ("admin_view_patient_history", "Admin", "GET", lambda i: f"/admin/patient_history/{fx.patient_id}", None, False),
+        ("admin_view_patient_history:date", "Admin", "GET",
+         lambda i: f"/admin/patient_history/{fx.patient_id}?date={date.today().isoformat()}", None, False),
+        ("export_appointments", "Admin", "GET", lambda i: f"/admin/export/appointments.csv?date_from={date.today()}"
+                                                          f"&date_to={date.today() + timedelta(days=6)}", None, False),
+        ("export_appointments:ndjson", "Admin", "GET", lambda i: f"/admin/export/appointments.ndjson?date_from={date.today()}"
+                                                                 f"&date_to={date.today() + timedelta(days=6)}", None, False),
+        ("admin_billing", "Admin", "GET", lambda i: "/admin/billing", None, False),
+        ("admin_billing:day", "Admin", "GET",
+         lambda i: f"/admin/billing?date_from={date.today() - timedelta(days=365)}&date_to={date.today()}&period=day", None, False),
+        ("import_accounts_upload", "Admin", "GET", lambda i: "/admin/import", None, False),
+        ("import_accounts_upload:post", "Admin", "POST", lambda i: "/admin/import", lambda i: dict(
+            kind="patients", file=(io.BytesIO(
+                "name,email,password,age,gender,bloodGroup,phone,address\n"
+                f"Bench Import,bench.import.{stamp}.{i}@example.com,test,30,Male,O+,9876543210,Bench Street\n".encode()),
+                "patients.csv")), True),
+        ("free_slots:admin", "Admin", "GET", lambda i: "/slots?specialization=Cardiology&days=7", None, False),
+
+        ("doctor_dashboard", "Doctor", "GET", lambda i: "/doctor/dashboard", None, False),
+        ("doctor_dashboard:month", "Doctor", "GET", lambda i: "/doctor/dashboard?view=month", None, False),
+        ("appointment_details", "Doctor", "GET", lambda i: f"/doctor/appointment/{doctor_appointment(i)}", None, False),
+        ("update_appointment_status", "Doctor", "POST", lambda i: f"/doctor/appointment/update_status/{doctor_appointment(i)}",
+         lambda i: dict(status="Cancelled"), False),
+        ("save_treatment", "Doctor", "POST", lambda i: f"/doctor/appointment/save_treatment/{doctor_appointment(i + 100)}",
+         lambda i: dict(diagnosis="Bench", prescription="Rest", notes=""), False),
+        ("patient_history", "Doctor", "GET", lambda i: f"/doctor/patient_history/{fx.doctor_patient_id}", None, False),
+        ("update_availability", "Doctor", "GET", lambda i: "/doctor/update_availability", None, False),
+        ("update_availability:post", "Doctor", "POST", lambda i: "/doctor/update_availability",
+         lambda i: dict(availability=fx.doctor_availability), False),
+
+        ("user_dashboard", "Patient", "GET", lambda i: "/user/dashboard", None, False),
+        ("find_doctor", "Patient", "GET", lambda i: "/find_doctor?doctor_search=neuro", None, False),
+        ("book_appointment", "Patient", "GET", lambda i: f"/book_appointment/{fx.doctor_id}", None, False),
+        ("book_appointment:post", "Patient", "POST", lambda i: f"/book_appointment/{fx.doctor_id}",
+         lambda i: dict(zip(("date", "time"), free_slot(i)), notes=""), False),
+        ("free_slots:patient", "Patient", "GET", lambda i: f"/slots?doctor_id={fx.doctor_id}&days=14", None, False),
+        ("view_diagnosis", "Patient", "GET", lambda i: f"/patient/diagnosis/{patient_appointment(i)}", None, False),
+        ("reschedule_appointment", "Patient", "GET", lambda i: f"/patient/appointment/reschedule/{upcoming(i)}", None, False),
+        ("reschedule_appointment:post", "Patient", "POST", lambda i: f"/patient/appointment/reschedule/{upcoming(i)}",
+         lambda i: dict(zip(("date", "time"), free_slot(i + 50))), False),
+        ("cancel_appointment", "Patient", "POST", lambda i: f"/patient/appointment/cancel/{upcoming(i)}", None, False),
+        ("edit_patient:patient", "Patient", "GET", lambda i: f"/patient/edit/{fx.patient_id}", None, False),
+
+        # "If-None-Match: *" matches any ETag, i.e. the cost of an unchanged poll (304)
+        ("appointments", "Admin", "GET", lambda i: "/api/v1/appointments", None, False),
+        ("appointments:not_modified", "Admin", "GET", lambda i: "/api/v1/appointments", lambda i: not_modified, False),
+        ("doctors", "Patient", "GET", lambda i: "/api/v1/doctors?q=card", None, False),
+        ("doctors:not_modified", "Patient", "GET", lambda i: "/api/v1/doctors?q=card", lambda i: not_modified, False),
+        ("doctor_appointments", "Doctor", "GET", lambda i: "/api/v1/doctor/appointments?view=month", None, False),
+        ("doctor_appointments:not_modified", "Doctor", "GET", lambda i: "/api/v1/doctor/appointments?view=month",
+         lambda i: not_modified, False),
+        ("patient_appointments", "Patient", "GET", lambda i: "/api/v1/patient/appointments", None, False),
+        ("patient_appointments:not_modified", "Patient", "GET", lambda i: "/api/v1/patient/appointments",
+         lambda i: not_modified, False),
+        ("billing", "Admin", "GET", lambda i: "/api/v1/billing", None, False),
+        ("billing:not_modified", "Admin", "GET", lambda i: "/api/v1/billing", lambda i: not_modified, False),
+        ("cache_stats", "Admin", "GET", lambda i: "/api/v1/cache", None, False),
+    ]
+
+def worker(args):
+    sys.path.insert(0, ROOT)
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    statements = [0]
+
+    @event.listens_for(Engine, "before_cursor_execute")
+    def count_statement(*_):
+        statements[0] += 1
+
+    from app import create_app
+    from migrations import upgrade
+    import assets
+    app = create_app()
+    # cached seeds may predate newer migrations, and pages link the built assets
+    with app.app_context():
+        upgrade()
+    assets.build(app)
+    fx = Fixture(app)
+    credentials = {"Admin": ("admin@gmail.com", "admin"), "Doctor": (fx.doctor_email, "test"),
+                   "Patient": (fx.patient_email, "test")}
+    clients = {}
+    for role, (email, password) in credentials.items():
+        client = app.test_client()
+        response = client.post("/login", data={"email": email, "password": password})
+        if response.status_code != 302 or "/login" in response.headers.get("Location", ""):
+            sys.exit(f"could not log in as {role} ({email})")
+        clients[role] = client
+
+    wanted = set(args.routes.split(",")) if args.routes else None
+    covered = set()
+    results = {}
+    for name, role, method, url, data, destructive in route_specs(fx):
+        endpoint = name.split(":")[0]
+        covered.add(endpoint)
+        if wanted and endpoint not in wanted and name not in wanted:
+            continue
+        iterations = min(args.iterations, DESTRUCTIVE_ITERATIONS) if destructive else args.iterations
+
+        timings, queries, errors, status = [], [], 0, None
+        for i in range(iterations + 1):
+            # logout ends the session, every run gets a freshly logged in client
+            if endpoint == "logout":
+                client = app.test_client()
+                client.post("/login", data={"email": fx.patient_email, "password": "test"})
+            else:
+                client = clients[role] if role else app.test_client()
+
+            statements[0] = 0
+            started = time.perf_counter()
+            if method == "GET":
+                response = client.get(url(i), headers=data(i) if data else None)
+            else:
+                response = client.post(url(i), data=data(i) if data else None)
+            # streamed bodies (dashboards, exports) are rendered while they are read
+            response.get_data()
+            response.close()
+            elapsed = (time.perf_counter() - started) * 1000
+            status = response.status_code
+            errors += status >= 500
+            # the first request warms templates and caches up
+            if i == 0 and not destructive:
+                continue
+            timings.append(elapsed)
+            queries.append(statements[0])
+
+        results[name] = {
+            "n": len(timings),
+            "p50_ms": round(percentile(timings, 0.50), 2),
+            "p95_ms": round(percentile(timings, 0.95), 2),
+            "p99_ms": round(percentile(timings, 0.99), 2),
+            "max_ms": round(max(timings), 2),
+            "queries_max": max(queries),
+            "queries_median": percentile(queries, 0.5),
+            "status": status,
+            "errors": errors,
+        }
+
+    # endpoints are "<blueprint>.<view>", budgets use the view name
+    missing = {rule.endpoint.split(".")[-1] for rule in app.url_map.iter_rules() if rule.endpoint != "static"} - covered
+    if missing:
+        print(f"routes without a benchmark: {', '.join(sorted(missing))}")
+
+    with open(args.output, "w") as f:
+        json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark every route at several database sizes.")
+    parser.add_argument("--scales", default="1k,100k", help=f"comma separated, from {', '.join(SCALES)}")
+    parser.add_argument("--iterations", type=int, default=20, help="measured requests per route")
+    parser.add_argument("--routes", default="", help="comma separated endpoints to run (default: all)")
+    parser.add_argument("--reseed", action="store_true", help="re-create the cached seed databases")
+    parser.add_argument("--no-latency", action="store_true", help="only check query budgets (noisy machines / CI)")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        worker(args)
+    else:
+        main(args)
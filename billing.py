@@ -0,0 +1,322 @@
+from collections import defaultdict
+from datetime import date, datetime, timedelta, timezone
+from sqlalchemy import event, func, inspect, case, cast, literal, literal_column, and_, or_
+from sqlalchemy.dialects import sqlite, postgresql
+from models import db, User, Doctor, Appointment, Payment, BillingRollup
+
+# ---------------- billing rollups ----------------
+# Payment counts and amounts per (billing day, doctor, status) are kept in
+# billing_rollups at two grains: a "month" and a "day" row per doctor, and
+# day rows of all doctors together (period "all"). Every insert / delete / status, amount
+# or date change of a Payment (save_treatment marking it paid, appointments
+# deleted with their payment) adjusts those rows inside the same flush. A
+# year's report then reads the doctors' month rows (plus day rows for a
+# partial first / last month) and the all-doctor day rows, some thousands of
+# rows where the payments table has millions. Bulk loads and manual SQL skip
+# the ORM, run `flask rebuild-billing` after them.
+#
+# The all-doctors rows are split over ALL_DOCTORS_SHARDS rows a day (doctor_id
+# holds doctor_id % 16), otherwise every payment of the day would update, and
+# on Postgres lock until commit, the same row. Reports add the shards up; a
+# date range of them is still one primary key range, period "all" first.
+
+STATUSES = ("paid", "pending")
+
+PERIODS = ("month", "day")
+
+# period of the all-doctors rows
+ALL_DOCTORS = "all"
+
+ALL_DOCTORS_SHARDS = 16
+
+def _all_doctors_shard(doctor_id):
+    # in SQL with the constant inline, Postgres has to match the expression in
+    # SELECT and GROUP BY
+    return doctor_id % literal_column(str(ALL_DOCTORS_SHARDS))
+
+def _old_value(payment, attr):
+    history = inspect(payment).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(payment, attr)
+
+def _rollup_key(session, payment, appointment_id, billing_date, status):
+    # the payment's appointment is in the identity map for every app write path
+    appointment = session.get(Appointment, appointment_id) if appointment_id is not None else payment.appointment
+    doctor_id = appointment.doctor_id if appointment is not None else None
+    day = billing_date.date() if billing_date is not None else None
+    return (day, doctor_id, status or "pending")
+
+def _old_key(session, payment):
+    return _rollup_key(session, payment, _old_value(payment, "appointment_id"),
+                       _old_value(payment, "billing_date"), _old_value(payment, "status"))
+
+def _new_key(session, payment):
+    return _rollup_key(session, payment, payment.appointment_id, payment.billing_date, payment.status)
+
+def _rollup_rows(deltas):
+    """The rollup rows to adjust for {(day, doctor_id, status): [count, amount]}."""
+    rows = defaultdict(lambda: [0, 0.0])
+    for (day, doctor_id, status), (count, amount) in deltas.items():
+        for period, start, doctor in (("day", day, doctor_id), ("month", day.replace(day=1), doctor_id),
+                                      (ALL_DOCTORS, day, doctor_id % ALL_DOCTORS_SHARDS)):
+            rows[(period, start, doctor, status)][0] += count
+            rows[(period, start, doctor, status)][1] += amount
+    # sorted, so concurrent writers lock the rows in the same order
+    return [dict(period=period, day=day, doctor_id=doctor_id, status=status, count=count, amount=amount)
+            for (period, day, doctor_id, status), (count, amount) in sorted(rows.items())]
+
+def _apply_deltas(conn, rows):
+    table = BillingRollup.__table__
+
+    if conn.dialect.name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if conn.dialect.name == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["period", "day", "doctor_id", "status"],
+            set_={"count": table.c.count + stmt.excluded.count, "amount": table.c.amount + stmt.excluded.amount}
+        ), rows)
+        return
+
+    # no native upsert, update first and insert if nothing was there
+    for row in rows:
+        result = conn.execute(
+            table.update()
+            .where(table.c.period == row["period"], table.c.day == row["day"],
+                   table.c.doctor_id == row["doctor_id"], table.c.status == row["status"])
+            .values(count=table.c.count + row["count"], amount=table.c.amount + row["amount"])
+        )
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(**row))
+
+@event.listens_for(db.session, "before_flush")
+def track_billing_rollups(session, flush_context, instances):
+    deltas = defaultdict(lambda: [0, 0.0])
+
+    def add(key, count, amount):
+        deltas[key][0] += count
+        deltas[key][1] += amount or 0
+
+    for obj in session.new:
+        if isinstance(obj, Payment):
+            if obj.billing_date is None:
+                # the column default is fixed when models.py is imported, bill it now
+                obj.billing_date = datetime.now(timezone.utc)
+            add(_new_key(session, obj), 1, obj.amount)
+
+    for obj in session.deleted:
+        if isinstance(obj, Payment):
+            add(_old_key(session, obj), -1, -(_old_value(obj, "amount") or 0))
+
+    for obj in session.dirty:
+        if isinstance(obj, Payment) and session.is_modified(obj):
+            old_key, new_key = _old_key(session, obj), _new_key(session, obj)
+            old_amount = _old_value(obj, "amount") or 0
+            if old_key != new_key or old_amount != obj.amount:
+                add(old_key, -1, -old_amount)
+                add(new_key, 1, obj.amount)
+
+    deltas = {key: delta for key, delta in deltas.items() if None not in key and (delta[0] or delta[1])}
+    if not deltas:
+        return
+
+    _apply_deltas(session.connection(), _rollup_rows(deltas))
+
+def subtract_payments(conn, condition):
+    """
+    Takes the payments of the appointments matching condition (on
+    Appointment) out of the rollups, for deletes that bypass the ORM. Run it
+    before the delete; three INSERT ... SELECT upserts on SQLite / Postgres.
+    """
+    shard = _all_doctors_shard(Appointment.doctor_id)
+    table = BillingRollup.__table__
+    columns = ["period", "day", "doctor_id", "status", "count", "amount"]
+    day = _day_expression(conn.dialect.name)
+    status = func.coalesce(Payment.status, "pending")
+
+    month = _month_of(day, conn.dialect.name)
+    for period, start, doctor, group_by in (("day", day, Appointment.doctor_id, (day, Appointment.doctor_id)),
+                                            ("month", month, Appointment.doctor_id, (month, Appointment.doctor_id)),
+                                            (ALL_DOCTORS, day, shard, (day, shard))):
+        grouped = db.select(literal(period), start, doctor, status, -func.count(Payment.id), -func.sum(Payment.amount)) \
+            .join(Appointment, Appointment.id == Payment.appointment_id) \
+            .where(condition, Payment.billing_date.is_not(None)) \
+            .group_by(*group_by, status)
+
+        if conn.dialect.name in ("sqlite", "postgresql"):
+            dialect_insert = sqlite.insert if conn.dialect.name == "sqlite" else postgresql.insert
+            stmt = dialect_insert(table).from_select(columns, grouped)
+            conn.execute(stmt.on_conflict_do_update(
+                index_elements=["period", "day", "doctor_id", "status"],
+                set_={"count": table.c.count + stmt.excluded.count, "amount": table.c.amount + stmt.excluded.amount}
+            ))
+        else:
+            _apply_deltas(conn, [dict(zip(columns, row)) for row in conn.execute(grouped).all()])
+
+
+# ---------------- reports ----------------
+
+def report_range(args):
+    """
+    (start_day, end_day, period) from request args / CLI options: date_from
+    and date_to as YYYY-MM-DD (date_to inclusive, end_day exclusive), this
+    calendar year by default, period "month" or "day". Raises ValueError.
+    """
+    today = date.today()
+    start_day = datetime.strptime(args['date_from'], '%Y-%m-%d').date() if args.get('date_from') else date(today.year, 1, 1)
+    end_day = datetime.strptime(args['date_to'], '%Y-%m-%d').date() + timedelta(days=1) if args.get('date_to') \
+        else date(today.year + 1, 1, 1)
+    period = args.get('period') or "month"
+    if period not in PERIODS:
+        raise ValueError(f"period must be one of {', '.join(PERIODS)}")
+    if end_day <= start_day:
+        raise ValueError("date_to is before date_from")
+    return start_day, end_day, period
+
+def _sums():
+    columns = []
+    for status in STATUSES:
+        is_status = BillingRollup.status == status
+        columns.append(func.coalesce(func.sum(case((is_status, BillingRollup.amount), else_=0)), 0)
+                       .label(f"{status}_amount"))
+        columns.append(func.coalesce(func.sum(case((is_status, BillingRollup.count), else_=0)), 0)
+                       .label(f"{status}_count"))
+    return columns
+
+def _figures(sums):
+    paid_amount, paid_count, pending_amount, pending_count = sums
+    return {"paid_amount": round(paid_amount, 2), "paid_count": paid_count,
+            "pending_amount": round(pending_amount, 2), "pending_count": pending_count}
+
+def _add_sums(total, sums):
+    for index, value in enumerate(sums):
+        total[index] += value
+
+def _next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+def _doctor_rows_in(start_day, end_day):
+    """Condition for the per doctor rows covering start_day <= day < end_day: whole months, days around them."""
+    first_month = start_day if start_day.day == 1 else _next_month(start_day)
+    end_month = end_day.replace(day=1)
+    if first_month >= end_month:
+        pieces = [("day", start_day, end_day)]
+    else:
+        pieces = [("day", start_day, first_month), ("month", first_month, end_month), ("day", end_month, end_day)]
+    return or_(*(and_(BillingRollup.period == period, BillingRollup.day >= start, BillingRollup.day < end)
+                 for period, start, end in pieces if start < end))
+
+def _month_of(column, dialect_name):
+    if dialect_name == "sqlite":
+        return func.date(column, 'start of month')
+    return cast(func.date_trunc('month', column), db.Date)
+
+def _period_label(value, period):
+    # "2025-03-14" / "2025-03", from a date or its text on SQLite
+    label = value.isoformat() if isinstance(value, date) else value
+    return label if period == "day" else label[:7]
+
+def billing_report(start_day, end_day, period="month"):
+    """
+    Paid / pending amounts and counts of the payments billed on
+    start_day <= day < end_day, from the rollup table (two queries):
+    totals, per specialization, per doctor (most paid first) and per month /
+    day. Doctors without payments in the range are left out.
+    """
+    dialect_name = db.session.get_bind().dialect.name
+
+    per_doctor = db.select(BillingRollup.doctor_id, *_sums()) \
+        .where(_doctor_rows_in(start_day, end_day)) \
+        .group_by(BillingRollup.doctor_id).subquery()
+    doctor_rows = db.session.query(
+        Doctor.id, User.name, Doctor.specialization,
+        per_doctor.c.paid_amount, per_doctor.c.paid_count, per_doctor.c.pending_amount, per_doctor.c.pending_count
+    ).select_from(per_doctor) \
+        .join(Doctor, Doctor.id == per_doctor.c.doctor_id) \
+        .join(User, User.id == Doctor.user_id).all()
+
+    # the all-doctors day rows (all shards), by day or month
+    period_column = BillingRollup.day if period == "day" else _month_of(BillingRollup.day, dialect_name)
+    period_rows = db.session.query(period_column, *_sums()) \
+        .filter(BillingRollup.period == ALL_DOCTORS,
+                BillingRollup.day >= start_day, BillingRollup.day < end_day) \
+        .group_by(period_column).order_by(period_column).all()
+
+    # rows that only ever had payments moved out of them (count 0) are skipped
+    doctors = []
+    specializations = defaultdict(lambda: [0, 0, 0, 0])
+    for doctor_id, name, specialization, *sums in doctor_rows:
+        if sums[1] or sums[3]:
+            doctors.append(dict(doctor_id=doctor_id, name=name, specialization=specialization, **_figures(sums)))
+            _add_sums(specializations[specialization], sums)
+    doctors.sort(key=lambda row: (-row["paid_amount"], row["name"]))
+
+    periods = []
+    totals = [0, 0, 0, 0]
+    for label, *sums in period_rows:
+        if sums[1] or sums[3]:
+            periods.append(dict(period=_period_label(label, period), **_figures(sums)))
+            _add_sums(totals, sums)
+
+    return {
+        "date_from": start_day.isoformat(),
+        "date_to": (end_day - timedelta(days=1)).isoformat(),
+        "period": period,
+        "totals": _figures(totals),
+        "by_specialization": sorted((dict(specialization=specialization, **_figures(sums))
+                                     for specialization, sums in specializations.items()),
+                                    key=lambda row: (-row["paid_amount"], row["specialization"])),
+        "by_doctor": doctors,
+        "by_period": periods,
+    }
+
+
+# ---------------- repair ----------------
+
+def _day_expression(dialect_name):
+    if dialect_name == "sqlite":
+        return func.date(Payment.billing_date)
+    return cast(Payment.billing_date, db.Date)
+
+def rebuild_billing(conn=None):
+    """
+    Recomputes billing_rollups from the payments (after bulk loads, manual SQL
+    edits or anything else that bypassed the ORM). Returns the number of rows.
+    Runs on the given connection, or on db.session and commits.
+    """
+    own_transaction = conn is None
+    if own_transaction:
+        conn = db.session.connection()
+
+    table = BillingRollup.__table__
+    columns = ["period", "day", "doctor_id", "status", "count", "amount"]
+    day = _day_expression(conn.dialect.name)
+    status = func.coalesce(Payment.status, "pending")
+
+    conn.execute(table.delete())
+    # per doctor days from the payments
+    conn.execute(table.insert().from_select(columns, db.select(
+        literal("day"), day, Appointment.doctor_id, status, func.count(Payment.id), func.sum(Payment.amount)
+    ).join(Appointment, Appointment.id == Payment.appointment_id)
+        .where(Payment.billing_date.is_not(None))
+        .group_by(day, Appointment.doctor_id, status)))
+
+    # per doctor months and all-doctor days from those
+    doctor_days = db.select(table.c.day, table.c.doctor_id, table.c.status, table.c.count, table.c.amount) \
+        .where(table.c.period == "day").subquery()
+    month = _month_of(doctor_days.c.day, conn.dialect.name)
+    conn.execute(table.insert().from_select(columns, db.select(
+        literal("month"), month, doctor_days.c.doctor_id, doctor_days.c.status,
+        func.sum(doctor_days.c.count), func.sum(doctor_days.c.amount)
+    ).group_by(month, doctor_days.c.doctor_id, doctor_days.c.status)))
+    shard = _all_doctors_shard(doctor_days.c.doctor_id)
+    conn.execute(table.insert().from_select(columns, db.select(
+        literal(ALL_DOCTORS), doctor_days.c.day, shard, doctor_days.c.status,
+        func.sum(doctor_days.c.count), func.sum(doctor_days.c.amount)
+    ).group_by(doctor_days.c.day, shard, doctor_days.c.status)))
+
+    rows = conn.execute(db.select(func.count()).select_from(table)).scalar()
+
+    if own_transaction:
+        db.session.commit()
+    return rows
@@ -0,0 +1,247 @@
+import os
+import pickle
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app, g, has_app_context
+
+# ---------------- fragment cache ----------------
+# Small cache for data that is read on every request but rarely written (the
+# doctor directory, see search.py): query results and rendered HTML
+# fragments. Backends (FRAGMENT_CACHE):
+#   memory   LRU with a TTL in each process (default, one worker)
+#   shared   a SQLite file all worker processes on the host share (gunicorn
+#            with several workers, an invalidation reaches every worker)
+#   none     no caching
+# Writers invalidate through commit hooks (the whole cache, writes are rare),
+# the TTL only covers changes that bypass the ORM. Entries that change more
+# often than the directory (the patient count) are invalidated on their own
+# by name, which leaves the rest cached.
+#
+# Every invalidation bumps a generation (the whole cache's or the name's). A
+# request notes the generations when it starts and only stores what it built
+# if nothing it belongs to was invalidated in the meantime, so a value read
+# before a commit can't be cached after it.
+
+MISSING = object()
+
+class MemoryBackend:
+    name = "memory"
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        # None -> the whole cache, name -> entries of that name
+        self._generations = {None: 0}
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @property
+    def generation(self):
+        return self._generations[None]
+
+    def generations(self):
+        with self._lock:
+            return dict(self._generations)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, generations):
+        with self._lock:
+            if any(generations.get(name, 0) != self._generations.get(name, 0) for name in (None, key[0])):
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self, name=None):
+        with self._lock:
+            if name is None:
+                self._entries.clear()
+            else:
+                for key in [key for key in self._entries if key[0] == name]:
+                    del self._entries[key]
+            self._generations[name] = self._generations.get(name, 0) + 1
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class SharedBackend:
+    """Entries pickled into a SQLite file, one connection per thread and process."""
+
+    name = "shared"
+
+    # expired / surplus entries are pruned every this many sets
+    PRUNE_EVERY = 100
+
+    def __init__(self, path, max_entries, ttl):
+        self.path = path
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._local = threading.local()
+        self._sets = 0
+        conn = self._connect()
+        conn.execute("CREATE TABLE IF NOT EXISTS entries (key TEXT PRIMARY KEY, value BLOB, expires_at REAL)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER)")
+        conn.execute("INSERT OR IGNORE INTO meta VALUES ('generation', 0)")
+
+    def _connect(self):
+        # a forked worker opens its own connection
+        if getattr(self._local, "pid", None) != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            conn.execute("PRAGMA journal_mode = WAL")
+            conn.execute("PRAGMA synchronous = NORMAL")
+            self._local.conn, self._local.pid = conn, os.getpid()
+        return self._local.conn
+
+    @property
+    def generation(self):
+        return self._connect().execute("SELECT value FROM meta WHERE name = 'generation'").fetchone()[0]
+
+    def generations(self):
+        # meta rows: 'generation' (the whole cache) and 'generation:<name>'
+        rows = self._connect().execute("SELECT name, value FROM meta WHERE name LIKE 'generation%'").fetchall()
+        return {(None if name == "generation" else name.split(":", 1)[1]): value for name, value in rows}
+
+    def get(self, key):
+        row = self._connect().execute("SELECT value, expires_at FROM entries WHERE key = ?", (repr(key),)).fetchone()
+        if row is None or row[1] < time.time():
+            return MISSING
+        return pickle.loads(row[0])
+
+    def set(self, key, value, generations):
+        conn = self._connect()
+        conn.execute(
+            "INSERT OR REPLACE INTO entries SELECT ?, ?, ? "
+            "WHERE (SELECT value FROM meta WHERE name = 'generation') = ? "
+            "AND coalesce((SELECT value FROM meta WHERE name = ?), 0) = ?",
+            (repr(key), pickle.dumps(value), time.time() + self.ttl, generations.get(None, 0),
+             f"generation:{key[0]}", generations.get(key[0], 0))
+        )
+        self._sets += 1
+        if self._sets % self.PRUNE_EVERY == 0:
+            conn.execute("DELETE FROM entries WHERE expires_at < ?", (time.time(),))
+            conn.execute(
+                "DELETE FROM entries WHERE key NOT IN (SELECT key FROM entries ORDER BY expires_at DESC LIMIT ?)",
+                (self.max_entries,)
+            )
+
+    def clear(self, name=None):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        if name is None:
+            conn.execute("DELETE FROM entries")
+            conn.execute("UPDATE meta SET value = value + 1 WHERE name = 'generation'")
+        else:
+            prefix = repr((name,))[:-1]  # "('name',"
+            conn.execute("DELETE FROM entries WHERE substr(key, 1, ?) = ?", (len(prefix), prefix))
+            conn.execute("INSERT INTO meta VALUES (?, 1) ON CONFLICT (name) DO UPDATE SET value = value + 1",
+                         (f"generation:{name}",))
+        conn.execute("COMMIT")
+
+    def __len__(self):
+        return self._connect().execute("SELECT count(*) FROM entries").fetchone()[0]
+
+
+class NullBackend:
+    name = "none"
+    generation = 0
+
+    def generations(self):
+        return {}
+
+    def get(self, key):
+        return MISSING
+
+    def set(self, key, value, generations):
+        pass
+
+    def clear(self, name=None):
+        pass
+
+    def __len__(self):
+        return 0
+
+
+class FragmentCache:
+    """A backend plus hit / miss counters per kind of entry (this process)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.counters = {}
+        self.invalidations = 0
+        self._lock = threading.Lock()
+
+    def _count(self, name, outcome):
+        with self._lock:
+            counter = self.counters.setdefault(name, {"hits": 0, "misses": 0})
+            counter[outcome] += 1
+
+    def get_or_build(self, name, key, build):
+        """Cached value of build() for (name, key)."""
+        key = (name, key)
+        value = self.backend.get(key)
+        if value is not MISSING:
+            self._count(name, "hits")
+            return value
+        self._count(name, "misses")
+        generations = g.get("cache_generations", None) if has_app_context() else None
+        if generations is None:
+            generations = self.backend.generations()
+        value = build()
+        self.backend.set(key, value, generations)
+        return value
+
+    def invalidate(self, name=None):
+        """Drops every entry, or only those of one name."""
+        self.backend.clear(name)
+        with self._lock:
+            self.invalidations += 1
+
+    def stats(self):
+        with self._lock:
+            counters = {name: dict(counter, hit_ratio=round(counter["hits"] / max(counter["hits"] + counter["misses"], 1), 3))
+                        for name, counter in self.counters.items()}
+            invalidations = self.invalidations
+        return {
+            "backend": self.backend.name,
+            "pid": os.getpid(),
+            "entries": len(self.backend),
+            "generation": self.backend.generation,
+            "invalidations": invalidations,
+            "caches": counters,
+        }
+
+
+def init_app(app):
+    kind = app.config['FRAGMENT_CACHE']
+    size, ttl = app.config['FRAGMENT_CACHE_SIZE'], app.config['FRAGMENT_CACHE_TTL']
+    if kind == "shared":
+        path = app.config['FRAGMENT_CACHE_PATH'] or os.path.join(app.instance_path, "fragment_cache.db")
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        backend = SharedBackend(path, size, ttl)
+    elif kind == "memory":
+        backend = MemoryBackend(size, ttl)
+    else:
+        backend = NullBackend()
+    app.extensions["fragment_cache"] = FragmentCache(backend)
+
+    @app.before_request
+    def note_cache_generation():
+        g.cache_generations = app.extensions["fragment_cache"].backend.generations()
+
+def fragment_cache():
+    return current_app.extensions["fragment_cache"]
@@ -0,0 +1,152 @@
+import hashlib
+from datetime import datetime, time, timezone
+from flask import current_app, g, jsonify, request
+from sqlalchemy import event, inspect
+from sqlalchemy.dialects import sqlite, postgresql
+from werkzeug.http import is_resource_modified
+from models import db, User, Doctor, Appointment, Payment, ChangeVersion
+
+# ---------------- change versions ----------------
+# A counter per scope in change_versions, bumped in the same flush as the
+# change it describes:
+#   appointments      any appointment added, changed or deleted
+#   doctor:<id>       an appointment of that doctor
+#   patient:<id>      an appointment of that patient
+#   doctors           a doctor profile (directory, specializations)
+#   payments          a payment added, changed or deleted (billing reports)
+#   users             a user renamed or deleted (names shown in the lists)
+#   all               bulk loads that bypass the ORM (seed.py)
+# The JSON API derives its ETags from the versions of the scopes a response
+# depends on, so a poll that has nothing new is answered with a 304 after one
+# small primary key lookup, without running the list queries.
+#
+# "appointments" and "payments" change with every booking, a single row each
+# would be locked by every booking transaction until it commits (Postgres),
+# one booking at a time across the whole clinic. They are split over SHARDS
+# rows ("appointments#3") by doctor / appointment id and added up when read.
+
+ALL_SCOPE = "all"
+
+SHARDED_SCOPES = ("appointments", "payments")
+SHARDS = 16
+
+def shard(scope, key):
+    """The row of a sharded scope a write keyed by key (an id) bumps."""
+    return f"{scope}#{key % SHARDS}"
+
+def _scope_rows(scope):
+    return [shard(scope, key) for key in range(SHARDS)] if scope in SHARDED_SCOPES else [scope]
+
+def _values(obj, attr):
+    # old and new value of an attribute (both scopes change when it moves)
+    history = inspect(obj).attrs[attr].history
+    return set(history.deleted or ()) | {getattr(obj, attr)}
+
+def _changed_scopes(session):
+    scopes = set()
+    for obj in session.new | session.dirty | session.deleted:
+        if obj in session.dirty and not session.is_modified(obj):
+            continue
+        if isinstance(obj, Appointment):
+            # by doctor: the booking holds the doctor's row below anyway
+            scopes.update(shard("appointments", value) for value in _values(obj, "doctor_id") if value is not None)
+            scopes.update(f"doctor:{value}" for value in _values(obj, "doctor_id") if value is not None)
+            scopes.update(f"patient:{value}" for value in _values(obj, "patient_id") if value is not None)
+        elif isinstance(obj, Doctor):
+            scopes.add("doctors")
+        elif isinstance(obj, Payment):
+            scopes.update(shard("payments", value or 0) for value in _values(obj, "appointment_id"))
+        elif isinstance(obj, User):
+            if obj in session.deleted or (obj in session.dirty and inspect(obj).attrs["name"].history.has_changes()):
+                scopes.add("users")
+    return scopes
+
+def touch(conn, scopes):
+    """
+    Bumps the version of every scope (one statement on SQLite / Postgres).
+    A sharded scope by its plain name ("appointments") bumps all its rows.
+    """
+    table = ChangeVersion.__table__
+    now = datetime.now(timezone.utc)
+    rows = {row for scope in scopes for row in _scope_rows(scope)}
+    # sorted, so concurrent writers lock the rows in the same order
+    rows = [{"scope": scope, "version": 1, "changed_at": now} for scope in sorted(rows)]
+    if not rows:
+        return
+
+    if conn.dialect.name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if conn.dialect.name == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["scope"],
+            set_={"version": table.c.version + 1, "changed_at": stmt.excluded.changed_at}
+        ), rows)
+        return
+
+    for row in rows:
+        result = conn.execute(
+            table.update().where(table.c.scope == row["scope"])
+            .values(version=table.c.version + 1, changed_at=row["changed_at"])
+        )
+        if result.rowcount == 0:
+            conn.execute(table.insert().values(**row))
+
+@event.listens_for(db.session, "after_flush")
+def bump_change_versions(session, flush_context):
+    scopes = _changed_scopes(session)
+    if scopes:
+        touch(session.connection(), scopes)
+
+
+# ---------------- conditional responses ----------------
+
+def current_versions(scopes):
+    """
+    {scope: (version, changed_at)}, scopes that never changed are left out.
+    A sharded scope's version is the sum of its rows (it grows with any of
+    them), changed_at the latest.
+    """
+    names = {row: scope for scope in scopes for row in _scope_rows(scope)}
+    rows = db.session.query(ChangeVersion.scope, ChangeVersion.version, ChangeVersion.changed_at) \
+        .filter(ChangeVersion.scope.in_(names)).all()
+    versions = {}
+    for row, version, changed_at in rows:
+        scope = names[row]
+        if scope in versions:
+            total, latest = versions[scope]
+            version += total
+            changed_at = max(filter(None, (changed_at, latest)), default=None)
+        versions[scope] = (version, changed_at)
+    return versions
+
+def conditional_json(scopes, build, valid_from=None):
+    """
+    JSON response for data that only depends on the given scopes (plus the
+    request url and the logged in user). build() makes the payload and is
+    only called when the client's copy is out of date, otherwise the answer
+    is a 304. valid_from (a date) is for data that also changes with the day.
+    """
+    scopes = sorted(set(scopes) | {ALL_SCOPE})
+    versions = current_versions(scopes)
+    identity = g.get("identity")
+    key = repr((request.full_path, identity and identity.user_id, valid_from,
+                [(scope, versions.get(scope, (0,))[0]) for scope in scopes]))
+    etag = hashlib.sha1(key.encode()).hexdigest()
+
+    changed = [changed_at for _, changed_at in versions.values() if changed_at is not None]
+    if valid_from is not None:
+        # local midnight, as UTC like the stored timestamps
+        changed.append(datetime.combine(valid_from, time()).astimezone(timezone.utc).replace(tzinfo=None))
+    last_modified = max(changed).replace(tzinfo=timezone.utc, microsecond=0) if changed else None
+
+    if not is_resource_modified(request.environ, etag=etag, last_modified=last_modified):
+        response = current_app.response_class(status=304)
+    else:
+        response = jsonify(build())
+    response.set_etag(etag)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # cached by the client, always revalidated
+    response.cache_control.private = True
+    response.cache_control.no_cache = True
+    return response
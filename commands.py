@@ -0,0 +1,162 @@
+import sys
+import time
+import click
+from flask import current_app
+from flask.cli import AppGroup, with_appcontext
+from models import db, insert_admin
+from counters import rebuild_counters
+from billing import rebuild_billing
+from search import fts_available, rebuild_search_index
+from migrations import upgrade, current_version, check_query_plans, MIGRATIONS
+from database import report_settings
+import assets
+from export import FORMATS, parse_filters, export_rows, export_pieces
+from accounts import KINDS, import_accounts, missing_columns, csv_rows
+
+# ---------------- CLI commands (flask <command>) ----------------
+
+def bootstrap():
+    """Applies pending migrations and creates the admin account (safe to re-run)."""
+    report_settings()
+    upgrade()
+    insert_admin()
+
+def precompile_templates(app):
+    # loading a template compiles it into the bytecode cache
+    names = [name for name in app.jinja_env.list_templates() if name.endswith(".html")]
+    for name in names:
+        app.jinja_env.get_template(name)
+    return len(names)
+
+@click.command("bootstrap")
+@with_appcontext
+def bootstrap_command():
+    """Set up / upgrade the database, create the admin account, precompile templates and build assets."""
+    bootstrap()
+    count = precompile_templates(current_app)
+    print(f"Precompiled {count} templates")
+    print(f"Built {assets.build(current_app)} static assets")
+
+@click.command("rebuild-counters")
+@with_appcontext
+def rebuild_counters_command():
+    """Recompute the daily appointment counters from the appointments table."""
+    rows = rebuild_counters()
+    print(f"Rebuilt appointment counters ({rows} rows)")
+
+@click.command("rebuild-billing")
+@with_appcontext
+def rebuild_billing_command():
+    """Recompute the daily billing rollups from the payments table."""
+    rows = rebuild_billing()
+    print(f"Rebuilt billing rollups ({rows} rows)")
+
+@click.command("rebuild-search-index")
+@with_appcontext
+def rebuild_search_index_command():
+    """Re-fill the doctor directory full-text index."""
+    conn = db.session.connection()
+    if not fts_available(conn):
+        print("Full-text index not available (not SQLite or no FTS5), using LIKE search")
+        return
+    rebuild_search_index(conn)
+    db.session.commit()
+    print("Rebuilt doctor search index")
+
+# static assets (flask assets ...)
+assets_cli = AppGroup("assets", help="Hashed, precompressed static files.")
+
+@assets_cli.command("build")
+def assets_build_command():
+    """Write hashed copies and gzip / brotli variants of static/ to ASSET_DIR."""
+    count = assets.build(current_app)
+    print(f"Built {count} static assets in {assets.asset_dir(current_app)}"
+          + ("" if assets.brotli else " (no brotli module, gzip only)"))
+
+# data export (flask export ...)
+export_cli = AppGroup("export", help="CSV / NDJSON exports.")
+
+@export_cli.command("appointments")
+@click.option("--format", "fmt", type=click.Choice(sorted(FORMATS)), default="csv", show_default=True)
+@click.option("--from", "date_from", help="first day, YYYY-MM-DD")
+@click.option("--to", "date_to", help="last day (inclusive), YYYY-MM-DD")
+@click.option("--status", help="only appointments with this status, e.g. Completed")
+@click.option("--output", "-o", type=click.File("w"), default="-", help="file to write, default stdout")
+def export_appointments_command(fmt, date_from, date_to, status, output):
+    """Export appointments with patient, doctor, treatment and payment."""
+    try:
+        filters = parse_filters({"date_from": date_from, "date_to": date_to, "status": status})
+    except ValueError:
+        raise click.BadParameter("dates must be YYYY-MM-DD")
+
+    count = 0
+    def counted(rows):
+        nonlocal count
+        for row in rows:
+            count += 1
+            yield row
+
+    started = time.perf_counter()
+    for piece in export_pieces(fmt, counted(export_rows(*filters))):
+        output.write(piece)
+    elapsed = time.perf_counter() - started
+    # stdout may be the export itself
+    print(f"Exported {count} appointments in {elapsed:.1f}s ({count / max(elapsed, 1e-9):,.0f} rows/s)", file=sys.stderr)
+
+# bulk account import (flask import ...)
+@click.command("import")
+@click.argument("kind", type=click.Choice(sorted(KINDS)))
+@click.argument("csv_file", type=click.File("r", encoding="utf-8-sig"))
+@click.option("--batch-size", type=int, help="rows per transaction (default IMPORT_BATCH_SIZE)")
+@with_appcontext
+def import_command(kind, csv_file, batch_size):
+    """Create patient or doctor accounts from a CSV file with the registration form's columns."""
+    try:
+        rows = csv_rows(csv_file)
+    except ValueError as e:
+        raise click.ClickException(str(e))
+    missing = missing_columns(kind, rows.fieldnames)
+    if missing:
+        raise click.ClickException(f"missing columns: {', '.join(missing)}")
+
+    report = import_accounts(kind, rows, batch_size)
+    for row_number, message in report.errors:
+        print(f"row {row_number}: {message}")
+    print(f"Imported {report.created} of {report.rows} {kind} in {report.elapsed:.1f}s "
+          f"({report.rows_per_second:,.0f} rows/s), {len(report.errors)} rows with errors")
+
+# schema migrations (flask db ...)
+db_cli = AppGroup("db", help="Schema migrations.")
+
+@db_cli.command("upgrade")
+def db_upgrade_command():
+    """Apply pending schema migrations."""
+    applied = upgrade()
+    if not applied:
+        print(f"Database is up to date (version {current_version()})")
+
+@db_cli.command("current")
+def db_current_command():
+    """Show the current schema version."""
+    latest = max(version for version, _, _ in MIGRATIONS)
+    print(f"Current version: {current_version()} (latest: {latest})")
+
+@db_cli.command("check-plans")
+def db_check_plans_command():
+    """Check that the hot appointment queries use their indexes (SQLite)."""
+    results = check_query_plans()
+    if not results:
+        print("Query plan check is only available on SQLite")
+        return
+    failed = 0
+    for name, expected_index, plan, ok in results:
+        print(f"[{'OK' if ok else 'FAIL'}] {name}: {plan}")
+        if not ok:
+            failed += 1
+            print(f"       expected index {expected_index}")
+    if failed:
+        raise SystemExit(1)
+
+def init_app(app):
+    for command in (bootstrap_command, rebuild_counters_command, rebuild_billing_command, rebuild_search_index_command, assets_cli, export_cli, import_command, db_cli):
+        app.cli.add_command(command)
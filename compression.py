@@ -0,0 +1,100 @@
+import gzip
+import zlib
+from flask import request
+
+try:
+    import brotli
+except ImportError:
+    # optional, without it responses are gzipped only
+    brotli = None
+
+# ---------------- response compression ----------------
+# Text responses (HTML, JSON, CSV ...) are compressed for clients that accept
+# it, brotli preferred over gzip. Buffered responses below
+# COMPRESSION_MIN_SIZE are left alone, compressing them doesn't pay off.
+# Streamed responses (the dashboards use stream_template) are compressed
+# chunk by chunk as the template renders, flushed every FLUSH_BYTES so the
+# browser can start on the page before it is complete.
+# Files (send_file, /static/, the precompressed /assets/) are never touched.
+
+COMPRESSIBLE_TYPES = {
+    "text/html", "text/plain", "text/css", "text/csv", "text/xml",
+    "application/json", "application/javascript", "application/xml", "application/x-ndjson",
+}
+
+# input bytes between flushes of a streamed response
+FLUSH_BYTES = 16 * 1024
+
+def _choose_encoding(accepted):
+    if brotli is not None and accepted["br"]:
+        return "br"
+    if accepted["gzip"]:
+        return "gzip"
+    return None
+
+def _compressor(encoding, config):
+    if encoding == "br":
+        compressor = brotli.Compressor(quality=config['COMPRESSION_BROTLI_QUALITY'])
+        return compressor.process, compressor.flush, compressor.finish
+    compressor = zlib.compressobj(config['COMPRESSION_GZIP_LEVEL'], zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    return (compressor.compress, lambda: compressor.flush(zlib.Z_SYNC_FLUSH),
+            lambda: compressor.flush(zlib.Z_FINISH))
+
+def _compress_stream(chunks, encoding, config):
+    compress, flush, finish = _compressor(encoding, config)
+    pending = 0
+    try:
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode()
+            output = compress(chunk)
+            pending += len(chunk)
+            if pending >= FLUSH_BYTES:
+                output += flush()
+                pending = 0
+            if output:
+                yield output
+        yield finish()
+    finally:
+        # let the wrapped generator end its request context
+        if hasattr(chunks, "close"):
+            chunks.close()
+
+def _compress_body(data, encoding, config):
+    if encoding == "br":
+        return brotli.compress(data, quality=config['COMPRESSION_BROTLI_QUALITY'])
+    return gzip.compress(data, compresslevel=config['COMPRESSION_GZIP_LEVEL'])
+
+def init_app(app):
+    if not app.config['COMPRESSION']:
+        return
+    config = app.config
+
+    @app.after_request
+    def compress_response(response):
+        if (response.status_code != 200 or response.direct_passthrough
+                or "Content-Encoding" in response.headers
+                or response.mimetype not in COMPRESSIBLE_TYPES
+                or "no-transform" in response.headers.get("Cache-Control", "")):
+            return response
+
+        # the body differs by Accept-Encoding, caches must keep them apart
+        response.vary.add("Accept-Encoding")
+        encoding = _choose_encoding(request.accept_encodings)
+        if encoding is None:
+            return response
+
+        if response.is_streamed:
+            response.response = _compress_stream(response.response, encoding, config)
+            response.headers.pop("Content-Length", None)
+        else:
+            data = response.get_data()
+            if len(data) < config['COMPRESSION_MIN_SIZE']:
+                return response
+            response.set_data(_compress_body(data, encoding, config))
+        response.headers["Content-Encoding"] = encoding
+        # a strong ETag names the uncompressed bytes
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
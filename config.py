@@ -1,6 +1,73 @@
 import os
 
+def engine_options(database_url, pool_size, max_overflow, pool_timeout, pool_recycle, pool_pre_ping):
+    """SQLALCHEMY_ENGINE_OPTIONS for the database url (SQLite pragmas are set on connect, see database.py)."""
+    if database_url.startswith('sqlite'):
+        return {}
+    return {
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': pool_timeout,
+        'pool_recycle': pool_recycle,
+        'pool_pre_ping': pool_pre_ping,
+    }
+
 class Config:
     SQLALCHEMY_DATABASE_URI = os.environ.get('DATABASE_URL', 'sqlite:///CureAID.db')
     SQLALCHEMY_TRACK_MODIFICATIONS = False
-    SECRET_KEY = os.environ.get('SECRET_KEY', 'thisismysecretkey')
\ No newline at end of file
+
+    # SQLite, applied to every new connection (see database.py)
+    SQLITE_JOURNAL_MODE = os.environ.get('SQLITE_JOURNAL_MODE', 'WAL')
+    SQLITE_SYNCHRONOUS = os.environ.get('SQLITE_SYNCHRONOUS', 'NORMAL')
+    SQLITE_BUSY_TIMEOUT_MS = int(os.environ.get('SQLITE_BUSY_TIMEOUT_MS', 5000))
+    SQLITE_CACHE_SIZE_KB = int(os.environ.get('SQLITE_CACHE_SIZE_KB', 65536))
+    SQLITE_MMAP_SIZE = int(os.environ.get('SQLITE_MMAP_SIZE', 256 * 1024 * 1024))
+
+    # connection pool for server databases (Postgres / MySQL DATABASE_URL)
+    DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 10))
+    DB_MAX_OVERFLOW = int(os.environ.get('DB_MAX_OVERFLOW', 20))
+    DB_POOL_TIMEOUT = int(os.environ.get('DB_POOL_TIMEOUT', 30))
+    DB_POOL_RECYCLE = int(os.environ.get('DB_POOL_RECYCLE', 1800))
+    DB_POOL_PRE_PING = os.environ.get('DB_POOL_PRE_PING', '1') == '1'
+    SQLALCHEMY_ENGINE_OPTIONS = engine_options(SQLALCHEMY_DATABASE_URI, DB_POOL_SIZE, DB_MAX_OVERFLOW,
+                                               DB_POOL_TIMEOUT, DB_POOL_RECYCLE, DB_POOL_PRE_PING)
+    SECRET_KEY = os.environ.get('SECRET_KEY', 'thisismysecretkey')
+    APPOINTMENTS_PER_PAGE = int(os.environ.get('APPOINTMENTS_PER_PAGE', 50))
+    DOCTORS_PER_PAGE = int(os.environ.get('DOCTORS_PER_PAGE', 20))
+    PATIENTS_PER_PAGE = int(os.environ.get('PATIENTS_PER_PAGE', 20))
+    # appointments per page of a patient's medical history (timeline.py)
+    TIMELINE_PER_PAGE = int(os.environ.get('TIMELINE_PER_PAGE', 20))
+    # CSV / NDJSON export (export.py): rows per fetch, downloads at once per process
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 1000))
+    EXPORT_MAX_CONCURRENT = int(os.environ.get('EXPORT_MAX_CONCURRENT', 2))
+    # bulk account import (accounts.py): rows per transaction, most rows of an admin upload
+    IMPORT_BATCH_SIZE = int(os.environ.get('IMPORT_BATCH_SIZE', 500))
+    IMPORT_MAX_UPLOAD_ROWS = int(os.environ.get('IMPORT_MAX_UPLOAD_ROWS', 5000))
+    SLOT_MINUTES = int(os.environ.get('SLOT_MINUTES', 30))
+    SLOT_SEARCH_MAX_DAYS = int(os.environ.get('SLOT_SEARCH_MAX_DAYS', 31))
+    SLOT_SEARCH_MAX_DOCTORS = int(os.environ.get('SLOT_SEARCH_MAX_DOCTORS', 100))
+    # password hashing (see passwords.py)
+    PASSWORD_HASH_METHOD = os.environ.get('PASSWORD_HASH_METHOD', 'scrypt')
+    PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', os.cpu_count() or 1))
+    PASSWORD_HASH_QUEUE = int(os.environ.get('PASSWORD_HASH_QUEUE', 4 * (os.cpu_count() or 1)))
+    PASSWORD_HASH_TIMEOUT = float(os.environ.get('PASSWORD_HASH_TIMEOUT', 10))
+    # compiled Jinja templates on disk (default: instance/jinja_cache)
+    JINJA_BYTECODE_CACHE = os.environ.get('JINJA_BYTECODE_CACHE', '1') == '1'
+    JINJA_CACHE_DIR = os.environ.get('JINJA_CACHE_DIR', '')
+    # fragment cache for the doctor directory (see cache.py): memory, shared (multi-worker) or none
+    FRAGMENT_CACHE = os.environ.get('FRAGMENT_CACHE', 'memory')
+    FRAGMENT_CACHE_SIZE = int(os.environ.get('FRAGMENT_CACHE_SIZE', 1000))
+    FRAGMENT_CACHE_TTL = float(os.environ.get('FRAGMENT_CACHE_TTL', 300))
+    FRAGMENT_CACHE_PATH = os.environ.get('FRAGMENT_CACHE_PATH', '')
+    # gzip / brotli for text responses (see compression.py)
+    COMPRESSION = os.environ.get('COMPRESSION', '1') == '1'
+    COMPRESSION_GZIP_LEVEL = int(os.environ.get('COMPRESSION_GZIP_LEVEL', 6))
+    COMPRESSION_BROTLI_QUALITY = int(os.environ.get('COMPRESSION_BROTLI_QUALITY', 4))
+    COMPRESSION_MIN_SIZE = int(os.environ.get('COMPRESSION_MIN_SIZE', 1024))
+    # hashed / precompressed static files (see assets.py, default: instance/assets)
+    ASSET_DIR = os.environ.get('ASSET_DIR', '')
+    # SQL tracing (see sqltrace.py)
+    SQL_TRACING = os.environ.get('SQL_TRACING', '1') == '1'
+    SQL_SLOW_QUERY_MS = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+    SQL_SLOW_QUERY_LOG = os.environ.get('SQL_SLOW_QUERY_LOG', '')
+    SQL_N_PLUS_ONE_THRESHOLD = int(os.environ.get('SQL_N_PLUS_ONE_THRESHOLD', 5))
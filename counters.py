@@ -0,0 +1,164 @@
+from collections import defaultdict
+from datetime import date, timedelta
+from sqlalchemy import event, func, inspect, cast
+from sqlalchemy.dialects import sqlite, postgresql
+from models import db, Appointment, AppointmentCounter
+
+# ---------------- appointment counters ----------------
+# Every insert / delete / status or date change of an Appointment adjusts the
+# matching (doctor, day, status) row in appointment_counters inside the same
+# flush, so dashboards can read today's / this week's numbers without
+# touching the appointments table.
+
+def _old_value(appointment, attr):
+    history = inspect(appointment).attrs[attr].history
+    if history.deleted:
+        return history.deleted[0]
+    return getattr(appointment, attr)
+
+def _counter_key(doctor_id, appointment_date, status):
+    return (doctor_id, appointment_date.date(), status or "scheduled")
+
+def _upsert_statement(conn, doctor_id, day, status, delta):
+    table = AppointmentCounter.__table__
+    values = dict(doctor_id=doctor_id, day=day, status=status, count=delta)
+
+    if conn.dialect.name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if conn.dialect.name == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table).values(**values)
+        return stmt.on_conflict_do_update(
+            index_elements=["doctor_id", "day", "status"],
+            set_={"count": table.c.count + stmt.excluded.count}
+        )
+
+def _apply_delta(conn, doctor_id, day, status, delta):
+    stmt = _upsert_statement(conn, doctor_id, day, status, delta)
+    if stmt is not None:
+        conn.execute(stmt)
+        return
+
+    # no native upsert, update first and insert if nothing was there
+    table = AppointmentCounter.__table__
+    result = conn.execute(
+        table.update()
+        .where(table.c.doctor_id == doctor_id, table.c.day == day, table.c.status == status)
+        .values(count=table.c.count + delta)
+    )
+    if result.rowcount == 0:
+        conn.execute(table.insert().values(doctor_id=doctor_id, day=day, status=status, count=delta))
+
+@event.listens_for(db.session, "before_flush")
+def track_appointment_counters(session, flush_context, instances):
+    deltas = defaultdict(int)
+
+    for obj in session.new:
+        if isinstance(obj, Appointment) and obj.appointment_date is not None:
+            deltas[_counter_key(obj.doctor_id, obj.appointment_date, obj.status)] += 1
+
+    for obj in session.deleted:
+        if isinstance(obj, Appointment):
+            old_key = _counter_key(_old_value(obj, "doctor_id"), _old_value(obj, "appointment_date"), _old_value(obj, "status"))
+            deltas[old_key] -= 1
+
+    for obj in session.dirty:
+        if isinstance(obj, Appointment) and session.is_modified(obj):
+            old_key = _counter_key(_old_value(obj, "doctor_id"), _old_value(obj, "appointment_date"), _old_value(obj, "status"))
+            new_key = _counter_key(obj.doctor_id, obj.appointment_date, obj.status)
+            if old_key != new_key:
+                deltas[old_key] -= 1
+                deltas[new_key] += 1
+
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if not deltas:
+        return
+
+    conn = session.connection()
+    for (doctor_id, day, status), delta in deltas.items():
+        _apply_delta(conn, doctor_id, day, status, delta)
+
+
+def subtract_appointments(conn, condition):
+    """
+    Takes the appointments matching condition (on Appointment) out of the
+    counters, for deletes that bypass the ORM. Run it before the delete; one
+    INSERT ... SELECT upsert on SQLite / Postgres, however many there are.
+    """
+    table = AppointmentCounter.__table__
+    day = _day_expression(conn.dialect.name)
+    status = func.coalesce(Appointment.status, "scheduled")
+    grouped = db.select(Appointment.doctor_id, day, status, -func.count(Appointment.id)) \
+        .where(condition).group_by(Appointment.doctor_id, day, status)
+
+    if conn.dialect.name in ("sqlite", "postgresql"):
+        dialect_insert = sqlite.insert if conn.dialect.name == "sqlite" else postgresql.insert
+        stmt = dialect_insert(table).from_select(["doctor_id", "day", "status", "count"], grouped)
+        conn.execute(stmt.on_conflict_do_update(
+            index_elements=["doctor_id", "day", "status"],
+            set_={"count": table.c.count + stmt.excluded.count}
+        ))
+        return
+
+    for doctor_id, day, status, delta in conn.execute(grouped).all():
+        _apply_delta(conn, doctor_id, day, status, delta)
+
+
+# ---------------- reading ----------------
+
+def count_appointments(start_day, end_day, doctor_id=None, statuses=None):
+    """
+    Number of appointments with start_day <= date < end_day, from the rollup
+    table (one small indexed query, independent of appointment history).
+    """
+    query = db.session.query(func.coalesce(func.sum(AppointmentCounter.count), 0)).filter(
+        AppointmentCounter.day >= start_day,
+        AppointmentCounter.day < end_day
+    )
+    if doctor_id is not None:
+        query = query.filter(AppointmentCounter.doctor_id == doctor_id)
+    if statuses:
+        query = query.filter(AppointmentCounter.status.in_(statuses))
+    return query.scalar()
+
+def count_today(doctor_id=None):
+    today = date.today()
+    return count_appointments(today, today + timedelta(days=1), doctor_id)
+
+def count_next_week(doctor_id=None):
+    today = date.today()
+    return count_appointments(today, today + timedelta(days=7), doctor_id)
+
+
+# ---------------- repair ----------------
+
+def _day_expression(dialect_name):
+    if dialect_name == "sqlite":
+        return func.date(Appointment.appointment_date)
+    return cast(Appointment.appointment_date, db.Date)
+
+def rebuild_counters(conn=None):
+    """
+    Recomputes appointment_counters from scratch (after bulk loads, manual SQL
+    edits or anything else that bypassed the ORM). Returns the number of rows.
+    Runs on the given connection, or on db.session and commits.
+    """
+    own_transaction = conn is None
+    if own_transaction:
+        conn = db.session.connection()
+
+    table = AppointmentCounter.__table__
+    day = _day_expression(conn.dialect.name)
+    status = func.coalesce(Appointment.status, "scheduled")
+
+    grouped = db.select(
+        Appointment.doctor_id, day, status, func.count(Appointment.id)
+    ).group_by(Appointment.doctor_id, day, status)
+
+    conn.execute(table.delete())
+    conn.execute(
+        table.insert().from_select(["doctor_id", "day", "status", "count"], grouped)
+    )
+    rows = conn.execute(db.select(func.count()).select_from(table)).scalar()
+
+    if own_transaction:
+        db.session.commit()
+    return rows
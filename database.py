@@ -0,0 +1,65 @@
+from sqlalchemy import event
+from models import db
+
+# ---------------- engine tuning ----------------
+# SQLite is opened with its defaults (rollback journal, no busy timeout), so a
+# second writer fails straight away with "database is locked". Every new
+# SQLite connection gets the pragmas from Config instead:
+#   busy_timeout   wait for the write lock instead of failing
+#   journal_mode   WAL, readers no longer block the writer (and vice versa)
+#   synchronous    NORMAL is safe with WAL and avoids an fsync per commit
+#   cache_size     page cache per connection
+#   mmap_size      read the database through memory mapping
+# Server databases get their pool settings through SQLALCHEMY_ENGINE_OPTIONS
+# (config.py).
+
+SYNCHRONOUS_NAMES = {0: "OFF", 1: "NORMAL", 2: "FULL", 3: "EXTRA"}
+
+def sqlite_pragmas(config):
+    # busy_timeout first, so the others wait for a lock too
+    return [
+        f"PRAGMA busy_timeout = {int(config['SQLITE_BUSY_TIMEOUT_MS'])}",
+        f"PRAGMA journal_mode = {config['SQLITE_JOURNAL_MODE']}",
+        f"PRAGMA synchronous = {config['SQLITE_SYNCHRONOUS']}",
+        f"PRAGMA cache_size = {-int(config['SQLITE_CACHE_SIZE_KB'])}",
+        f"PRAGMA mmap_size = {int(config['SQLITE_MMAP_SIZE'])}",
+    ]
+
+def init_app(app):
+    with app.app_context():
+        engine = db.engine
+    if engine.dialect.name != "sqlite":
+        return
+
+    pragmas = sqlite_pragmas(app.config)
+
+    @event.listens_for(engine, "connect")
+    def set_sqlite_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        for pragma in pragmas:
+            cursor.execute(pragma)
+        cursor.close()
+
+def effective_settings():
+    """What the database is actually running with (needs an app context)."""
+    engine = db.engine
+    if engine.dialect.name == "sqlite":
+        with engine.connect() as conn:
+            settings = {name: conn.exec_driver_sql(f"PRAGMA {name}").scalar()
+                        for name in ("journal_mode", "synchronous", "busy_timeout", "cache_size", "mmap_size")}
+        settings["synchronous"] = SYNCHRONOUS_NAMES.get(settings["synchronous"], settings["synchronous"])
+        return settings
+
+    pool = engine.pool
+    return {
+        "pool": type(pool).__name__,
+        "pool_size": pool.size() if hasattr(pool, "size") else None,
+        "max_overflow": getattr(pool, "_max_overflow", None),
+        "pool_timeout": pool.timeout() if hasattr(pool, "timeout") else None,
+        "pool_recycle": pool._recycle,
+        "pool_pre_ping": pool._pre_ping,
+    }
+
+def report_settings():
+    settings = " ".join(f"{name}={value}" for name, value in effective_settings().items())
+    print(f"Database {db.engine.dialect.name} ({db.engine.url.render_as_string(hide_password=True)}): {settings}")
@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import threading
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.orm import aliased
+from models import db, User, Doctor, Patient, Appointment, Treatment, Payment
+
+# ---------------- data export ----------------
+# Appointments with their patient, doctor, treatment and payment as CSV or
+# NDJSON, for finance and audit (admin download, `flask export appointments`).
+# It is one query, read EXPORT_BATCH_SIZE rows at a time (yield_per, a server
+# side cursor where the driver has one) as plain tuples instead of ORM
+# objects, and written out in pieces as the rows come. Memory stays the same
+# for a thousand rows or millions and the download starts at once.
+#
+# A download keeps its request thread until the client has all of it, so a
+# process runs at most EXPORT_MAX_CONCURRENT exports at a time, more get
+# ExportBusy instead of taking the threads the other pages need.
+
+# format -> mimetype
+FORMATS = {"csv": "text/csv", "ndjson": "application/x-ndjson"}
+
+# characters per piece written / sent
+PIECE_SIZE = 64 * 1024
+
+class ExportBusy(RuntimeError):
+    pass
+
+PatientUser = aliased(User)
+DoctorUser = aliased(User)
+
+COLUMNS = (
+    ("appointment_id", Appointment.id),
+    ("appointment_date", Appointment.appointment_date),
+    ("status", Appointment.status),
+    ("appointment_notes", Appointment.notes),
+    ("patient_id", Patient.id),
+    ("patient_name", PatientUser.name),
+    ("patient_email", PatientUser.email),
+    ("doctor_id", Doctor.id),
+    ("doctor_name", DoctorUser.name),
+    ("specialization", Doctor.specialization),
+    ("diagnosis", Treatment.diagnosis),
+    ("prescription", Treatment.prescription),
+    ("treatment_notes", Treatment.notes),
+    ("record_date", Treatment.record_date),
+    ("payment_amount", Payment.amount),
+    ("payment_status", Payment.status),
+    ("billing_date", Payment.billing_date),
+)
+
+COLUMN_NAMES = [name for name, _ in COLUMNS]
+
+def parse_filters(args):
+    """
+    (date_from, date_to, status) from request args / CLI options, dates as
+    YYYY-MM-DD with date_to inclusive. Raises ValueError for a bad date.
+    """
+    date_from = datetime.strptime(args['date_from'], '%Y-%m-%d') if args.get('date_from') else None
+    date_to = datetime.strptime(args['date_to'], '%Y-%m-%d') + timedelta(days=1) if args.get('date_to') else None
+    return date_from, date_to, args.get('status') or None
+
+def export_statement(date_from=None, date_to=None, status=None):
+    """The export query, oldest first (ix_appointments_date). date_to is exclusive."""
+    stmt = select(*(column for _, column in COLUMNS)) \
+        .select_from(Appointment) \
+        .join(Patient, Patient.id == Appointment.patient_id) \
+        .join(PatientUser, PatientUser.id == Patient.user_id) \
+        .join(Doctor, Doctor.id == Appointment.doctor_id) \
+        .join(DoctorUser, DoctorUser.id == Doctor.user_id) \
+        .outerjoin(Treatment, Treatment.appointment_id == Appointment.id) \
+        .outerjoin(Payment, Payment.appointment_id == Appointment.id) \
+        .order_by(Appointment.appointment_date, Appointment.id)
+    if date_from:
+        stmt = stmt.where(Appointment.appointment_date >= date_from)
+    if date_to:
+        stmt = stmt.where(Appointment.appointment_date < date_to)
+    if status:
+        stmt = stmt.where(Appointment.status == status)
+    return stmt
+
+def export_rows(date_from=None, date_to=None, status=None):
+    """The rows of the export as tuples (COLUMN_NAMES order), fetched in batches."""
+    result = db.session.execute(export_statement(date_from, date_to, status),
+                                execution_options={"yield_per": current_app.config['EXPORT_BATCH_SIZE']})
+    try:
+        yield from result
+    finally:
+        result.close()
+
+def _json_value(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def csv_pieces(rows):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(COLUMN_NAMES)
+    for row in rows:
+        writer.writerow(row)
+        if buffer.tell() >= PIECE_SIZE:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    yield buffer.getvalue()
+
+def ndjson_pieces(rows):
+    lines, size = [], 0
+    for row in rows:
+        line = json.dumps(dict(zip(COLUMN_NAMES, row)), default=_json_value)
+        lines.append(line)
+        size += len(line) + 1
+        if size >= PIECE_SIZE:
+            yield "\n".join(lines) + "\n"
+            lines, size = [], 0
+    if lines:
+        yield "\n".join(lines) + "\n"
+
+def export_pieces(fmt, rows):
+    """The rows formatted as csv / ndjson, in pieces of about PIECE_SIZE characters."""
+    return csv_pieces(rows) if fmt == "csv" else ndjson_pieces(rows)
+
+
+# ---------------- concurrent downloads ----------------
+
+_slots = None
+_slots_lock = threading.Lock()
+
+def start_export():
+    """Takes an export slot of this process. Returns the function that frees it, raises ExportBusy."""
+    global _slots
+    if _slots is None:
+        with _slots_lock:
+            if _slots is None:
+                _slots = threading.BoundedSemaphore(current_app.config['EXPORT_MAX_CONCURRENT'])
+    if not _slots.acquire(blocking=False):
+        raise ExportBusy("Too many exports are running, please try again in a moment.")
+    return _slots.release
@@ -0,0 +1,56 @@
+# gunicorn -c gunicorn.conf.py wsgi:app
+#
+# Pre-forking server for production. The app is imported once in the master
+# (preload_app) and forked into WEB_WORKERS processes with WEB_THREADS
+# threads each. Everything can be overridden with environment variables.
+#
+# Reloading:
+#   kill -HUP <master pid>    re-read this file and restart the workers gracefully
+#                             (with preload the master keeps the old code, so
+#                             for a code deploy restart the master, or use
+#                             USR2 then QUIT on the old master for zero downtime)
+#   kill -TERM <master pid>   graceful shutdown, requests in flight get graceful_timeout
+
+import multiprocessing
+import os
+
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("WEB_WORKERS", multiprocessing.cpu_count()))
+threads = int(os.environ.get("WEB_THREADS", 4))
+worker_class = "gthread" if threads > 1 else "sync"
+
+preload_app = True
+timeout = int(os.environ.get("WEB_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("WEB_GRACEFUL_TIMEOUT", 30))
+keepalive = 5
+
+# recycle workers now and then (memory growth), jittered so they don't all restart at once
+max_requests = int(os.environ.get("WEB_MAX_REQUESTS", 5000))
+max_requests_jitter = max_requests // 10
+
+accesslog = os.environ.get("WEB_ACCESS_LOG", "-")
+
+
+def when_ready(server):
+    from wsgi import app
+    from database import report_settings
+    with app.app_context():
+        report_settings()
+    server.log.info("%d workers x %d threads", workers, threads)
+
+
+def post_fork(server, worker):
+    # connections opened in the master (preload) must not be shared between
+    # processes, every worker starts with an empty pool of its own
+    from wsgi import app
+    from models import db
+    import passwords
+    with app.app_context():
+        db.engine.dispose(close=False)
+    passwords.after_fork()
+
+
+def worker_exit(server, worker):
+    # stop the worker's password hashing processes with it
+    import passwords
+    passwords.shutdown_pool()
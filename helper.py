@@ -1,97 +1,252 @@
 from functools import wraps
-from flask import session, flash, redirect, url_for
-from models import User
-from datetime import datetime
+from flask import current_app, session, flash, redirect, url_for, g, jsonify, get_flashed_messages, stream_template
+from sqlalchemy import or_, and_, event, inspect
+from models import db, User, Doctor, Patient, Appointment
+from availability import get_schedule
+from datetime import datetime, timedelta
+
+# ---------------- request identity ----------------
+# Login stores the user's id, role, name, profile id and auth_version in the
+# (signed) session cookie. The decorators below build g.identity from it and
+# only look up users.auth_version (one primary key query) to make sure the
+# cached copy is still current. Changing a user's name or role bumps
+# auth_version (hook below), so stale sessions are reloaded on their next
+# request, and a deleted user is logged out.
+
+class Identity:
+    """The logged in user for the current request (g.identity)."""
+
+    __slots__ = ("user_id", "role", "name", "profile_id")
+
+    def __init__(self, user_id, role, name, profile_id):
+        self.user_id = user_id
+        self.role = role
+        self.name = name
+        # Doctor.id / Patient.id, None for the admin
+        self.profile_id = profile_id
+
+    @property
+    def id(self):
+        return self.user_id
+
+    @property
+    def user(self):
+        # full row only when a route really needs it
+        return db.session.get(User, self.user_id)
+
+def _profile_id(user):
+    if user.role == "Doctor":
+        return db.session.query(Doctor.id).filter_by(user_id=user.id).scalar()
+    if user.role == "Patient":
+        return db.session.query(Patient.id).filter_by(user_id=user.id).scalar()
+    return None
+
+def remember_identity(user):
+    """Stores the user's identity in the session (at login)."""
+    session['user_id'] = user.id
+    session['identity'] = {
+        "user_id": user.id,
+        "role": user.role,
+        "name": user.name,
+        "profile_id": _profile_id(user),
+        "version": user.auth_version or 0,
+    }
+
+def forget_identity():
+    session.pop('user_id', None)
+    session.pop('identity', None)
+
+def current_identity():
+    """The Identity of the logged in user (once per request), or None."""
+    if 'identity' in g:
+        return g.identity
+    identity = None
+    user_id = session.get('user_id')
+    if user_id is not None:
+        version = db.session.query(User.auth_version).filter_by(id=user_id).first()
+        if version is None:
+            # user was deleted
+            forget_identity()
+        else:
+            cached = session.get('identity')
+            if not cached or cached.get("user_id") != user_id or cached["version"] != (version[0] or 0):
+                # role / name / profile changed (or an old session), reload it
+                remember_identity(db.session.get(User, user_id))
+                cached = session['identity']
+            identity = Identity(user_id, cached["role"], cached["name"], cached["profile_id"])
+    g.identity = identity
+    return identity
+
+@event.listens_for(db.session, "before_flush")
+def bump_auth_version(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, User) and any(inspect(obj).attrs[key].history.has_changes() for key in ("name", "role")):
+            obj.auth_version = (obj.auth_version or 0) + 1
+    # a profile added or removed for an existing user
+    for obj in session.new | session.deleted:
+        if isinstance(obj, (Doctor, Patient)) and obj.user is not None and obj.user not in session.deleted:
+            obj.user.auth_version = (obj.user.auth_version or 0) + 1
+
+def role_required(roles, message, login_message='Please login first.', denied_endpoint='main.login', api=False):
+    """
+    Decorator factory: lets the request through only for the given roles.
+    api=True answers with a JSON 401 / 403 instead of a flash and redirect.
+    """
+    def decorator(func):
+        @wraps(func)
+        def inner(*args, **kwargs):
+            identity = current_identity()
+            if identity is None:
+                if api:
+                    return jsonify(error=login_message), 401
+                flash(login_message, category='danger')
+                return redirect(url_for('main.login'))
+            if identity.role not in roles:
+                if api:
+                    return jsonify(error=message), 403
+                flash(message, category='danger')
+                return redirect(url_for(denied_endpoint))
+            return func(*args, **kwargs)
+        return inner
+    return decorator
 
 # authentication for admin
-def admin_auth_required(func):
-    @wraps(func)
-    def inner(*args,**kwargs):
-        if 'user_id' not in session:
-            flash('Please login first.',category='danger')
-            return redirect(url_for('login'))
-        
-        user = User.query.get(session["user_id"])
-        if user.role != "Admin":
-            flash('Access denied. Only admin can access this page.', category='danger')
-            return redirect(url_for('home'))
-        return func(*args, **kwargs)
-    return inner
+admin_auth_required = role_required(("Admin",), 'Access denied. Only admin can access this page.', denied_endpoint='main.home')
 
 # authentication for patient
-def patient_auth_required(func):
-    @wraps(func)
-    def inner(*args, **kwargs):
-        if 'user_id' not in session:
-            flash('Please login first.',category='danger')
-            return redirect(url_for('login'))
-        user = User.query.get(session["user_id"])
-        if user.role != "Patient":
-            flash('Access denied. Only Patients can access this page',category='danger')
-            return redirect(url_for('login'))
-        return func(*args, **kwargs)
-    return inner
+patient_auth_required = role_required(("Patient",), 'Access denied. Only Patients can access this page')
 
 # authentication for doctor
-def doctor_auth_required(func):
-    @wraps(func)
-    def inner(*args, **kwargs):
-        if 'user_id' not in session:
-            flash('Please login first.',category='danger')
-            return redirect(url_for('login'))
-        user = User.query.get(session["user_id"])
-        if user.role != "Doctor":
-            flash('Access denied. Only Doctor can access this page',category='danger')
-            return redirect(url_for('login'))
-        return func(*args, **kwargs)
-    return inner
+doctor_auth_required = role_required(("Doctor",), 'Access denied. Only Doctor can access this page')
 
 # authentication for admin OR patient
-def admin_or_patient_auth_required(func):
-    @wraps(func)
-    def inner(*args, **kwargs):
-        if 'user_id' not in session:
-            flash('Please log in to access this page.', 'danger')
-            return redirect(url_for('login'))
-        user = User.query.get(session["user_id"])
-        if user.role != "Admin" and user.role != "Patient":
-            flash('Access denied. Only Admin or Patient can access this page',category='danger')
-            return redirect(url_for('login'))
-        return func(*args, **kwargs)
-    return inner
+admin_or_patient_auth_required = role_required(
+    ("Admin", "Patient"), 'Access denied. Only Admin or Patient can access this page',
+    login_message='Please log in to access this page.'
+)
+
+# the same checks for the JSON api
+api_admin_auth_required = role_required(("Admin",), 'Only admin can use this endpoint.', api=True)
+api_doctor_auth_required = role_required(("Doctor",), 'Only doctors can use this endpoint.', api=True)
+api_patient_auth_required = role_required(("Patient",), 'Only patients can use this endpoint.', api=True)
+api_admin_or_patient_auth_required = role_required(("Admin", "Patient"), 'Only admin or patients can use this endpoint.', api=True)
+
+
+# streamed pages
+# template output is sent in pieces of about this many characters, not one
+# write per template tag
+STREAM_PIECE_SIZE = 16 * 1024
+
+def _in_pieces(chunks):
+    pending, size = [], 0
+    try:
+        for chunk in chunks:
+            pending.append(chunk)
+            size += len(chunk)
+            if size >= STREAM_PIECE_SIZE:
+                yield "".join(pending)
+                pending, size = [], 0
+        if pending:
+            yield "".join(pending)
+    finally:
+        # ends the request context stream_template keeps for the template
+        chunks.close()
+
+def stream_page(template_name, **context):
+    """
+    stream_template for the big pages, sent (and compressed, compression.py)
+    while the template renders. The session cookie goes out with the headers,
+    before the template runs, so the flashed messages are taken out of the
+    session here; the template's get_flashed_messages() gets the same list.
+
+    The request's database session would be removed when the view returns,
+    before the template has run, and a lazy load in the template would fail
+    halfway through the page. It is taken out of db.session's registry
+    instead (the teardown finds nothing to remove) and closed with the
+    response, once the page is sent or the client went away.
+    """
+    get_flashed_messages(with_categories=True)
+    view_session = db.session.registry()
+    db.session.registry.clear()
+    response = current_app.response_class(_in_pieces(stream_template(template_name, **context)))
+    response.call_on_close(view_session.close)
+    return response
 
 
 # availability check
-def is_doctor_available(appointment_datetime, availability_string):
+def is_doctor_available(appointment_datetime, doctor):
     """
-    Checks if an appointment datetime is within a doctor's availability string.
-    Expected format: "Mon-Fri, 9 AM - 5 PM"
+    Checks if an appointment datetime is within a doctor's availability,
+    using the doctor's compiled (cached) schedule.
     """
+    schedule = get_schedule(doctor)
+    if schedule is None:
+        return False, "Could not parse the doctor's availability schedule. Please contact support."
+    return schedule.check(appointment_datetime)
+
+
+# keyset pagination (cursor = date + id of the last row on the page)
+def encode_cursor(appointment):
+    return f"{appointment.appointment_date.strftime('%Y%m%d%H%M%S%f')}-{appointment.id}"
+
+def decode_cursor(cursor):
     try:
-        # split and parse days tehen time
-        days_part, times_part = availability_string.split(', ')
-        
-        day_map = {"Mon": 0, "Tue": 1, "Wed": 2, "Thu": 3, "Fri": 4, "Sat": 5, "Sun": 6}
-        start_day_str, end_day_str = days_part.split('-')
-        start_day = day_map[start_day_str]
-        end_day = day_map[end_day_str]
-
-        start_time_str, end_time_str = times_part.split(' - ')
-        start_time = datetime.strptime(start_time_str, "%I %p").time()
-        end_time = datetime.strptime(end_time_str, "%I %p").time()
-
-        # check if requested whitin range
-        appointment_day = appointment_datetime.weekday()
-        appointment_time = appointment_datetime.time()
-
-        if not (start_day <= appointment_day <= end_day):
-            return False, "The selected day is outside the doctor's working days."
-
-        # check time valid range
-        if not (start_time <= appointment_time < end_time):
-            return False, "The selected time is outside the doctor's working hours."
-            
-        return True, "Slot is available."
-
-    except (ValueError, KeyError):
-        return False, "Could not parse the doctor's availability schedule. Please contact support."
\ No newline at end of file
+        date_part, id_part = cursor.split('-')
+        return datetime.strptime(date_part, '%Y%m%d%H%M%S%f'), int(id_part)
+    except (ValueError, AttributeError):
+        return None
+
+def paginate_appointments(query, cursor=None, per_page=50, newest_first=True):
+    """
+    Pages an Appointment query (newest first by default) without OFFSET, so
+    every page costs the same no matter how deep it is.
+    Returns (appointments, next_cursor), next_cursor is None on the last page.
+    """
+    if newest_first:
+        query = query.order_by(Appointment.appointment_date.desc(), Appointment.id.desc())
+    else:
+        query = query.order_by(Appointment.appointment_date.asc(), Appointment.id.asc())
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        last_date, last_id = position
+        if newest_first:
+            query = query.filter(or_(
+                Appointment.appointment_date < last_date,
+                and_(Appointment.appointment_date == last_date, Appointment.id < last_id)
+            ))
+        else:
+            query = query.filter(or_(
+                Appointment.appointment_date > last_date,
+                and_(Appointment.appointment_date == last_date, Appointment.id > last_id)
+            ))
+
+    # one extra row tells us if there is a next page
+    rows = query.limit(per_page + 1).all()
+    next_cursor = encode_cursor(rows[per_page - 1]) if len(rows) > per_page else None
+    return rows[:per_page], next_cursor
+
+
+# calendar window for the doctor dashboard (day / week / month)
+CALENDAR_VIEWS = ("day", "week", "month")
+
+def calendar_window(view, anchor):
+    """
+    Returns (start, end, previous_anchor, next_anchor) dates for the window
+    of the given view that contains anchor. end is exclusive.
+    """
+    if view == "day":
+        start = anchor
+        end = start + timedelta(days=1)
+        return start, end, start - timedelta(days=1), end
+
+    if view == "month":
+        start = anchor.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+        previous_start = (start - timedelta(days=1)).replace(day=1)
+        return start, end, previous_start, end
+
+    # week (Monday to Sunday)
+    start = anchor - timedelta(days=anchor.weekday())
+    end = start + timedelta(days=7)
+    return start, end, start - timedelta(days=7), end
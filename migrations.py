@@ -0,0 +1,276 @@
+from datetime import datetime, timezone
+from sqlalchemy import MetaData, Table, Column, Integer, String, DateTime, inspect, text
+from sqlalchemy.schema import CreateIndex
+from models import db, normalize_phone, slot_key_for
+from availability import schedule_from_availability
+from counters import rebuild_counters
+from billing import rebuild_billing
+from changes import SHARDED_SCOPES
+from search import create_search_index
+
+# ---------------- schema migrations ----------------
+# Every schema change is a numbered migration below. upgrade() runs the ones
+# that are not in schema_migrations yet, in order, each in its own transaction.
+# Migration 1 creates the original tables from the models, so a fresh database
+# and an old create_all() database end up on the same schema. Later migrations
+# must be idempotent (checkfirst / column checks) for the same reason.
+
+version_metadata = MetaData()
+
+schema_migrations = Table(
+    "schema_migrations", version_metadata,
+    Column("version", Integer, primary_key=True),
+    Column("description", String(200), nullable=False),
+    Column("applied_at", DateTime, nullable=False),
+)
+
+MIGRATIONS = []
+
+def migration(version, description):
+    def register(func):
+        MIGRATIONS.append((version, description, func))
+        return func
+    return register
+
+
+# helpers for migrations
+def create_tables_if_missing(conn, *table_names):
+    tables = [db.metadata.tables[name] for name in table_names]
+    db.metadata.create_all(conn, tables=tables, checkfirst=True)
+
+def create_indexes_if_missing(conn, table_name, *index_names):
+    table = db.metadata.tables[table_name]
+    for index in table.indexes:
+        if index.name in index_names:
+            # IF NOT EXISTS instead of checkfirst, reflection skips expression indexes
+            conn.execute(CreateIndex(index, if_not_exists=True))
+
+def add_column_if_missing(conn, table_name, column_name):
+    if column_name in {column["name"] for column in inspect(conn).get_columns(table_name)}:
+        return False
+    column = db.metadata.tables[table_name].c[column_name]
+    column_type = column.type.compile(dialect=conn.dialect)
+    conn.execute(text(f"ALTER TABLE {table_name} ADD COLUMN {column_name} {column_type}"))
+    return True
+
+
+# ---------------- migrations ----------------
+
+@migration(1, "baseline tables")
+def baseline(conn):
+    create_tables_if_missing(conn, "users", "doctors", "patients", "appointments", "treatments", "payment")
+
+@migration(2, "daily appointment counters")
+def appointment_counters(conn):
+    create_tables_if_missing(conn, "appointment_counters")
+    rebuild_counters(conn)
+
+@migration(3, "composite indexes for appointment hot paths")
+def appointment_indexes(conn):
+    create_indexes_if_missing(
+        conn, "appointments",
+        "ix_appointments_doctor_status_date",
+        "ix_appointments_patient_date_status",
+        "ix_appointments_doctor_date",
+        "ix_appointments_date",
+    )
+
+@migration(4, "doctor directory full-text index")
+def doctor_search_index(conn):
+    # no-op (LIKE fallback) when not on SQLite or FTS5 is missing
+    create_search_index(conn)
+
+@migration(5, "indexed patient lookup (phone digits, name prefix)")
+def patient_lookup_indexes(conn):
+    if add_column_if_missing(conn, "patients", "phone_digits"):
+        patients = db.metadata.tables["patients"]
+        rows = conn.execute(db.select(patients.c.id, patients.c.phone)).fetchall()
+        updates = [{"pid": row.id, "digits": normalize_phone(row.phone)} for row in rows]
+        for start in range(0, len(updates), 1000):
+            conn.execute(
+                patients.update().where(patients.c.id == db.bindparam("pid")).values(phone_digits=db.bindparam("digits")),
+                updates[start:start + 1000]
+            )
+    create_indexes_if_missing(conn, "patients", "ix_patients_phone_digits")
+    create_indexes_if_missing(conn, "users", "ix_users_name_lower")
+
+@migration(6, "structured doctor schedules")
+def doctor_schedules(conn):
+    add_column_if_missing(conn, "doctors", "schedule")
+    doctors = db.metadata.tables["doctors"]
+    rows = conn.execute(db.select(doctors.c.id, doctors.c.availability)).fetchall()
+    updates = [{"did": row.id, "schedule": schedule_from_availability(row.availability)} for row in rows]
+    if updates:
+        conn.execute(
+            doctors.update().where(doctors.c.id == db.bindparam("did")).values(schedule=db.bindparam("schedule")),
+            updates
+        )
+    unparsed = sum(1 for update in updates if update["schedule"] is None)
+    if unparsed:
+        print(f"  {unparsed} doctor(s) have an availability that could not be parsed, fix it from Edit Doctor")
+
+@migration(7, "database enforced appointment slots")
+def appointment_slot_keys(conn):
+    appointments = db.metadata.tables["appointments"]
+    if add_column_if_missing(conn, "appointments", "slot_key"):
+        rows = conn.execute(db.select(appointments.c.id, appointments.c.appointment_date)).fetchall()
+        updates = [{"aid": row.id, "key": slot_key_for(row.appointment_date)} for row in rows]
+        for start in range(0, len(updates), 1000):
+            conn.execute(
+                appointments.update().where(appointments.c.id == db.bindparam("aid")).values(slot_key=db.bindparam("key")),
+                updates[start:start + 1000]
+            )
+
+    # existing double bookings have to be sorted out by hand before the index can exist
+    duplicates = conn.execute(
+        db.select(appointments.c.doctor_id, appointments.c.slot_key, db.func.count())
+        .where(appointments.c.status == "Scheduled")
+        .group_by(appointments.c.doctor_id, appointments.c.slot_key)
+        .having(db.func.count() > 1)
+    ).fetchall()
+    if duplicates:
+        listed = ", ".join(f"doctor {row[0]} at {row[1]}" for row in duplicates[:10])
+        raise RuntimeError(
+            f"{len(duplicates)} double booked slot(s) found ({listed}). "
+            "Cancel or reschedule the extra appointments, then run `flask db upgrade` again."
+        )
+    create_indexes_if_missing(conn, "appointments", "uq_appointments_doctor_slot")
+
+@migration(8, "session identity versions")
+def user_auth_versions(conn):
+    # NULL counts as version 0, existing sessions are reloaded once on their next request
+    add_column_if_missing(conn, "users", "auth_version")
+
+@migration(9, "change versions for conditional API requests")
+def change_versions(conn):
+    create_tables_if_missing(conn, "change_versions")
+
+@migration(10, "billing rollups")
+def billing_rollups(conn):
+    create_tables_if_missing(conn, "billing_rollups")
+    rebuild_billing(conn)
+
+@migration(11, "sharded change versions")
+def shard_change_versions(conn):
+    # the single rows are replaced by "appointments#0".. (clients refetch once)
+    change_versions = db.metadata.tables["change_versions"]
+    conn.execute(change_versions.delete().where(change_versions.c.scope.in_(SHARDED_SCOPES)))
+
+@migration(12, "sharded all-doctor billing rows")
+def shard_billing_rollups(conn):
+    # all-doctor rows move from doctor_id 0 to period "all", their index goes
+    conn.execute(text("DROP INDEX IF EXISTS ix_billing_rollups_doctor"))
+    rebuild_billing(conn)
+
+
+# ---------------- running ----------------
+
+def applied_versions(conn):
+    if not inspect(conn).has_table("schema_migrations"):
+        return set()
+    return set(conn.execute(db.select(schema_migrations.c.version)).scalars())
+
+def current_version():
+    with db.engine.connect() as conn:
+        return max(applied_versions(conn), default=0)
+
+def upgrade():
+    """Applies pending migrations. Returns the list of versions applied."""
+    with db.engine.begin() as conn:
+        version_metadata.create_all(conn, checkfirst=True)
+        applied = applied_versions(conn)
+
+    newly_applied = []
+    for version, description, func in sorted(MIGRATIONS, key=lambda m: m[0]):
+        if version in applied:
+            continue
+        with db.engine.begin() as conn:
+            func(conn)
+            conn.execute(schema_migrations.insert().values(
+                version=version, description=description, applied_at=datetime.now(timezone.utc)
+            ))
+        print(f"Applied migration {version}: {description}")
+        newly_applied.append(version)
+    return newly_applied
+
+
+# ---------------- query plan check ----------------
+# The hot queries with the index SQLite should pick for each of them. Used by
+# `flask db check-plans` to catch a dropped index or a query that stopped
+# being sargable.
+
+PLAN_CHECKS = [
+    (
+        "double booking check",
+        "SELECT id FROM appointments WHERE doctor_id = 1 AND status = 'Scheduled' "
+        "AND appointment_date >= '2025-01-06 10:00:00' AND appointment_date < '2025-01-06 10:01:00'",
+        "ix_appointments_doctor_status_date",
+    ),
+    (
+        "patient upcoming appointments",
+        "SELECT id FROM appointments WHERE patient_id = 1 AND appointment_date >= '2025-01-06 00:00:00' "
+        "AND status IN ('Scheduled', 'Cancelled') ORDER BY appointment_date",
+        "ix_appointments_patient_date_status",
+    ),
+    (
+        "patient timeline",
+        "SELECT id FROM appointments WHERE patient_id = 1 AND appointment_date < '2025-01-07 00:00:00' "
+        "ORDER BY appointment_date DESC, id DESC LIMIT 21",
+        "ix_appointments_patient_date_status",
+    ),
+    (
+        "doctor calendar window",
+        "SELECT id FROM appointments WHERE doctor_id = 1 AND appointment_date >= '2025-01-06 00:00:00' "
+        "AND appointment_date < '2025-01-13 00:00:00' ORDER BY appointment_date, id",
+        "ix_appointments_doctor_date",
+    ),
+    (
+        "double booking constraint",
+        "SELECT id FROM appointments WHERE doctor_id = 1 AND slot_key = '2025-01-06 10:00:00.000000' "
+        "AND status = 'Scheduled'",
+        "uq_appointments_doctor_slot",
+    ),
+    (
+        "patient lookup by phone",
+        "SELECT id FROM patients WHERE phone_digits >= '98765' AND phone_digits < '98766' LIMIT 21",
+        "ix_patients_phone_digits",
+    ),
+    (
+        "patient lookup by name prefix",
+        "SELECT users.id FROM users JOIN patients ON users.id = patients.user_id "
+        "WHERE lower(users.name) >= 'ra' AND lower(users.name) < 'rb' ORDER BY lower(users.name), users.id LIMIT 21",
+        "ix_users_name_lower",
+    ),
+    (
+        "admin appointment list",
+        "SELECT id FROM appointments ORDER BY appointment_date DESC, id DESC LIMIT 51",
+        "ix_appointments_date",
+    ),
+    (
+        "billing per doctor",
+        "SELECT doctor_id, sum(amount) FROM billing_rollups WHERE period = 'month' "
+        "AND day >= '2025-01-01' AND day < '2026-01-01' GROUP BY doctor_id",
+        "PRIMARY KEY",
+    ),
+    (
+        "billing all doctors by day",
+        "SELECT day, sum(amount) FROM billing_rollups WHERE period = 'all' "
+        "AND day >= '2025-01-01' AND day < '2026-01-01' GROUP BY day",
+        "PRIMARY KEY",
+    ),
+]
+
+def check_query_plans():
+    """
+    Runs EXPLAIN QUERY PLAN for PLAN_CHECKS.
+    Returns a list of (name, expected_index, plan, ok). SQLite only.
+    """
+    results = []
+    with db.engine.connect() as conn:
+        if conn.dialect.name != "sqlite":
+            return results
+        for name, sql, expected_index in PLAN_CHECKS:
+            rows = conn.execute(text("EXPLAIN QUERY PLAN " + sql)).fetchall()
+            plan = " | ".join(row[-1] for row in rows)
+            results.append((name, expected_index, plan, expected_index in plan))
+    return results
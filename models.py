@@ -1,6 +1,9 @@
+import re
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy.orm import validates
 from datetime import datetime, timezone
-from werkzeug.security import generate_password_hash, check_password_hash
+from availability import schedule_from_availability
+from passwords import hash_password, verify_password, needs_rehash
 
 # initialize SQLAlchemy
 db = SQLAlchemy()
@@ -14,17 +17,23 @@ class User(db.Model):
     password = db.Column(db.String(256), nullable=False)
     role = db.Column(db.String(20), nullable=False)
     created_at = db.Column(db.DateTime, default=datetime.now(timezone.utc))
+    # bumped when the name / role / profile cached in a login session changes
+    auth_version = db.Column(db.Integer, default=0)
 
     doctor_profile = db.relationship('Doctor', backref='user', uselist=False, cascade="all, delete-orphan")
     patient_profile = db.relationship('Patient', backref='user', uselist=False, cascade="all, delete-orphan")
 
-    # hashing password
+    # hashing password (in the hashing pool, see passwords.py)
     def set_password(self, password):
-        self.password = generate_password_hash(password)
+        self.password = hash_password(password)
 
-    # checking password
+    # checking password, an outdated hash is replaced (caller commits)
     def check_password(self, password):
-        return check_password_hash(self.password, password)
+        if not verify_password(self.password, password):
+            return False
+        if needs_rehash(self.password):
+            self.set_password(password)
+        return True
 
 
 # inserting admin
@@ -43,6 +52,9 @@ def insert_admin(*args, **kwargs):
     else:
         print("Admin already exists")
 
+# admin patient lookup by name prefix (case insensitive)
+db.Index("ix_users_name_lower", db.func.lower(User.name))
+
 class Doctor(db.Model):
     __tablename__ = "doctors"
 
@@ -51,11 +63,18 @@ class Doctor(db.Model):
     specialization = db.Column(db.String(100))
     phone = db.Column(db.String(30))
     availability = db.Column(db.String(120))
+    # parsed availability (JSON, see availability.py), None if it can't be parsed
+    schedule = db.Column(db.Text)
 
     # doctor is "one" user (doctor.user)
     # uselist for specifying one to one instead of one to many
     # user = db.relationship("User", backref=db.backref("doctor", lazy=True, uselist=False))
 
+    @validates("availability")
+    def set_schedule(self, key, availability):
+        self.schedule = schedule_from_availability(availability)
+        return availability
+
 class Patient(db.Model):
     __tablename__ = "patients"
 
@@ -65,10 +84,22 @@ class Patient(db.Model):
     gender = db.Column(db.String(10))
     blood_group = db.Column(db.String(5))
     phone = db.Column(db.String(20))
+    # phone normalized to its last 10 digits, for indexed lookup
+    phone_digits = db.Column(db.String(10), index=True)
     address = db.Column(db.Text)
 
     # user = db.relationship("User", backref=db.backref("patient", uselist=False))
 
+    @validates("phone")
+    def set_phone_digits(self, key, phone):
+        self.phone_digits = normalize_phone(phone)
+        return phone
+
+
+def normalize_phone(phone):
+    digits = re.sub(r"\D", "", phone or "")
+    return digits[-10:] or None
+
 class Appointment(db.Model):
     __tablename__ = "appointments"
 
@@ -76,11 +107,44 @@ class Appointment(db.Model):
     patient_id = db.Column(db.Integer, db.ForeignKey("patients.id"), nullable=False)
     doctor_id = db.Column(db.Integer, db.ForeignKey("doctors.id"), nullable=False)
     appointment_date = db.Column(db.DateTime, nullable=False)
+    # appointment_date truncated to the minute, one Scheduled appointment per doctor per slot_key
+    slot_key = db.Column(db.DateTime)
     status = db.Column(db.String(20), default="scheduled")  # scheduled, completed, cancelled
     notes = db.Column(db.Text)
 
     patient = db.relationship("Patient", backref=db.backref("appointments", cascade="all, delete-orphan"))
     doctor = db.relationship("Doctor", backref=db.backref("appointments", cascade="all, delete-orphan"))
+
+    # hot paths (added by migration 3, see migrations.py)
+    __table_args__ = (
+        # double booking check: doctor + status + time
+        db.Index("ix_appointments_doctor_status_date", "doctor_id", "status", "appointment_date"),
+        # patient dashboard: patient + time range + status
+        db.Index("ix_appointments_patient_date_status", "patient_id", "appointment_date", "status"),
+        # doctor dashboard calendar window
+        db.Index("ix_appointments_doctor_date", "doctor_id", "appointment_date"),
+        # admin list, newest first
+        db.Index("ix_appointments_date", "appointment_date"),
+        # no double booking, enforced by the database (migration 7)
+        db.Index("uq_appointments_doctor_slot", "doctor_id", "slot_key", unique=True,
+                 sqlite_where=db.text("status = 'Scheduled'"), postgresql_where=db.text("status = 'Scheduled'")),
+    )
+
+    @validates("appointment_date")
+    def set_slot_key(self, key, appointment_date):
+        self.slot_key = slot_key_for(appointment_date)
+        return appointment_date
+
+
+def slot_key_for(appointment_date):
+    if appointment_date is None:
+        return None
+    return appointment_date.replace(second=0, microsecond=0)
+
+def is_slot_conflict(error):
+    """True if an IntegrityError comes from the double booking index."""
+    message = str(error.orig)
+    return "uq_appointments_doctor_slot" in message or "slot_key" in message
     
 class Treatment(db.Model):
     __tablename__ = "treatments"
@@ -110,6 +174,40 @@ class Payment(db.Model):
     appointment = db.relationship("Appointment", backref=db.backref("payment", uselist=False, cascade="all, delete-orphan"))
 
 
-def create_tables():
-    db.create_all()
-    insert_admin()
\ No newline at end of file
+# per day, per doctor, per status rollup of appointments (kept up to date by counters.py)
+class AppointmentCounter(db.Model):
+    __tablename__ = "appointment_counters"
+
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    day = db.Column(db.Date, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+    __table_args__ = (db.Index("ix_appointment_counters_day", "day"),)
+
+
+# payment totals per period, doctor and status (kept up to date by billing.py):
+# "month" and "day" rows per doctor, and "day" rows of all doctors (doctor_id 0)
+class BillingRollup(db.Model):
+    __tablename__ = "billing_rollups"
+
+    period = db.Column(db.String(5), primary_key=True)
+    # first day of the period
+    day = db.Column(db.Date, primary_key=True)
+    doctor_id = db.Column(db.Integer, primary_key=True)
+    status = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+    amount = db.Column(db.Float, nullable=False, default=0)
+
+    # stored in primary key order on SQLite, a date range of one period is one
+    # contiguous read
+    __table_args__ = {"sqlite_with_rowid": False}
+
+
+# change counter per scope ("appointments", "doctor:12", ...), bumped by changes.py, used for API ETags
+class ChangeVersion(db.Model):
+    __tablename__ = "change_versions"
+
+    scope = db.Column(db.String(40), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    changed_at = db.Column(db.DateTime)
@@ -0,0 +1,128 @@
+import multiprocessing
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, TimeoutError as FutureTimeout
+from flask import current_app
+from werkzeug.security import generate_password_hash, check_password_hash
+
+# ---------------- password hashing pool ----------------
+# Hashing a password is deliberately slow (scrypt / pbkdf2), so doing it on
+# the request thread blocks that thread for the whole hash. Hashes are run in
+# a process pool instead (one worker per core by default), which lets a login
+# surge use every core without holding the GIL in the web process.
+#
+# The pool is bounded: at most PASSWORD_HASH_QUEUE hashes may be queued or
+# running. Past that, requests fail fast with PasswordHashBusy instead of
+# piling up behind each other. Bulk imports go through hash_passwords(), which
+# keeps only one hash per pool worker in flight.
+#
+# Config:
+#   PASSWORD_HASH_METHOD   werkzeug method string, e.g. "scrypt" or "pbkdf2:sha256:600000"
+#   PASSWORD_HASH_WORKERS  pool size, 0 hashes on the calling thread (CLI, seeding)
+#   PASSWORD_HASH_QUEUE    max hashes queued or running
+#   PASSWORD_HASH_TIMEOUT  seconds to wait for a free place / a result
+
+class PasswordHashBusy(RuntimeError):
+    pass
+
+_pool = None
+_slots = None
+_pool_lock = threading.Lock()
+
+# configured method -> the prefix it produces in a stored hash ("scrypt:32768:8:1")
+_method_prefixes = {}
+
+def _config(key):
+    return current_app.config[key]
+
+def _get_pool():
+    global _pool, _slots
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                workers = _config('PASSWORD_HASH_WORKERS')
+                # forkserver: the pool starts its processes on first use, by then a
+                # gthread worker has threads running and forking it is unsafe. The
+                # fork server only needs werkzeug, not the app. Windows has no
+                # forkserver, spawn works there too (app.py is __main__ guarded)
+                if "forkserver" in multiprocessing.get_all_start_methods():
+                    context = multiprocessing.get_context("forkserver")
+                    context.set_forkserver_preload(["werkzeug.security"])
+                else:
+                    context = multiprocessing.get_context("spawn")
+                _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+                _slots = threading.BoundedSemaphore(max(_config('PASSWORD_HASH_QUEUE'), workers))
+    return _pool
+
+def _submit(func, *args, wait=False):
+    # takes one of the PASSWORD_HASH_QUEUE places, or raises PasswordHashBusy
+    # (wait: for as long as it takes)
+    pool = _get_pool()
+    slots = _slots
+    if not slots.acquire(timeout=None if wait else _config('PASSWORD_HASH_TIMEOUT')):
+        raise PasswordHashBusy("Too many logins at once, please try again in a moment.")
+    try:
+        future = pool.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # the place is freed when the hash is done, not when we stop waiting for it
+    future.add_done_callback(lambda _: slots.release())
+    return future
+
+def _run(func, *args):
+    if _config('PASSWORD_HASH_WORKERS') <= 0:
+        return func(*args)
+
+    future = _submit(func, *args)
+    try:
+        return future.result(timeout=_config('PASSWORD_HASH_TIMEOUT'))
+    except FutureTimeout:
+        raise PasswordHashBusy("Too many logins at once, please try again in a moment.")
+
+def hash_password(password):
+    return _run(generate_password_hash, password, _config('PASSWORD_HASH_METHOD'))
+
+def verify_password(stored_hash, password):
+    return _run(check_password_hash, stored_hash, password)
+
+def hash_passwords(passwords):
+    """
+    Hashes many passwords (bulk import) in the pool, in order. At most one
+    hash per pool worker is in flight, so logins queued meanwhile wait for
+    one hash, not for the whole batch. Each takes a queue place like a
+    login, waiting for one rather than failing the import when it's busy.
+    """
+    method = _config('PASSWORD_HASH_METHOD')
+    workers = _config('PASSWORD_HASH_WORKERS')
+    if workers <= 0:
+        return [generate_password_hash(password, method) for password in passwords]
+
+    hashes, in_flight = [], deque()
+    for password in passwords:
+        if len(in_flight) >= workers:
+            hashes.append(in_flight.popleft().result())
+        in_flight.append(_submit(generate_password_hash, password, method, wait=True))
+    hashes.extend(future.result() for future in in_flight)
+    return hashes
+
+def needs_rehash(stored_hash):
+    """True if a stored hash was made with a different method / cost than configured."""
+    method = _config('PASSWORD_HASH_METHOD')
+    if method not in _method_prefixes:
+        # werkzeug fills in the default cost, so let it tell us the full prefix
+        _method_prefixes[method] = generate_password_hash("", method).split("$", 1)[0]
+    return stored_hash.split("$", 1)[0] != _method_prefixes[method]
+
+def shutdown_pool():
+    # gunicorn worker_exit (gunicorn.conf.py)
+    global _pool, _slots
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown(wait=False, cancel_futures=True)
+        _pool, _slots = None, None
+
+def after_fork():
+    # a forked web worker must not use its parent's pool, it starts its own on first use
+    global _pool, _slots
+    _pool, _slots = None, None
@@ -0,0 +1,11 @@
+from routes.main import main_bp
+from routes.admin import admin_bp
+from routes.doctor import doctor_bp
+from routes.patient import patient_bp
+from routes.api import api_bp
+
+# the sections of the site, same urls as before, endpoints are "<blueprint>.<view>"
+# (api: JSON under /api/v1)
+def register_blueprints(app):
+    for blueprint in (main_bp, admin_bp, doctor_bp, patient_bp, api_bp):
+        app.register_blueprint(blueprint)
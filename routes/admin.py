@@ -0,0 +1,279 @@
+import io
+from itertools import islice
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, session, abort, stream_with_context
+from sqlalchemy.orm import joinedload
+from datetime import date, timedelta, datetime
+from helper import admin_auth_required, paginate_appointments, stream_page
+from models import db, User, Patient, Doctor, Appointment
+from counters import count_today
+from search import search_patients, directory_fragment, doctor_count, patient_count
+from availability import parse_availability, invalidate_schedule, AvailabilityError
+from timeline import load_patient, history_context
+from export import FORMATS, ExportBusy, parse_filters, export_rows, export_pieces, start_export
+from accounts import (KINDS, doctor_error, import_accounts, missing_columns, csv_rows,
+                      delete_doctor_account, delete_patient_account)
+from billing import PERIODS, report_range, billing_report
+
+# admin console: dashboard, doctor and patient management
+admin_bp = Blueprint("admin", __name__)
+
+@admin_bp.route("/admin/dashboard")
+@admin_auth_required
+def admin_dashboard():
+    # search params
+    doctor_query = request.args.get('doctor_search', '')
+    patient_query = request.args.get('patient_search', '')
+
+    # doctor directory (full text search, one page at a time, rendered rows are cached)
+    doctor_page = request.args.get('doctor_page', 1, type=int)
+    doctor_rows, doctors_has_next = directory_fragment("partials/directory_admin_rows.html", doctor_query, doctor_page)
+    total_doctors = doctor_count()
+
+    # patient lookup (routed to an indexed lookup by id / phone / name prefix)
+    patient_page = max(request.args.get('patient_page', 1, type=int), 1)
+    per_page = current_app.config['PATIENTS_PER_PAGE']
+    patients, patients_has_next = search_patients(patient_query, limit=per_page, offset=(patient_page - 1) * per_page)
+    total_patients = patient_count()
+
+    # appointment filters
+    status_filter = request.args.get('status', '')
+    date_from = request.args.get('date_from', '')
+    date_to = request.args.get('date_to', '')
+    cursor = request.args.get('cursor')
+
+    # patient, doctor and their users come in the same query (no lazy loads in the template)
+    appointments_query = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user),
+        joinedload(Appointment.doctor).joinedload(Doctor.user)
+    )
+    if status_filter:
+        appointments_query = appointments_query.filter(Appointment.status == status_filter)
+    try:
+        if date_from:
+            appointments_query = appointments_query.filter(Appointment.appointment_date >= datetime.strptime(date_from, '%Y-%m-%d'))
+        if date_to:
+            # date_to is inclusive
+            appointments_query = appointments_query.filter(Appointment.appointment_date < datetime.strptime(date_to, '%Y-%m-%d') + timedelta(days=1))
+    except ValueError:
+        flash('Enter valid dates (YYYY-MM-DD)', category='danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    appointments, next_cursor = paginate_appointments(appointments_query, cursor, current_app.config['APPOINTMENTS_PER_PAGE'])
+
+    no_of_appointment_today = count_today()
+
+
+    return stream_page("admin/dashboard.html", doctor_rows=doctor_rows, patients=patients, no_of_appointment_today=no_of_appointment_today, appointments=appointments,doctor_query=doctor_query,
+        patient_query=patient_query, total_doctors=total_doctors, doctor_page=doctor_page, doctors_has_next=doctors_has_next,
+        total_patients=total_patients, patient_page=patient_page, patients_has_next=patients_has_next, status_filter=status_filter, date_from=date_from, date_to=date_to, cursor=cursor, next_cursor=next_cursor)
+
+# Doctor Register
+@admin_bp.route("/admin/doctor_register", methods=["GET", "POST"])
+@admin_auth_required
+def doctor_register():
+    if request.method == "GET":
+        return render_template("doctor_registration.html")
+    
+    # if post
+    name = request.form.get('name')
+    email = request.form.get("email")
+    password = request.form.get("password")
+
+    specialization = request.form.get("specialization")
+    phone = request.form.get("phone")
+    availability = request.form.get("availability")
+
+    # same rules as the bulk import (accounts.py)
+    error = doctor_error(request.form)
+    if error:
+        flash(error, category="danger")
+        return redirect(url_for("admin.doctor_register"))
+    
+    # checking if email already present or not
+    if User.query.filter_by(email=email).first():
+        flash('This email is already being used.',category='danger')
+        return redirect(url_for('admin.doctor_register'))
+    
+    # create User
+    newUser = User(email=email, name=name, password=password, role="Doctor")
+
+    # print(newUser) # debug print
+
+    newUser.set_password(password)
+    db.session.add(newUser)
+
+    db.session.flush() # Use flush to get the new_user.id before committing
+
+    # Create patient profile
+    new_doctor = Doctor(user_id=newUser.id, specialization=specialization, availability=availability, phone=phone)
+
+    db.session.add(new_doctor)
+    db.session.commit()
+
+    if 'user_id' in session:
+        return redirect(url_for("admin.admin_dashboard"))
+
+    return redirect(url_for("main.login"))
+
+# edit doc
+@admin_bp.route("/admin/doctor/edit/<int:doctor_id>", methods=['GET', 'POST'])
+@admin_auth_required
+def edit_doctor(doctor_id):
+    
+    # get doc detail (join User and Doctor)
+    doctor_data = db.session.query(User, Doctor).join(Doctor, User.id == Doctor.user_id).filter(Doctor.id == doctor_id).first_or_404()
+
+    # print(doctor_data) # debug print
+    
+    if request.method == 'POST':
+        user_to_update = doctor_data.User
+        doctor_to_update = doctor_data.Doctor
+
+        # checking if availability is readable
+        try:
+            parse_availability(request.form.get('availability'))
+        except AvailabilityError as e:
+            flash(f'Invalid availability: {e}', 'danger')
+            return render_template("admin/edit_doctor.html", doctor_data=doctor_data)
+
+        # form data
+        user_to_update.name = request.form.get('name')
+        new_email = request.form.get('email')
+        doctor_to_update.specialization = request.form.get('specialization')
+        doctor_to_update.phone = request.form.get('phone')
+        doctor_to_update.availability = request.form.get('availability')
+
+        # repeated email check
+        if new_email != user_to_update.email:
+            # print(edit checkpoint) # debug print
+            existing_user = User.query.filter_by(email=new_email).first()
+            if existing_user:
+                flash('That email address is already registered.', 'danger')
+                return render_template("admin/edit_doctor.html", doctor_data=doctor_data)
+        
+        user_to_update.email = new_email
+        
+        db.session.commit()
+        invalidate_schedule(doctor_to_update.id)
+        
+        flash(f'Doctor {user_to_update.name}\'s profile has been updated!', 'success')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    # if get
+    return render_template("admin/edit_doctor.html", doctor_data=doctor_data)
+
+# delete doc
+@admin_bp.route("/admin/doctor/delete/<int:doctor_id>", methods=['POST'])
+@admin_auth_required
+def delete_doctor(doctor_id):
+
+    # print("delete ghus gaya bhai") # debug print
+
+    # get doc and user
+    doctor_to_delete = Doctor.query.options(joinedload(Doctor.user)).get_or_404(doctor_id)
+    
+    # for flash
+    doctor_name = doctor_to_delete.user.name
+    
+    # set-based, with its appointments, treatments and payments (accounts.py)
+    delete_doctor_account(doctor_to_delete)
+    
+    flash(f'Doctor {doctor_name} has been successfully deleted.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+# delete patient
+@admin_bp.route("/admin/patient/delete/<int:patient_id>", methods=['POST'])
+@admin_auth_required
+def delete_patient(patient_id):
+    patient_to_delete = Patient.query.options(joinedload(Patient.user)).get_or_404(patient_id)
+    
+    # for flash
+    patient_name = patient_to_delete.user.name
+
+    # set-based, with its appointments, treatments and payments (accounts.py)
+    delete_patient_account(patient_to_delete)
+    
+    flash(f'Patient {patient_name} and all associated data have been permanently deleted.', 'success')
+    return redirect(url_for('admin.admin_dashboard'))
+
+# view patient hitory
+@admin_bp.route("/admin/patient_history/<int:patient_id>")
+@admin_auth_required
+def admin_view_patient_history(patient_id):
+    patient = load_patient(patient_id)
+
+    # one page of the record, newest first (?cursor=, ?date= to jump)
+    return render_template("doctor/patient_history.html", **history_context(patient, request.args))
+
+# download appointments with treatment and payment (same filters as the dashboard list)
+@admin_bp.route("/admin/export/appointments.<fmt>")
+@admin_auth_required
+def export_appointments(fmt):
+    if fmt not in FORMATS:
+        abort(404)
+    try:
+        date_from, date_to, status = parse_filters(request.args)
+    except ValueError:
+        flash('Enter valid dates (YYYY-MM-DD)', category='danger')
+        return redirect(url_for('admin.admin_dashboard'))
+
+    try:
+        release = start_export()
+    except ExportBusy as e:
+        flash(str(e), category='danger')
+        response = redirect(url_for('admin.admin_dashboard'))
+        response.headers['Retry-After'] = '30'
+        return response
+
+    # the rows are read while the response is sent
+    pieces = stream_with_context(export_pieces(fmt, export_rows(date_from, date_to, status)))
+    response = current_app.response_class(pieces, mimetype=FORMATS[fmt])
+    response.headers['Content-Disposition'] = f'attachment; filename=appointments-{date.today():%Y%m%d}.{fmt}'
+    # the slot is freed when the download ends, finished or not
+    response.call_on_close(release)
+    return response
+
+# revenue report: paid / pending payments per specialization, doctor and month / day (billing rollups)
+@admin_bp.route("/admin/billing")
+@admin_auth_required
+def admin_billing():
+    try:
+        start_day, end_day, period = report_range(request.args)
+    except ValueError:
+        flash('Enter a valid date range (YYYY-MM-DD)', category='danger')
+        return redirect(url_for('admin.admin_billing'))
+
+    report = billing_report(start_day, end_day, period)
+    return render_template("admin/billing.html", report=report, periods=PERIODS)
+
+# bulk import of patient / doctor accounts from a CSV upload (bigger files: flask import)
+@admin_bp.route("/admin/import", methods=['GET', 'POST'])
+@admin_auth_required
+def import_accounts_upload():
+    if request.method == 'GET':
+        return render_template("admin/import.html", kinds=sorted(KINDS), report=None)
+
+    kind = request.form.get('kind')
+    upload = request.files.get('file')
+    if kind not in KINDS or not upload or not upload.filename:
+        flash('Choose what to import and a CSV file.', category='danger')
+        return redirect(url_for('admin.import_accounts_upload'))
+
+    max_rows = current_app.config['IMPORT_MAX_UPLOAD_ROWS']
+    try:
+        reader = csv_rows(io.TextIOWrapper(upload.stream, encoding='utf-8-sig'))
+        missing = missing_columns(kind, reader.fieldnames)
+        rows = list(islice(reader, max_rows + 1)) if not missing else []
+    except (ValueError, UnicodeDecodeError) as e:
+        flash(f'Could not read the file: {e}', category='danger')
+        return redirect(url_for('admin.import_accounts_upload'))
+    if missing:
+        flash(f"Missing columns: {', '.join(missing)}", category='danger')
+        return redirect(url_for('admin.import_accounts_upload'))
+    if len(rows) > max_rows:
+        flash(f'The file has more than {max_rows} rows, use `flask import {kind}` for it.', category='danger')
+        return redirect(url_for('admin.import_accounts_upload'))
+
+    report = import_accounts(kind, rows)
+    flash(f'Imported {report.created} of {report.rows} {kind}.', category='success' if not report.errors else 'info')
+    return render_template("admin/import.html", kinds=sorted(KINDS), kind=kind, report=report)
@@ -0,0 +1,162 @@
+from flask import Blueprint, current_app, request, jsonify, g
+from sqlalchemy.orm import joinedload
+from datetime import date, timedelta, datetime
+from helper import (api_admin_auth_required, api_doctor_auth_required, api_patient_auth_required,
+                    api_admin_or_patient_auth_required, paginate_appointments, calendar_window, CALENDAR_VIEWS)
+from models import Patient, Doctor, Appointment
+from counters import count_today, count_next_week
+from billing import report_range, billing_report
+from search import directory_page
+from changes import conditional_json
+from cache import fragment_cache
+
+# JSON versions of the dashboard lists, for screens that poll them. Every
+# response carries an ETag / Last-Modified from changes.py, an unchanged poll
+# (If-None-Match / If-Modified-Since) gets a 304 without running the list
+# queries. Appointment lists are paged by cursor like the dashboards.
+api_bp = Blueprint("api", __name__, url_prefix="/api/v1")
+
+def _person(profile):
+    return {"id": profile.id, "name": profile.user.name}
+
+def appointment_json(appointment, patient=True, doctor=True):
+    data = {
+        "id": appointment.id,
+        "appointment_date": appointment.appointment_date.isoformat(),
+        "status": appointment.status,
+        "notes": appointment.notes,
+    }
+    if patient:
+        data["patient"] = _person(appointment.patient)
+    if doctor:
+        data["doctor"] = dict(_person(appointment.doctor), specialization=appointment.doctor.specialization)
+    return data
+
+def _parse_day(value):
+    return datetime.strptime(value, '%Y-%m-%d')
+
+# all appointments, newest first (admin dashboard list)
+@api_bp.route("/appointments")
+@api_admin_auth_required
+def appointments():
+    status_filter = request.args.get('status', '')
+    try:
+        date_from = _parse_day(request.args['date_from']) if request.args.get('date_from') else None
+        # inclusive
+        date_to = _parse_day(request.args['date_to']) + timedelta(days=1) if request.args.get('date_to') else None
+    except ValueError:
+        return jsonify(error="Dates must be YYYY-MM-DD."), 400
+
+    def build():
+        query = Appointment.query.options(
+            joinedload(Appointment.patient).joinedload(Patient.user),
+            joinedload(Appointment.doctor).joinedload(Doctor.user)
+        )
+        if status_filter:
+            query = query.filter(Appointment.status == status_filter)
+        if date_from:
+            query = query.filter(Appointment.appointment_date >= date_from)
+        if date_to:
+            query = query.filter(Appointment.appointment_date < date_to)
+        rows, next_cursor = paginate_appointments(query, request.args.get('cursor'), current_app.config['APPOINTMENTS_PER_PAGE'])
+        return {
+            "appointments": [appointment_json(appointment) for appointment in rows],
+            "next_cursor": next_cursor,
+            "today": count_today(),
+        }
+
+    return conditional_json(["appointments", "users", "doctors"], build, valid_from=date.today())
+
+# doctor directory (admin and patient dashboards)
+@api_bp.route("/doctors")
+@api_admin_or_patient_auth_required
+def doctors():
+    doctor_query = request.args.get('q', '')
+    page = max(request.args.get('page', 1, type=int), 1)
+
+    def build():
+        entries, has_next = directory_page(doctor_query, page)
+        return {
+            "doctors": [{"id": entry.id, "name": entry.name, "specialization": entry.specialization,
+                         "availability": entry.availability} for entry in entries],
+            "page": page,
+            "has_next": has_next,
+        }
+
+    return conditional_json(["doctors", "users"], build)
+
+# the logged in doctor's calendar window
+@api_bp.route("/doctor/appointments")
+@api_doctor_auth_required
+def doctor_appointments():
+    doctor_id = g.identity.profile_id
+    view = request.args.get('view', 'week')
+    if view not in CALENDAR_VIEWS:
+        return jsonify(error=f"view must be one of {', '.join(CALENDAR_VIEWS)}."), 400
+    try:
+        anchor = _parse_day(request.args['start']).date() if request.args.get('start') else date.today()
+    except ValueError:
+        return jsonify(error="start must be YYYY-MM-DD."), 400
+    window_start, window_end, previous_start, next_start = calendar_window(view, anchor)
+
+    def build():
+        query = Appointment.query.options(
+            joinedload(Appointment.patient).joinedload(Patient.user)
+        ).filter(
+            Appointment.doctor_id == doctor_id,
+            Appointment.appointment_date >= datetime.combine(window_start, datetime.min.time()),
+            Appointment.appointment_date < datetime.combine(window_end, datetime.min.time())
+        )
+        rows, next_cursor = paginate_appointments(query, request.args.get('cursor'),
+                                                  current_app.config['APPOINTMENTS_PER_PAGE'], newest_first=False)
+        return {
+            "view": view,
+            "window_start": window_start.isoformat(),
+            "window_end": (window_end - timedelta(days=1)).isoformat(),
+            "previous_start": previous_start.isoformat(),
+            "next_start": next_start.isoformat(),
+            "appointments": [appointment_json(appointment, doctor=False) for appointment in rows],
+            "next_cursor": next_cursor,
+            "today": count_today(doctor_id),
+            "next_week": count_next_week(doctor_id),
+        }
+
+    # the counts (and the default window) move with the day
+    return conditional_json([f"doctor:{doctor_id}", "users"], build, valid_from=date.today())
+
+# the logged in patient's appointments, newest first
+@api_bp.route("/patient/appointments")
+@api_patient_auth_required
+def patient_appointments():
+    patient_id = g.identity.profile_id
+
+    def build():
+        query = Appointment.query.options(
+            joinedload(Appointment.doctor).joinedload(Doctor.user)
+        ).filter(Appointment.patient_id == patient_id)
+        rows, next_cursor = paginate_appointments(query, request.args.get('cursor'), current_app.config['APPOINTMENTS_PER_PAGE'])
+        return {
+            "appointments": [appointment_json(appointment, patient=False) for appointment in rows],
+            "next_cursor": next_cursor,
+        }
+
+    return conditional_json([f"patient:{patient_id}", "users", "doctors"], build)
+
+# revenue report (admin billing page), date_from / date_to default to this calendar year
+@api_bp.route("/billing")
+@api_admin_auth_required
+def billing():
+    try:
+        start_day, end_day, period = report_range(request.args)
+    except ValueError:
+        return jsonify(error="Dates must be YYYY-MM-DD with date_from before date_to, period month or day."), 400
+
+    # valid_from: without dates the range moves on New Year's Day
+    return conditional_json(["payments", "doctors", "users"], lambda: billing_report(start_day, end_day, period),
+                            valid_from=date(date.today().year, 1, 1))
+
+# fragment cache hit / miss counters (of the worker process that answers)
+@api_bp.route("/cache")
+@api_admin_auth_required
+def cache_stats():
+    return jsonify(fragment_cache().stats())
@@ -0,0 +1,167 @@
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, g
+from sqlalchemy.orm import joinedload
+from datetime import date, timedelta, datetime
+from helper import doctor_auth_required, paginate_appointments, calendar_window, stream_page, CALENDAR_VIEWS
+from models import db, Patient, Doctor, Appointment, Treatment, Payment
+from counters import count_today, count_next_week
+from availability import parse_availability, invalidate_schedule, AvailabilityError
+from timeline import load_patient, history_context, has_seen_patient
+
+# doctor's calendar, appointments and availability
+doctor_bp = Blueprint("doctor", __name__)
+
+@doctor_bp.route("/doctor/dashboard")
+@doctor_auth_required
+def doctor_dashboard():
+    current_user = g.identity
+    doctor_id = current_user.profile_id
+
+    # calendar window (day / week / month around ?start=YYYY-MM-DD)
+    view = request.args.get('view', 'week')
+    if view not in CALENDAR_VIEWS:
+        view = 'week'
+    try:
+        anchor = datetime.strptime(request.args.get('start', ''), '%Y-%m-%d').date()
+    except ValueError:
+        anchor = date.today()
+    window_start, window_end, previous_start, next_start = calendar_window(view, anchor)
+    cursor = request.args.get('cursor')
+
+    # only this window is queried, paged by cursor
+    appointments_query = Appointment.query.options(
+        joinedload(Appointment.patient).joinedload(Patient.user)
+    ).filter(
+        Appointment.doctor_id == doctor_id,
+        Appointment.appointment_date >= datetime.combine(window_start, datetime.min.time()),
+        Appointment.appointment_date < datetime.combine(window_end, datetime.min.time())
+    )
+    appointments, next_cursor = paginate_appointments(appointments_query, cursor, current_app.config['APPOINTMENTS_PER_PAGE'], newest_first=False)
+
+    # KPI tiles come from the daily counters
+    today_appointments_count = count_today(doctor_id)
+    week_appointments_count = count_next_week(doctor_id)
+
+
+    return stream_page("doctor/dashboard.html", current_user=current_user,
+    appointments=appointments,
+    today_appointments_count=today_appointments_count,
+    week_appointments_count=week_appointments_count,
+    view=view,
+    window_start=window_start,
+    window_end=window_end - timedelta(days=1),
+    previous_start=previous_start,
+    next_start=next_start,
+    cursor=cursor,
+    next_cursor=next_cursor
+    )
+
+# Appointment Detail
+@doctor_bp.route("/doctor/appointment/<int:appointment_id>")
+@doctor_auth_required
+def appointment_details(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    
+    # Authorization check (Not Implemented) - (copy from below if needed)
+
+    # get treatment
+    treatment = Treatment.query.filter_by(appointment_id=appointment.id).first()
+        
+    return render_template("doctor/appointment_details.html", appointment=appointment, treatment=treatment)
+
+# medical history of one of the doctor's patients
+@doctor_bp.route("/doctor/patient_history/<int:patient_id>")
+@doctor_auth_required
+def patient_history(patient_id):
+    patient = load_patient(patient_id)
+
+    if not has_seen_patient(g.identity.profile_id, patient.id):
+        flash("You can only view the history of your own patients.", "danger")
+        return redirect(url_for('doctor.doctor_dashboard'))
+
+    return render_template("doctor/patient_history.html", **history_context(patient, request.args))
+
+# Mark as cancel
+@doctor_bp.route("/doctor/appointment/update_status/<int:appointment_id>", methods=['POST'])
+@doctor_auth_required
+def update_appointment_status(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    # Authorization check
+    if appointment.doctor_id != g.identity.profile_id:
+        flash("You are not authorized to update this appointment.", "danger")
+        return redirect(url_for('doctor.doctor_dashboard'))
+
+    new_status = request.form.get('status')
+    if new_status in ['Completed', 'Cancelled']:
+        appointment.status = new_status
+        db.session.commit()
+        flash(f"Appointment has been marked as {new_status}.", "success")
+    
+    return redirect(url_for('doctor.doctor_dashboard'))
+
+# Treatment Adding (Diagnosis and etc.)
+@doctor_bp.route("/doctor/appointment/save_treatment/<int:appointment_id>", methods=['POST'])
+@doctor_auth_required
+def save_treatment(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+    
+    if appointment.doctor_id != g.identity.profile_id:
+        flash("You are not authorized to modify this appointment.", "danger")
+        return redirect(url_for('doctor.doctor_dashboard'))
+    
+    # looked up before anything changes, so the whole save is one flush
+    payment = Payment.query.filter_by(appointment_id=appointment.id).first() if appointment.status == 'Scheduled' else None
+
+    # save
+    existing_treatment = Treatment.query.filter_by(appointment_id=appointment.id).first()
+    if existing_treatment:
+        existing_treatment.diagnosis = request.form.get('diagnosis')
+        existing_treatment.prescription = request.form.get('prescription')
+        existing_treatment.notes = request.form.get('notes')
+        flash("Treatment record has been updated.", "success")
+    else:
+        new_treatment = Treatment(
+            appointment_id=appointment.id,
+            diagnosis=request.form.get('diagnosis'),
+            prescription=request.form.get('prescription'),
+            notes=request.form.get('notes')
+        )
+        db.session.add(new_treatment)
+        flash("Treatment record saved successfully.", "success")
+
+    # updating status and payment as paid
+    if appointment.status == 'Scheduled':
+        appointment.status = 'Completed'
+        
+        if payment:
+            payment.status = 'paid'
+        
+        flash("Appointment marked as completed and payment status updated to paid.", "info")
+
+    db.session.commit()
+    
+    return redirect(url_for('doctor.appointment_details', appointment_id=appointment.id))
+
+# Updating own availability
+@doctor_bp.route("/doctor/update_availability", methods=['GET', 'POST'])
+@doctor_auth_required
+def update_availability():
+    doctor = Doctor.query.get_or_404(g.identity.profile_id)
+
+    if request.method == 'POST':
+        new_availability = request.form.get('availability')
+
+        try:
+            parse_availability(new_availability)
+        except AvailabilityError as e:
+            flash(f'Invalid availability: {e}', 'danger')
+            return redirect(url_for('doctor.update_availability'))
+        
+        doctor.availability = new_availability
+        db.session.commit()
+        invalidate_schedule(doctor.id)
+        
+        flash('Your availability has been updated successfully!', 'success')
+        return redirect(url_for('doctor.doctor_dashboard'))
+
+    # if get
+    return render_template("doctor/update_availability.html", doctor=doctor)
@@ -0,0 +1,110 @@
+from flask import Blueprint, render_template, request, flash, redirect, url_for, session
+from helper import remember_identity, forget_identity
+from models import db, User, Patient
+from passwords import PasswordHashBusy
+from accounts import patient_error
+
+# landing page, registration and login for all roles
+main_bp = Blueprint("main", __name__)
+
+# password hashing pool is full (login surge), ask the user to retry
+@main_bp.app_errorhandler(PasswordHashBusy)
+def password_hash_busy(e):
+    db.session.rollback()
+    flash(str(e), category='danger')
+    response = redirect(request.url)
+    response.headers['Retry-After'] = '2'
+    return response
+
+@main_bp.route("/")
+def home():
+    return render_template("landing.html")
+
+# patient register
+@main_bp.route("/register", methods=["GET", "POST"])
+def register():
+    if request.method == "GET":
+        return render_template("register.html")
+    
+    # if post
+    name = request.form.get('name')
+    email = request.form.get("email")
+    password = request.form.get("password")
+
+    age = request.form.get("age")
+    bloodGroup = request.form.get("bloodGroup")
+    gender = request.form.get("gender")
+    phone = request.form.get("phone")
+    address = request.form.get("address")
+
+    # same rules as the bulk import (accounts.py)
+    error = patient_error(request.form)
+    if error:
+        flash(error, category="danger")
+        return redirect(url_for("main.register"))
+    
+    # checking if email already present or not
+    if User.query.filter_by(email=email).first():
+        flash('This email is already being used.',category='danger')
+        return redirect(url_for('main.register'))
+    
+    # create User
+    newUser = User(email=email, name=name, password=password, role="Patient")
+    newUser.set_password(password)
+    db.session.add(newUser)
+
+    db.session.flush() # Use flush to get the new_user.id before committing
+
+    # Create patient profile
+    new_patient = Patient(user_id=newUser.id, age=age, gender=gender, blood_group=bloodGroup, phone=phone, address=address)
+
+    db.session.add(new_patient)
+    db.session.commit()
+
+    if 'user_id' in session:
+        return redirect(url_for("admin.admin_dashboard"))
+    
+    return redirect(url_for("main.login"))
+
+# login for all roles
+@main_bp.route("/login", methods=["GET", "POST"])
+def login():
+    if request.method == "GET":
+        return render_template("login.html")
+    
+    # if post
+    email = request.form.get("email")
+    password = request.form.get("password")
+
+    if(not email or not password):
+        flash("Please Provide all required field", category="danger")
+        return redirect(url_for("main.login"))
+
+    user = User.query.filter_by(email=email).first()
+
+    # checking credentials
+    if not user or not user.check_password(password):
+        flash("Wrong Credentials", category="danger")
+        return redirect(url_for("main.login"))
+    
+    # saves the upgraded hash if check_password rehashed it
+    db.session.commit()
+
+    # role / profile are cached in the session for the auth decorators
+    remember_identity(user)
+
+    if(user.role == "Admin"):
+        return redirect(url_for("admin.admin_dashboard"))
+    
+    if(user.role == "Patient"):
+        return redirect(url_for("patient.user_dashboard"))
+    
+    if(user.role == "Doctor"):
+        return redirect(url_for("doctor.doctor_dashboard"))
+
+# logout for all roles
+@main_bp.route("/logout", methods=["POST"])
+def logout():
+    if request.method == "POST":
+        forget_identity()
+        return redirect(url_for("main.home"))
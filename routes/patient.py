@@ -0,0 +1,264 @@
+from flask import Blueprint, current_app, render_template, request, flash, redirect, url_for, jsonify, g
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
+from datetime import date, timedelta, datetime, timezone
+from helper import patient_auth_required, admin_or_patient_auth_required, is_doctor_available, stream_page
+from models import db, User, Patient, Doctor, Appointment, is_slot_conflict
+from search import directory_fragment
+from slots import find_free_slots, slot_label
+
+# patient dashboard, doctor search and booking (some pages shared with the admin)
+patient_bp = Blueprint("patient", __name__)
+
+@patient_bp.route("/user/dashboard")
+@patient_auth_required
+def user_dashboard():
+    current_user = g.identity
+    
+    # search
+    doctor_query = request.args.get('doctor_search', '')
+    doctor_rows, _ = directory_fragment("partials/directory_patient_rows.html", doctor_query, 1)
+
+    # appointments (past and future)
+    now = datetime.now(timezone.utc)
+    upcoming_appointments = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user)
+    ).filter(
+        Appointment.patient_id == current_user.profile_id,
+        Appointment.appointment_date >= now,
+        Appointment.status.in_(['Scheduled', 'Cancelled'])
+    ).order_by(Appointment.appointment_date.asc()).all()
+
+    # print(upcoming_appointments)
+
+    past_appointments = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.treatment)
+    ).filter(
+        Appointment.patient_id == current_user.profile_id,
+        Appointment.appointment_date < now,
+        Appointment.status.in_(['Completed', 'Cancelled'])
+    ).order_by(Appointment.appointment_date.desc()).all()
+
+    return stream_page(
+        "patient/dashboard.html", 
+        current_user=current_user,
+        doctor_rows=doctor_rows,
+        doctor_query=doctor_query,
+        upcoming_appointments=upcoming_appointments,
+        past_appointments=past_appointments
+    )
+
+# edit patient
+@patient_bp.route("/patient/edit/<int:patient_id>", methods=['GET', 'POST'])
+@admin_or_patient_auth_required  
+def edit_patient(patient_id):
+    # login detail
+    current_user = g.identity
+    
+    # get patient profile
+    patient_to_edit = Patient.query.get_or_404(patient_id)
+
+    # patient only updating his profile (not others)
+    if current_user.role == 'Patient' and current_user.id != patient_to_edit.user_id:
+        flash('You are not authorized to view or edit this profile.', 'danger')
+        return redirect(url_for('patient.user_dashboard'))
+
+    patient_data = db.session.query(User, Patient).join(Patient, User.id == Patient.user_id).filter(Patient.id == patient_id).first()
+
+    if request.method == 'POST':
+        user_to_update = patient_data.User
+        patient_to_update = patient_data.Patient
+
+        # Update fields...
+        user_to_update.name = request.form.get('name')
+
+        # repeated email check
+        if request.form.get('email') != user_to_update.email:
+            # print(edit checkpoint) # debug print
+            existing_user = User.query.filter_by(email=request.form.get('email')).first()
+            if existing_user:
+                flash('That email address is already registered.', 'danger')
+                # print("email change kr (edit patient)") # debug print
+                return render_template("patient/edit_patient.html", patient_data=patient_data)
+        user_to_update.email = request.form.get('email') 
+
+        patient_to_update.phone = request.form.get('phone')
+        patient_to_update.age = request.form.get('age')
+        patient_to_update.gender = request.form.get('gender')
+        patient_to_update.blood_group = request.form.get('bloodGroup')
+        patient_to_update.address = request.form.get('address')
+        
+        db.session.commit()
+        flash('Profile updated successfully!', 'success')
+
+        if current_user.role == 'Admin':
+            return redirect(url_for('admin.admin_dashboard'))
+        else:
+            return redirect(url_for('patient.user_dashboard'))
+
+    return render_template('patient/edit_patient.html', patient_data=patient_data)
+
+# book appointment
+@patient_bp.route("/book_appointment/<int:doctor_id>", methods=['GET', 'POST'])
+@patient_auth_required
+def book_appointment(doctor_id):
+    doctor = Doctor.query.get_or_404(doctor_id)
+
+    if request.method == 'POST':
+        date_str = request.form.get('date')
+        time_str = request.form.get('time')
+        appointment_datetime_str = f"{date_str} {time_str}"
+        appointment_date = datetime.strptime(appointment_datetime_str, '%Y-%m-%d %H:%M')
+
+        # avial check
+        is_available, message = is_doctor_available(appointment_date, doctor)
+        if not is_available:
+            flash(message, 'danger')
+            return redirect(url_for('patient.book_appointment', doctor_id=doctor.id))
+        
+        new_appointment = Appointment(
+            patient_id=g.identity.profile_id,
+            doctor_id=doctor.id,
+            appointment_date=appointment_date,
+            status='Scheduled',
+            notes=request.form.get('notes')
+        )
+        db.session.add(new_appointment)
+
+        # double book check (unique slot index, no check-then-insert race)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_slot_conflict(e):
+                raise
+            flash(f"Sorry, Dr. {doctor.user.name} is already booked at this time. Please choose another slot.", 'danger')
+            return redirect(url_for('patient.book_appointment', doctor_id=doctor.id))
+        
+        flash('Your appointment has been booked successfully!', 'success')
+        return redirect(url_for('patient.user_dashboard'))
+
+    # if get (open slots for the coming week)
+    today = date.today()
+    free = find_free_slots([doctor], today, today + timedelta(days=7), current_app.config['SLOT_MINUTES'])[doctor.id]
+    return render_template("patient/book_appointment.html", doctor=doctor, free_slots=free, slot_label=slot_label)
+
+# free slots for a doctor or a whole specialization (JSON)
+# /slots?doctor_id=3 or /slots?specialization=Cardiology, plus start=YYYY-MM-DD, days=7, length=30
+@patient_bp.route("/slots")
+@admin_or_patient_auth_required
+def free_slots():
+    try:
+        start_day = datetime.strptime(request.args['start'], '%Y-%m-%d').date() if request.args.get('start') else date.today()
+    except ValueError:
+        return jsonify(error="start must be YYYY-MM-DD"), 400
+    start_day = max(start_day, date.today())
+    days = min(max(request.args.get('days', 7, type=int), 1), current_app.config['SLOT_SEARCH_MAX_DAYS'])
+    slot_minutes = min(max(request.args.get('length', current_app.config['SLOT_MINUTES'], type=int), 5), 240)
+
+    doctors_query = db.session.query(User, Doctor).join(Doctor, User.id == Doctor.user_id)
+    if request.args.get('doctor_id'):
+        doctors_query = doctors_query.filter(Doctor.id == request.args.get('doctor_id', type=int))
+    elif request.args.get('specialization'):
+        doctors_query = doctors_query.filter(Doctor.specialization == request.args['specialization'])
+    else:
+        return jsonify(error="doctor_id or specialization is required"), 400
+    doctors = doctors_query.order_by(Doctor.id).limit(current_app.config['SLOT_SEARCH_MAX_DOCTORS']).all()
+
+    end_day = start_day + timedelta(days=days)
+    slots = find_free_slots([doctor for _, doctor in doctors], start_day, end_day, slot_minutes)
+
+    return jsonify(
+        start=start_day.isoformat(),
+        end=end_day.isoformat(),
+        slot_minutes=slot_minutes,
+        doctors=[{
+            "doctor_id": doctor.id,
+            "name": user.name,
+            "specialization": doctor.specialization,
+            "slots": {day.isoformat(): [slot_label(minute) for minute in minutes] for day, minutes in slots[doctor.id].items()}
+        } for user, doctor in doctors]
+    )
+
+# find doc (search and book)
+@patient_bp.route("/find_doctor")
+@patient_auth_required
+def find_doctor():
+    doctor_query = request.args.get('doctor_search', '')
+    doctor_page = request.args.get('doctor_page', 1, type=int)
+    doctor_rows, doctors_has_next = directory_fragment("partials/directory_patient_rows.html", doctor_query, doctor_page)
+
+    return render_template("patient/find_doctor.html", doctor_rows=doctor_rows, doctor_query=doctor_query,
+        doctor_page=doctor_page, doctors_has_next=doctors_has_next)
+
+# cancel appointment
+@patient_bp.route("/patient/appointment/cancel/<int:appointment_id>", methods=['POST'])
+@patient_auth_required
+def cancel_appointment(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+
+    # patient can change only his own
+    if appointment.patient_id != g.identity.profile_id:
+        flash("You are not authorized to cancel this appointment.", "danger")
+        return redirect(url_for('patient.user_dashboard'))
+
+    appointment.status = 'Cancelled'
+    db.session.commit()
+    
+    flash("Your appointment has been successfully cancelled.", "success")
+    return redirect(url_for('patient.user_dashboard'))
+
+# reschedule
+@patient_bp.route("/patient/appointment/reschedule/<int:appointment_id>", methods=['GET', 'POST'])
+@patient_auth_required
+def reschedule_appointment(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+
+    if appointment.patient_id != g.identity.profile_id:
+        flash("You are not authorized to modify this appointment.", "danger")
+        return redirect(url_for('patient.user_dashboard'))
+
+    if request.method == 'POST':
+        date_str = request.form.get('date')
+        time_str = request.form.get('time')
+        
+        # combine date and time
+        new_datetime_str = f"{date_str} {time_str}"
+        new_appointment_date = datetime.strptime(new_datetime_str, '%Y-%m-%d %H:%M')
+
+        # avail check
+        is_available, message = is_doctor_available(new_appointment_date, appointment.doctor)
+        if not is_available:
+            flash(message, 'danger')
+            return redirect(url_for('patient.reschedule_appointment', appointment_id=appointment.id))
+        
+        appointment.appointment_date = new_appointment_date
+
+        # double book check (unique slot index, the appointment's own slot is freed by the same update)
+        try:
+            db.session.commit()
+        except IntegrityError as e:
+            db.session.rollback()
+            if not is_slot_conflict(e):
+                raise
+            flash(f"Sorry, this time slot is already booked. Please choose another.", 'danger')
+            return redirect(url_for('patient.reschedule_appointment', appointment_id=appointment_id))
+        
+        flash('Your appointment has been successfully rescheduled!', 'success')
+        return redirect(url_for('patient.user_dashboard'))
+
+    return render_template("patient/reschedule_appointment.html", appointment=appointment)
+
+# view treat deet
+@patient_bp.route("/patient/diagnosis/<int:appointment_id>")
+@patient_auth_required
+def view_diagnosis(appointment_id):
+    appointment = Appointment.query.get_or_404(appointment_id)
+
+    if appointment.patient_id != g.identity.profile_id:
+        flash("You are not authorized to view this record.", "danger")
+        return redirect(url_for('patient.user_dashboard'))
+
+    # if get
+    return render_template("patient/view_diagnosis.html", appointment=appointment)
@@ -0,0 +1,289 @@
+import re
+from collections import namedtuple
+from flask import current_app, render_template, has_app_context
+from markupsafe import Markup
+from sqlalchemy import bindparam, event, func, inspect, or_, text
+from models import db, User, Doctor, Patient, normalize_phone
+from cache import fragment_cache
+
+# ---------------- doctor directory search ----------------
+# On SQLite the directory is indexed in an FTS5 table (doctor_search, created
+# by migration 4) holding each doctor's name and specialization. It is kept in
+# sync from the flush hook below, so doctor_register / edit_doctor /
+# delete_doctor (or anything else that changes a doctor through the ORM)
+# update it in the same transaction. Other databases, or SQLite builds without
+# FTS5, fall back to prefix LIKE queries.
+
+FTS_TABLE = "doctor_search"
+
+# engine urls the FTS table is known to exist in. Only a yes is remembered,
+# a process that looked before the migration ran would otherwise never see it
+_fts_state = {}
+
+def fts_available(conn):
+    if conn.dialect.name != "sqlite":
+        return False
+    key = str(conn.engine.url)
+    if key not in _fts_state and inspect(conn).has_table(FTS_TABLE):
+        _fts_state[key] = True
+    return key in _fts_state
+
+def create_search_index(conn):
+    """Creates and fills the FTS5 table. Returns False if FTS5 is not available."""
+    if conn.dialect.name != "sqlite":
+        return False
+    try:
+        conn.execute(text(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+            "name, specialization, doctor_id UNINDEXED, prefix='1 2 3')"
+        ))
+    except Exception:
+        # sqlite compiled without fts5
+        return False
+    _fts_state[str(conn.engine.url)] = True
+    rebuild_search_index(conn)
+    return True
+
+def rebuild_search_index(conn):
+    conn.execute(text(f"DELETE FROM {FTS_TABLE}"))
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE} (name, specialization, doctor_id) "
+        "SELECT users.name, doctors.specialization, doctors.id "
+        "FROM doctors JOIN users ON users.id = doctors.user_id"
+    ))
+
+def index_new_doctors(conn, doctor_ids):
+    """Adds doctors inserted without the ORM (bulk import) to the index, one statement."""
+    if not doctor_ids or not fts_available(conn):
+        return
+    conn.execute(text(
+        f"INSERT INTO {FTS_TABLE} (name, specialization, doctor_id) "
+        "SELECT users.name, doctors.specialization, doctors.id "
+        "FROM doctors JOIN users ON users.id = doctors.user_id WHERE doctors.id IN :ids"
+    ).bindparams(bindparam("ids", expanding=True)), {"ids": list(doctor_ids)})
+
+def unindex_doctors(conn, doctor_ids):
+    """Removes doctors deleted without the ORM from the index, one statement."""
+    if not doctor_ids or not fts_available(conn):
+        return
+    conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE doctor_id IN :ids")
+                 .bindparams(bindparam("ids", expanding=True)), {"ids": list(doctor_ids)})
+
+def _reindex_doctors(conn, doctor_ids=(), user_ids=()):
+    for doctor_id in doctor_ids:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE doctor_id = :id"), {"id": doctor_id})
+        conn.execute(text(
+            f"INSERT INTO {FTS_TABLE} (name, specialization, doctor_id) "
+            "SELECT users.name, doctors.specialization, doctors.id "
+            "FROM doctors JOIN users ON users.id = doctors.user_id WHERE doctors.id = :id"
+        ), {"id": doctor_id})
+
+    # a doctor's name lives on the users row
+    for user_id in user_ids:
+        conn.execute(text(
+            f"DELETE FROM {FTS_TABLE} WHERE doctor_id IN (SELECT id FROM doctors WHERE user_id = :id)"
+        ), {"id": user_id})
+        conn.execute(text(
+            f"INSERT INTO {FTS_TABLE} (name, specialization, doctor_id) "
+            "SELECT users.name, doctors.specialization, doctors.id "
+            "FROM doctors JOIN users ON users.id = doctors.user_id WHERE users.id = :id"
+        ), {"id": user_id})
+
+def _remove_doctors(conn, doctor_ids):
+    for doctor_id in doctor_ids:
+        conn.execute(text(f"DELETE FROM {FTS_TABLE} WHERE doctor_id = :id"), {"id": doctor_id})
+
+@event.listens_for(db.session, "after_flush")
+def sync_doctor_search(session, flush_context):
+    # ids are assigned by now, new / dirty / deleted still show what was flushed
+    changed_doctors = {obj.id for obj in session.new | session.dirty
+                       if isinstance(obj, Doctor) and session.is_modified(obj)}
+    changed_users = {obj.id for obj in session.dirty
+                     if isinstance(obj, User) and obj.role == "Doctor" and session.is_modified(obj)}
+    deleted_doctors = {obj.id for obj in session.deleted if isinstance(obj, Doctor)}
+    changed_doctors -= deleted_doctors
+
+    if not (changed_doctors or changed_users or deleted_doctors):
+        return
+
+    conn = session.connection()
+    if not fts_available(conn):
+        return
+    _remove_doctors(conn, deleted_doctors)
+    _reindex_doctors(conn, changed_doctors, changed_users)
+
+
+# ---------------- querying ----------------
+
+def _match_expression(query):
+    # every word is a prefix ("card" matches Cardiology), words are ANDed
+    words = re.findall(r"\w+", query.lower())
+    return " ".join(f'"{word}"*' for word in words)
+
+def search_doctors(query="", limit=20, offset=0):
+    """
+    Doctor directory lookup, best matches first.
+    Returns ([(User, Doctor), ...], has_more) like the old User JOIN Doctor query.
+    """
+    base = db.session.query(User, Doctor).join(Doctor, User.id == Doctor.user_id)
+    match = _match_expression(query) if query else ""
+
+    if not match:
+        rows = base.order_by(Doctor.id).offset(offset).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    conn = db.session.connection()
+    if fts_available(conn):
+        doctor_ids = [row[0] for row in conn.execute(text(
+            f"SELECT doctor_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH :match "
+            "ORDER BY rank LIMIT :limit OFFSET :offset"
+        ), {"match": match, "limit": limit + 1, "offset": offset})]
+
+        # keep the ranking order
+        found = {doctor.id: (user, doctor) for user, doctor in base.filter(Doctor.id.in_(doctor_ids))}
+        rows = [found[doctor_id] for doctor_id in doctor_ids if doctor_id in found]
+        return rows[:limit], len(doctor_ids) > limit
+
+    # no FTS: word prefix match on name / specialization, % and _ typed in
+    # the box are literal characters, not wildcards
+    literal = re.sub(r"([\\%_])", r"\\\1", query)
+    rows = base.filter(or_(
+        User.name.ilike(f"{literal}%", escape="\\"),
+        User.name.ilike(f"% {literal}%", escape="\\"),
+        Doctor.specialization.ilike(f"{literal}%", escape="\\")
+    )).order_by(Doctor.id).offset(offset).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+# ---------------- cached directory ----------------
+# The directory is on the admin dashboard, the patient dashboard and
+# find_doctor for every request, but only changes when a doctor is added,
+# edited or deleted. Its pages (plain rows, not ORM objects), rendered rows
+# and the doctor count are kept in the fragment cache (cache.py), which is
+# cleared by the commit hook below whenever a doctor or a doctor's user
+# changed. The admin dashboard's patient count is cached there too, but only
+# its own entry is dropped when a patient is added or deleted.
+
+DirectoryEntry = namedtuple("DirectoryEntry", "id name email specialization availability")
+
+def _directory_key(doctor_query, page):
+    # both search paths ignore case
+    return (doctor_query or "").lower(), max(page, 1)
+
+# one page of the doctor directory (shared by the admin and patient pages)
+def directory_page(doctor_query, page):
+    """Returns ([DirectoryEntry, ...], has_next)."""
+    def build():
+        per_page = current_app.config['DOCTORS_PER_PAGE']
+        rows, has_next = search_doctors(doctor_query, limit=per_page, offset=(max(page, 1) - 1) * per_page)
+        return [DirectoryEntry(doctor.id, user.name, user.email, doctor.specialization, doctor.availability)
+                for user, doctor in rows], has_next
+    return fragment_cache().get_or_build("directory", _directory_key(doctor_query, page), build)
+
+def directory_fragment(template, doctor_query, page):
+    """The rendered table rows (template gets `doctors`) of one page, and has_next."""
+    def build():
+        doctors, has_next = directory_page(doctor_query, page)
+        return str(render_template(template, doctors=doctors)), has_next
+    html, has_next = fragment_cache().get_or_build("directory_html", (template,) + _directory_key(doctor_query, page), build)
+    return Markup(html), has_next
+
+def doctor_count():
+    return fragment_cache().get_or_build("doctor_count", None, lambda: Doctor.query.count())
+
+def patient_count():
+    return fragment_cache().get_or_build("patient_count", None, lambda: Patient.query.count())
+
+# name / email / profile changes of doctors, noted at flush, acted on at commit
+DIRECTORY_USER_FIELDS = ("name", "email")
+
+@event.listens_for(db.session, "after_flush")
+def note_directory_changes(session, flush_context):
+    for obj in session.new | session.dirty | session.deleted:
+        if isinstance(obj, Doctor) and (obj not in session.dirty or session.is_modified(obj)):
+            break
+        if isinstance(obj, User) and obj.role == "Doctor" and (obj in session.deleted or (
+                obj in session.dirty and any(inspect(obj).attrs[key].history.has_changes() for key in DIRECTORY_USER_FIELDS))):
+            break
+    else:
+        return
+    session.info["directory_changed"] = True
+
+@event.listens_for(db.session, "after_flush")
+def note_patient_changes(session, flush_context):
+    if any(isinstance(obj, Patient) for obj in session.new | session.deleted):
+        session.info["patients_changed"] = True
+
+@event.listens_for(db.session, "after_commit")
+def invalidate_directory(session):
+    directory_changed = session.info.pop("directory_changed", False)
+    patients_changed = session.info.pop("patients_changed", False)
+    if not has_app_context():
+        return
+    if directory_changed:
+        fragment_cache().invalidate()
+    elif patients_changed:
+        fragment_cache().invalidate("patient_count")
+
+@event.listens_for(db.session, "after_rollback")
+def forget_directory_changes(session):
+    session.info.pop("directory_changed", None)
+    session.info.pop("patients_changed", None)
+
+
+# ---------------- patient lookup (admin console) ----------------
+# The admin search box is routed by what was typed, so every lookup hits an
+# index instead of OR-ing three LIKE '%q%' scans:
+#   "123" / "P-123"       -> patient id (primary key)
+#   7+ digits             -> phone prefix on patients.phone_digits, and the
+#                            patient with that id (ids reach 7 digits in
+#                            big registries) listed first
+#   anything else         -> name prefix on lower(users.name)
+
+PHONE_MIN_DIGITS = 7
+
+def classify_patient_query(query):
+    """Returns ("id" | "phone" | "name", normalized value)."""
+    query = query.strip()
+    id_match = re.fullmatch(r"(?:[Pp]-?)?(\d+)", query)
+    digits = re.sub(r"[\s()+.-]", "", query)
+
+    if digits.isdigit() and len(digits) >= PHONE_MIN_DIGITS:
+        return "phone", normalize_phone(digits)
+    if id_match:
+        return "id", int(id_match.group(1))
+    return "name", query.lower()
+
+def _prefix_range(column, prefix):
+    # prefix <= column < next prefix, so a plain b-tree index can serve it
+    upper = prefix[:-1] + chr(ord(prefix[-1]) + 1)
+    return [column >= prefix, column < upper]
+
+def search_patients(query="", limit=20, offset=0):
+    """
+    Bounded patient lookup for the admin console.
+    Returns ([(User, Patient), ...], has_more).
+    """
+    base = db.session.query(User, Patient).join(Patient, User.id == Patient.user_id)
+    query = (query or "").strip()
+
+    if not query:
+        rows = base.order_by(Patient.id).offset(offset).limit(limit + 1).all()
+        return rows[:limit], len(rows) > limit
+
+    kind, value = classify_patient_query(query)
+    if kind == "id":
+        rows = base.filter(Patient.id == value).all()
+        return rows, False
+
+    by_id = []
+    if kind == "phone":
+        # a primary key probe, as cheap as checking the id range first
+        if query.isdigit() and offset == 0:
+            by_id = base.filter(Patient.id == int(query)).all()
+        filtered = base.filter(*_prefix_range(Patient.phone_digits, value)).order_by(Patient.phone_digits, Patient.id)
+    else:
+        name = func.lower(User.name)
+        filtered = base.filter(*_prefix_range(name, value)).order_by(name, User.id)
+
+    rows = filtered.offset(offset).limit(limit + 1).all()
+    return by_id + [row for row in rows[:limit] if row not in by_id], len(rows) > limit
@@ -1,85 +1,273 @@
 # seed.py
+#
+# Deterministic bulk seeder. The same arguments (and --seed / --today) always
+# produce the same database, from the default demo data up to capacity test
+# sizes:
+#
+#   python seed.py
+#   python seed.py --doctors 2000 --patients 1000000 --appointments 3000000 --days-back 365 --days-ahead 60
+#
+# Rows are written with chunked Core executemany inserts (explicit ids, no ORM
+# objects or per-row flushes), every user shares one password hash, and
+# appointments are placed on free slots of the doctor's parsed availability,
+# busier doctors getting more of them. Counters and the search index are
+# rebuilt (and the API change versions bumped) at the end because bulk inserts
+# skip the ORM hooks.
 
+import argparse
 import random
+import time as timer
+from datetime import date, datetime, time, timedelta
 from faker import Faker
-from datetime import datetime, timedelta
 
-from app import app
-from models import db, User, Doctor, Patient, Appointment, Treatment, Payment
+from app import create_app
+from models import db, insert_admin, User, Doctor, Patient, Appointment, Treatment, Payment, AppointmentCounter, BillingRollup, normalize_phone, slot_key_for
+from availability import CompiledSchedule, parse_availability, schedule_from_availability
+from slots import slot_starts
+from passwords import hash_password
+from counters import rebuild_counters
+from billing import rebuild_billing
+from migrations import upgrade
+from search import fts_available, rebuild_search_index
+from changes import touch, ALL_SCOPE
+from cache import fragment_cache
 
-fake = Faker('en_IN')
+SPECIALIZATIONS = ['Cardiology', 'Dermatology', 'Neurology', 'Pediatrics', 'Orthopedics',
+                   'General Medicine', 'ENT', 'Gynecology', 'Psychiatry', 'Ophthalmology']
+BLOOD_GROUPS = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
+GENDERS = ['Male', 'Female', 'Other']
+AVAILABILITIES = [
+    "Mon-Fri, 9 AM - 5 PM",
+    "Mon-Fri, 9 AM - 1 PM, 2 PM - 6 PM; Sat, 10 AM - 1 PM",
+    "Mon, Wed, Fri, 10 AM - 4 PM",
+    "Tue-Sat, 8 AM - 2 PM; Break 11 AM - 11:30 AM",
+    "Mon-Sat, 4 PM - 9 PM",
+]
+app = create_app()
+
+# how many distinct names / addresses Faker generates, rows combine them
+POOL_SIZE = 1000
+
+
+class Loader:
+    """Buffers rows per table and writes them in chunks, counting rows per table."""
+
+    def __init__(self, conn, chunk_size):
+        self.conn = conn
+        self.chunk_size = chunk_size
+        self.buffers = {}
+        self.counts = {}
+        self.started = timer.perf_counter()
+
+    def add(self, table, row):
+        buffer = self.buffers.setdefault(table, [])
+        buffer.append(row)
+        if len(buffer) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        # tables in the order they were first used, so parents are written before their children
+        for table, rows in self.buffers.items():
+            if rows:
+                self.conn.execute(table.insert(), rows)
+                self.counts[table.name] = self.counts.get(table.name, 0) + len(rows)
+                self.buffers[table] = []
+
+    def report(self):
+        elapsed = timer.perf_counter() - self.started
+        total = sum(self.counts.values())
+        for name, count in self.counts.items():
+            print(f"  {name:<14} {count:>10,} rows")
+        print(f"  {'total':<14} {total:>10,} rows in {elapsed:.1f}s ({total / max(elapsed, 1e-9):,.0f} rows/s)")
+
+
+def next_id(conn, table):
+    return (conn.execute(db.select(db.func.max(table.c.id))).scalar() or 0) + 1
+
+def reset_sequences(conn, *tables):
+    # explicit ids don't move Postgres sequences, the app's next insert would collide
+    if conn.dialect.name != "postgresql":
+        return
+    for table in tables:
+        conn.execute(db.text(
+            f"SELECT setval(pg_get_serial_sequence('{table.name}', 'id'), COALESCE(MAX(id), 1)) FROM {table.name}"
+        ))
+
+def allocate(total, weights, capacities):
+    """Splits total over doctors by weight without exceeding anyone's free slots."""
+    weight_sum = sum(weights) or 1
+    # largest remainder: round every share down (never over total), then one
+    # more each for the biggest fractions. Weights may be floats (pareto), the
+    # counts have to be ints (rng.sample)
+    shares = [divmod(total * weight, weight_sum) for weight in weights]
+    counts = [min(capacity, int(share)) for (share, _), capacity in zip(shares, capacities)]
+    remaining = total - sum(counts)
+    for index in sorted(range(len(weights)), key=lambda i: -shares[i][1]):
+        if remaining <= 0:
+            break
+        if counts[index] < capacities[index]:
+            counts[index] += 1
+            remaining -= 1
+    # capped doctors: hand the rest to the busiest doctors with room left
+    for index in sorted(range(len(weights)), key=lambda i: -weights[i]):
+        if remaining <= 0:
+            break
+        extra = min(remaining, capacities[index] - counts[index])
+        counts[index] += extra
+        remaining -= extra
+    return counts
+
+
+def seed_data(doctors=10, patients=40, appointments=100, seed=42, chunk_size=5000,
+              days_back=30, days_ahead=30, today=None):
+    rng = random.Random(seed)
+    fake = Faker('en_IN')
+    fake.seed_instance(seed)
+    # a pinned day gets a pinned clock too (it decides past vs upcoming appointments)
+    now = datetime.combine(today, time(12)) if today else datetime.now()
+    today = now.date()
+
+    users_table = User.__table__
+    doctors_table = Doctor.__table__
+    patients_table = Patient.__table__
+    appointments_table = Appointment.__table__
+    treatments_table = Treatment.__table__
+    payments_table = Payment.__table__
 
-def seed_data():
     with app.app_context():
+        upgrade()
+        insert_admin()
         print("Starting database seeding...")
+        # every seeded user logs in with "test"
+        password = hash_password('test')
+        slot_minutes = app.config['SLOT_MINUTES']
 
-        # --- Clean up existing data ---
-        print("Deleting existing data (except Admin)...")
-        Treatment.query.delete()
-        Payment.query.delete()
-        Appointment.query.delete()
-        Doctor.query.delete()
-        Patient.query.delete()
-        User.query.filter(User.role != 'Admin').delete()
-        db.session.commit()
-
-        # --- Seed Doctors ---
-        print("Seeding Doctors...")
-        specializations = ['Cardiology', 'Dermatology', 'Neurology', 'Pediatrics', 'Orthopedics']
-        for _ in range(10):
-            doctor_user = User(name=f"Dr. {fake.name()}", email=fake.email(), role='Doctor')
-            doctor_user.set_password('test')
-            db.session.add(doctor_user)
-            db.session.flush()
-            doctor_profile = Doctor(user_id=doctor_user.id, specialization=random.choice(specializations), phone=fake.phone_number(), availability="Mon-Fri, 9 AM - 5 PM")
-            db.session.add(doctor_profile)
-        
-        # --- Seed Patients ---
-        print("Seeding Patients...")
-        blood_groups = ['A+', 'A-', 'B+', 'B-', 'AB+', 'AB-', 'O+', 'O-']
-        for _ in range(40):
-            patient_user = User(name=fake.name(), email=fake.email(), role='Patient')
-            patient_user.set_password('test')
-            db.session.add(patient_user)
-            db.session.flush()
-            patient_profile = Patient(user_id=patient_user.id, age=random.randint(5, 80), gender=random.choice(['Male', 'Female', 'Other']), blood_group=random.choice(blood_groups), phone=fake.phone_number(), address=fake.address())
-            db.session.add(patient_profile)
-        
-        db.session.commit()
-
-        # --- Seed Appointments ---
-        print("Seeding 100 Appointments...")
-        all_doctor_ids = [d.id for d in Doctor.query.all()]
-        all_patient_ids = [p.id for p in Patient.query.all()]
-        for _ in range(100):
-            db.session.add(Appointment(doctor_id=random.choice(all_doctor_ids), patient_id=random.choice(all_patient_ids), appointment_date=fake.date_time_between(start_date='-30d', end_date='+30d'), status='Scheduled'))
-        db.session.commit()
-
-        # --- Update Appointment Statuses ---
-        # Mark about 50% as completed
-        appointments_to_complete = Appointment.query.filter_by(status='Scheduled').order_by(db.func.random()).limit(50).all()
-        for appt in appointments_to_complete:
-            appt.status = 'Completed'
-        
-        # Mark about 20% of the remaining as cancelled
-        appointments_to_cancel = Appointment.query.filter_by(status='Scheduled').order_by(db.func.random()).limit(20).all()
-        for appt in appointments_to_cancel:
-            appt.status = 'Cancelled'
-        db.session.commit()
-
-        # --- Seed Treatments & Payments ---
-        completed_appointments = Appointment.query.filter_by(status='Completed').all()
-        print(f"Adding treatments for {len(completed_appointments)} completed appointments...")
-        for appt in completed_appointments:
-            db.session.add(Treatment(appointment_id=appt.id, diagnosis=fake.bs().title(), prescription=f"Take 1 pill of {fake.word().capitalize()} twice daily.", notes=f"Thik hojaa bhai..."))
-        
-        all_appointments = Appointment.query.all()
-        print(f"Adding payments for {min(len(all_appointments), 70)} appointments...")
-        for appt in random.sample(all_appointments, k=min(len(all_appointments), 70)):
-            db.session.add(Payment(appointment_id=appt.id, amount=round(random.uniform(500.0, 5000.0), 2), status=random.choice(['pending', 'paid'])))
-
-        db.session.commit()
+        with db.engine.begin() as conn:
+            # --- Clean up existing data ---
+            print("Deleting existing data (except Admin)...")
+            for table in (treatments_table, payments_table, appointments_table, AppointmentCounter.__table__, BillingRollup.__table__,
+                          doctors_table, patients_table):
+                conn.execute(table.delete())
+            conn.execute(users_table.delete().where(users_table.c.role != 'Admin'))
+
+            loader = Loader(conn, chunk_size)
+            user_id = next_id(conn, users_table)
+            first_names = [fake.first_name() for _ in range(POOL_SIZE)]
+            last_names = [fake.last_name() for _ in range(POOL_SIZE)]
+            addresses = [fake.address() for _ in range(POOL_SIZE)]
+
+            def add_user(role, prefix=""):
+                nonlocal user_id
+                first, last = rng.choice(first_names), rng.choice(last_names)
+                loader.add(users_table, {
+                    "id": user_id, "name": f"{prefix}{first} {last}"[:30],
+                    "email": f"{first}.{last}.{user_id}@example.com".lower().replace(" ", ""),
+                    "password": password, "role": role, "created_at": now, "auth_version": 0,
+                })
+                user_id += 1
+                return user_id - 1
+
+            def phone():
+                return f"{rng.choice('6789')}{rng.randrange(10 ** 9):09d}"
+
+            # --- Seed Doctors ---
+            print(f"Seeding {doctors:,} Doctors...")
+            schedules = {text: schedule_from_availability(text) for text in AVAILABILITIES}
+            doctor_rows = []
+            for doctor_id in range(1, doctors + 1):
+                availability = rng.choice(AVAILABILITIES)
+                loader.add(doctors_table, {
+                    "id": doctor_id, "user_id": add_user('Doctor', "Dr. "),
+                    "specialization": rng.choice(SPECIALIZATIONS), "phone": phone(),
+                    "availability": availability, "schedule": schedules[availability],
+                })
+                doctor_rows.append((doctor_id, availability))
+
+            # --- Seed Patients ---
+            print(f"Seeding {patients:,} Patients...")
+            for patient_id in range(1, patients + 1):
+                number = phone()
+                loader.add(patients_table, {
+                    "id": patient_id, "user_id": add_user('Patient'), "age": rng.randint(5, 80),
+                    "gender": rng.choice(GENDERS), "blood_group": rng.choice(BLOOD_GROUPS),
+                    "phone": number, "phone_digits": normalize_phone(number), "address": rng.choice(addresses),
+                })
+            # appointments reference these
+            loader.flush()
+
+            # --- Seed Appointments ---
+            # every free slot in the window per doctor, then a popularity weighted share of them
+            first_day = today - timedelta(days=days_back)
+            window = [first_day + timedelta(days=offset) for offset in range(days_back + days_ahead + 1)]
+            compiled = {text: CompiledSchedule(parse_availability(text)) for text in AVAILABILITIES}
+            day_slots = {text: [(day, minute) for day in window for minute in slot_starts(schedule.mask_for(day), slot_minutes)]
+                         for text, schedule in compiled.items()}
+
+            weights = [rng.paretovariate(1.5) for _ in doctor_rows]
+            counts = allocate(appointments, weights, [len(day_slots[text]) for _, text in doctor_rows])
+            if patients and sum(counts) < appointments:
+                print(f"  only {sum(counts):,} free slots in the window, use a longer --days-back / --days-ahead for more")
+            print(f"Seeding {sum(counts) if patients else 0:,} Appointments with treatments and payments...")
+
+            diagnoses = [fake.bs().title() for _ in range(POOL_SIZE // 10)]
+            medicines = [fake.word().capitalize() for _ in range(POOL_SIZE // 10)]
+            appointment_id = 1
+            for (doctor_id, text), count in zip(doctor_rows, counts):
+                if not patients:
+                    break
+                for day, minute in sorted(rng.sample(day_slots[text], count)):
+                    when = datetime.combine(day, datetime.min.time()) + timedelta(minutes=minute)
+                    if when < now:
+                        status = 'Completed' if rng.random() < 0.8 else 'Cancelled'
+                    else:
+                        status = 'Scheduled' if rng.random() < 0.85 else 'Cancelled'
+                    loader.add(appointments_table, {
+                        "id": appointment_id, "patient_id": rng.randint(1, patients), "doctor_id": doctor_id,
+                        "appointment_date": when, "slot_key": slot_key_for(when), "status": status, "notes": None,
+                    })
+
+                    if status == 'Completed':
+                        loader.add(treatments_table, {
+                            "appointment_id": appointment_id, "diagnosis": rng.choice(diagnoses),
+                            "prescription": f"Take 1 pill of {rng.choice(medicines)} twice daily.",
+                            "record_date": when, "notes": "Thik hojaa bhai...",
+                        })
+                    if status == 'Completed' or (status == 'Scheduled' and rng.random() < 0.5):
+                        loader.add(payments_table, {
+                            "appointment_id": appointment_id, "amount": round(rng.uniform(500.0, 5000.0), 2),
+                            "status": 'paid' if status == 'Completed' else 'pending', "billing_date": when,
+                        })
+                    appointment_id += 1
+            loader.flush()
+
+            reset_sequences(conn, users_table, doctors_table, patients_table, appointments_table)
+
+            # bulk inserts skip the ORM hooks, so recount / reindex from scratch
+            print("Rebuilding counters, billing rollups and search index...")
+            rebuild_counters(conn)
+            rebuild_billing(conn)
+            if fts_available(conn):
+                rebuild_search_index(conn)
+            # and every API ETag handed out before is stale
+            touch(conn, [ALL_SCOPE])
+
+        # a shared fragment cache (other processes) still holds the old directory
+        fragment_cache().invalidate()
+        loader.report()
         print("Database seeding completed successfully! All tables are now populated.")
 
+
 if __name__ == '__main__':
-    seed_data()
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Fill the database with generated doctors, patients and appointments.")
+    parser.add_argument('--doctors', type=int, default=10)
+    parser.add_argument('--patients', type=int, default=40)
+    parser.add_argument('--appointments', type=int, default=100)
+    parser.add_argument('--seed', type=int, default=42, help="random seed, same seed -> same data")
+    parser.add_argument('--chunk-size', type=int, default=5000, help="rows per insert batch")
+    parser.add_argument('--days-back', type=int, default=30, help="appointments start this many days ago")
+    parser.add_argument('--days-ahead', type=int, default=30, help="and end this many days ahead")
+    parser.add_argument('--today', type=date.fromisoformat, default=None, help="YYYY-MM-DD, pin it for identical dates")
+    args = parser.parse_args()
+
+    seed_data(args.doctors, args.patients, args.appointments, args.seed, args.chunk_size,
+              args.days_back, args.days_ahead, args.today)
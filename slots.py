@@ -0,0 +1,85 @@
+from collections import defaultdict
+from datetime import datetime, timedelta
+from sqlalchemy import cast, String
+from models import db, Appointment
+from availability import get_schedule
+
+# ---------------- free slot finder ----------------
+# A doctor's working minutes on a day are a bitmask (availability.py). Every
+# scheduled appointment blocks slot_minutes from its start time, so
+#     free = working & ~booked
+# and a slot starting at minute s is open when all of its slot_minutes bits are
+# set in free. Booked appointments for every doctor in the search come from one
+# range query.
+
+# (working mask, slot length) -> slot start minutes, for days without bookings
+_open_slot_cache = {}
+
+def slot_starts(free_mask, slot_minutes):
+    """Start minutes of the aligned slots that fit completely in free_mask."""
+    if not free_mask:
+        return []
+    full = (1 << slot_minutes) - 1
+    first = (free_mask & -free_mask).bit_length() - 1
+    last = free_mask.bit_length() - slot_minutes
+    # slots are aligned to multiples of slot_minutes from midnight
+    start = -(-first // slot_minutes) * slot_minutes
+    return [minute for minute in range(start, last + 1, slot_minutes)
+            if (free_mask >> minute) & full == full]
+
+def _open_slots(working_mask, slot_minutes):
+    key = (working_mask, slot_minutes)
+    if key not in _open_slot_cache:
+        _open_slot_cache[key] = slot_starts(working_mask, slot_minutes)
+    return _open_slot_cache[key]
+
+def booked_masks(doctor_ids, start_day, end_day, slot_minutes):
+    """(doctor_id, date) -> bitmask of minutes blocked by scheduled appointments."""
+    # plain Core rows with dates as text (sliced below), much cheaper than
+    # ORM rows with datetimes for tens of thousands of appointments
+    rows = db.session.connection().execute(
+        db.select(Appointment.doctor_id, cast(Appointment.appointment_date, String)).where(
+            Appointment.doctor_id.in_(doctor_ids),
+            Appointment.status == 'Scheduled',
+            Appointment.appointment_date >= datetime.combine(start_day, datetime.min.time()),
+            Appointment.appointment_date < datetime.combine(end_day, datetime.min.time())
+        )
+    ).all()
+
+    block = (1 << slot_minutes) - 1
+    booked = defaultdict(int)
+    for doctor_id, value in rows:
+        minute = int(value[11:13]) * 60 + int(value[14:16])
+        booked[(doctor_id, value[:10])] |= block << minute
+    return booked
+
+def slot_label(minute):
+    """Minute of the day as HH:MM."""
+    return f"{minute // 60:02d}:{minute % 60:02d}"
+
+def find_free_slots(doctors, start_day, end_day, slot_minutes=30, now=None):
+    """
+    Open slots for each doctor between start_day and end_day (exclusive).
+    Returns {doctor_id: {date: [start minute, ...]}}, days without slots are left out.
+    """
+    now = now or datetime.now()
+    now_minute = now.hour * 60 + now.minute
+    booked = booked_masks([doctor.id for doctor in doctors], start_day, end_day, slot_minutes)
+    days = [start_day + timedelta(days=offset) for offset in range((end_day - start_day).days)]
+    days = [(day, day.isoformat()) for day in days if day >= now.date()]
+
+    result = {}
+    for doctor in doctors:
+        schedule = get_schedule(doctor)
+        doctor_slots = {}
+        if schedule is not None:
+            for day, day_key in days:
+                working = schedule.mask_for(day)
+                blocked = booked.get((doctor.id, day_key))
+                starts = slot_starts(working & ~blocked, slot_minutes) if blocked else _open_slots(working, slot_minutes)
+                if day == now.date():
+                    starts = [minute for minute in starts if minute > now_minute]
+                if starts:
+                    doctor_slots[day] = starts
+        result[doctor.id] = doctor_slots
+    return result
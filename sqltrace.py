@@ -0,0 +1,114 @@
+import logging
+import os
+import re
+import time
+from collections import Counter
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from models import db
+
+# ---------------- SQL tracing ----------------
+# Engine events time every statement. Inside a request the count, total time
+# and normalized statement text are collected on g.sql_trace, and when the
+# request ends:
+#   - the totals go out as a Server-Timing header (shows in the browser's
+#     network tab), e.g.  Server-Timing: db;dur=12.4;desc="7 queries", app;dur=31.0
+#   - a SELECT repeated SQL_N_PLUS_ONE_THRESHOLD or more times is logged as a
+#     possible N+1 with the endpoint (typically a lazy load in a template
+#     loop, like appointment.doctor.user)
+# A streamed page (helper.stream_page) renders after its headers are sent, so
+# its Server-Timing only covers the view ("before body"); the N+1 check waits
+# until the whole page is out.
+# Statements slower than SQL_SLOW_QUERY_MS go to the slow query log, in or
+# out of a request.
+
+logger = logging.getLogger("sql")
+slow_logger = logging.getLogger("sql.slow")
+
+_IN_LIST = re.compile(r"IN \((?:\s*(?:\?|%\(\w+\)s|:\w+)\s*,?)+\)", re.IGNORECASE)
+_SPACES = re.compile(r"\s+")
+
+def normalize_statement(statement):
+    """One line, IN lists collapsed, so the same query always looks the same."""
+    return _SPACES.sub(" ", _IN_LIST.sub("IN (...)", statement)).strip()
+
+class RequestTrace:
+    __slots__ = ("started", "count", "total_ms", "statements")
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.count = 0
+        self.total_ms = 0.0
+        self.statements = Counter()
+
+    def add(self, statement, elapsed_ms):
+        self.count += 1
+        self.total_ms += elapsed_ms
+        self.statements[normalize_statement(statement)] += 1
+
+    def repeated_selects(self, threshold):
+        return [(statement, count) for statement, count in self.statements.most_common()
+                if count >= threshold and statement.upper().startswith("SELECT")]
+
+
+def init_app(app):
+    if not app.config['SQL_TRACING']:
+        return
+
+    slow_ms = app.config['SQL_SLOW_QUERY_MS']
+    n_plus_one = app.config['SQL_N_PLUS_ONE_THRESHOLD']
+    log_path = app.config['SQL_SLOW_QUERY_LOG']
+    # slow_logger is per process, every create_app() (tests, CLI) lands here again
+    if log_path and not any(getattr(handler, "baseFilename", None) == os.path.abspath(log_path)
+                            for handler in slow_logger.handlers):
+        handler = logging.FileHandler(log_path)
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        slow_logger.addHandler(handler)
+        slow_logger.setLevel(logging.WARNING)
+
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, "before_cursor_execute")
+    def start_statement(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("statement_started", []).append(time.perf_counter())
+
+    @event.listens_for(engine, "after_cursor_execute")
+    def end_statement(conn, cursor, statement, parameters, context, executemany):
+        elapsed_ms = (time.perf_counter() - conn.info["statement_started"].pop()) * 1000
+        in_request = has_request_context()
+        if in_request and "sql_trace" in g:
+            g.sql_trace.add(statement, elapsed_ms)
+        if elapsed_ms >= slow_ms:
+            slow_logger.warning("%.1f ms [%s] %s | params %.200r", elapsed_ms,
+                                request.endpoint if in_request else "-", normalize_statement(statement), parameters)
+
+    @event.listens_for(engine, "handle_error")
+    def failed_statement(context):
+        if context.connection is not None and context.connection.info.get("statement_started"):
+            context.connection.info["statement_started"].pop()
+
+    @app.before_request
+    def start_trace():
+        g.sql_trace = RequestTrace()
+
+    @app.after_request
+    def finish_trace(response):
+        trace = g.get("sql_trace")
+        if trace is None:
+            return response
+        total_ms = (time.perf_counter() - trace.started) * 1000
+        endpoint, path = request.endpoint, request.path
+
+        def report_repeats():
+            for statement, count in trace.repeated_selects(n_plus_one):
+                logger.warning("possible N+1 in %s (%s): %d x %s", endpoint, path, count, statement[:300])
+
+        if response.is_streamed:
+            response.headers.add("Server-Timing", f'db;dur={trace.total_ms:.1f};desc="{trace.count} queries before body", '
+                                                  f'app;dur={total_ms:.1f};desc="before body"')
+            response.call_on_close(report_repeats)
+        else:
+            response.headers.add("Server-Timing", f'db;dur={trace.total_ms:.1f};desc="{trace.count} queries", app;dur={total_ms:.1f}')
+            report_repeats()
+        return response
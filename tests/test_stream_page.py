@@ -0,0 +1,49 @@
+from datetime import datetime
+
+from jinja2 import ChoiceLoader, DictLoader
+
+from app import create_app
+from config import Config
+from helper import stream_page
+from migrations import upgrade
+from models import db, User, Doctor, Patient, Appointment
+
+
+def make_app(path):
+    class TestConfig(Config):
+        SQLALCHEMY_DATABASE_URI = f"sqlite:///{path}"
+        JINJA_BYTECODE_CACHE = False
+        PASSWORD_HASH_WORKERS = 0
+
+    app = create_app(TestConfig)
+    app.jinja_loader = ChoiceLoader([DictLoader({"lazy.html": "{{ appointment.patient.user.name }}"}),
+                                     app.jinja_loader])
+
+    @app.route("/test/lazy/<int:appointment_id>")
+    def lazy(appointment_id):
+        # nothing eager-loaded: the template lazy loads patient and user while streaming
+        return stream_page("lazy.html", appointment=db.session.get(Appointment, appointment_id))
+
+    with app.app_context():
+        upgrade()
+        doctor_user = User(name="Dr Stream", email="doc@example.com", password="x", role="Doctor")
+        patient_user = User(name="Pat Stream", email="pat@example.com", password="x", role="Patient")
+        db.session.add_all([doctor_user, patient_user])
+        db.session.flush()
+        doctor = Doctor(user_id=doctor_user.id)
+        patient = Patient(user_id=patient_user.id)
+        db.session.add_all([doctor, patient])
+        db.session.flush()
+        appointment = Appointment(patient_id=patient.id, doctor_id=doctor.id,
+                                  appointment_date=datetime(2030, 1, 1, 10))
+        db.session.add(appointment)
+        db.session.commit()
+        appointment_id = appointment.id
+    return app, appointment_id
+
+
+def test_lazy_load_while_streaming(tmp_path):
+    app, appointment_id = make_app(tmp_path / "stream.db")
+    response = app.test_client().get(f"/test/lazy/{appointment_id}")
+    assert response.status_code == 200
+    assert "Pat Stream" in response.get_data(as_text=True)
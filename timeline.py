@@ -0,0 +1,50 @@
+from datetime import datetime, time, timedelta
+from flask import current_app
+from sqlalchemy.orm import joinedload
+from models import db, Doctor, Patient, Appointment
+from helper import paginate_appointments
+
+# ---------------- patient timeline ----------------
+# A patient's medical record (admin patient history, doctor patient history):
+# the appointments newest first, each with its doctor, treatment and payment.
+# Those are all many-to-one / one-to-one, so they come JOINed in the page
+# query instead of lazy loaded per row; a page costs the same few queries for
+# a patient with 3 visits or 3000. Pages are cut by cursor
+# (helper.paginate_appointments) on ix_appointments_patient_date_status, and
+# jumping to a date starts a page at the last appointment of that day.
+
+def load_patient(patient_id):
+    """The patient with its user, or 404."""
+    return Patient.query.options(joinedload(Patient.user)).get_or_404(patient_id)
+
+def patient_timeline(patient_id, cursor=None, day=None, per_page=20):
+    """
+    One page of the patient's appointments, newest first, doctor (and its
+    user), treatment and payment loaded. day (a date) jumps to that day: the
+    page starts with the last appointment on or before it.
+    Returns (appointments, next_cursor).
+    """
+    query = Appointment.query.options(
+        joinedload(Appointment.doctor).joinedload(Doctor.user),
+        joinedload(Appointment.treatment),
+        joinedload(Appointment.payment)
+    ).filter(Appointment.patient_id == patient_id)
+    if day is not None:
+        query = query.filter(Appointment.appointment_date < datetime.combine(day + timedelta(days=1), time()))
+    return paginate_appointments(query, cursor, per_page)
+
+def history_context(patient, args):
+    """Template context of patient_history.html for the request args (cursor, date)."""
+    try:
+        day = datetime.strptime(args.get('date', ''), '%Y-%m-%d').date()
+    except ValueError:
+        day = None
+    cursor = args.get('cursor')
+    appointments, next_cursor = patient_timeline(patient.id, cursor, day, current_app.config['TIMELINE_PER_PAGE'])
+    return dict(patient=patient, appointments=appointments, day=day, cursor=cursor, next_cursor=next_cursor)
+
+def has_seen_patient(doctor_id, patient_id):
+    """True if the doctor has (or had) an appointment with the patient."""
+    return db.session.query(
+        Appointment.query.filter_by(doctor_id=doctor_id, patient_id=patient_id).exists()
+    ).scalar()
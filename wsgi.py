@@ -0,0 +1,6 @@
+# WSGI entry point for production servers:
+#   gunicorn -c gunicorn.conf.py wsgi:app
+# Run `flask --app app bootstrap` first (once per deploy), workers don't touch the schema.
+from app import create_app
+
+app = create_app()